@@ -0,0 +1,174 @@
+import threading
+
+from ChessVar import ChessVar
+
+# States of a BackgroundEngine
+IDLE = "IDLE"
+THINKING = "THINKING"
+PONDERING = "PONDERING"
+
+# Longest a ponder search runs, in seconds, if it is not cancelled first
+PONDER_TIME = 600.0
+
+
+class StopFlag:
+    """
+    Represents a flag which stops an engine's search (see
+    Engine.set_stop_flag) when its value is set, from another thread.
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+
+def copy_game(game):
+    """
+    Returns a new ChessVar in the same position as game, reached by the
+    same moves from the root of game's history, so the copy's move count
+    (which decides whether an opening book is used) matches the ply.
+    """
+    history = game.get_history()
+    copy = ChessVar(setup=game.get_setup())
+    copy.set_position(history.get_root().get_position())
+    for move in history.get_moves():
+        copy.push(move)
+    return copy
+
+
+class BackgroundEngine:
+    """
+    Represents an engine (an Engine or ParallelEngine) searching on a
+    background thread, so a client can keep handling events while it
+    thinks. Each search runs on a copy of the game, so the game itself
+    may change meanwhile. Starting another search or cancelling sets the
+    current search's stop flag without waiting for it to end: the next
+    search's thread waits for that instead. Between its own moves the
+    engine can ponder: search the position after the reply it expects,
+    which fills its transposition table for the search that follows and,
+    if the search finishes and the reply is played, gives its move at
+    once.
+    """
+
+    def __init__(self, engine):
+        """
+        Creates a BackgroundEngine searching with engine, whose stop flag
+        it takes over.
+        """
+        self._engine = engine
+        self._stop_flag = None
+        self._thread = None
+        self._state = IDLE
+        self._key = None
+        self._result = None
+
+    def get_engine(self):
+        return self._engine
+
+    def get_state(self):
+        """
+        Returns THINKING or PONDERING while a search of that kind runs,
+        else IDLE.
+        """
+        if self._thread is not None and not self._thread.is_alive():
+            self._thread = None
+            self._state = IDLE
+        return self._state
+
+    def get_key(self):
+        """
+        Returns the hash of the position the last search was started for,
+        or None if it was cancelled.
+        """
+        return self._key
+
+    def think(self, game):
+        """
+        Starts searching for the move of the player whose turn it is in
+        game, within the engine's time budget, cancelling any search
+        already running. See take_move.
+        """
+        self.cancel()
+        self._start(game, copy_game(game), THINKING, None)
+
+    def ponder(self, game):
+        """
+        Starts pondering in game, the opponent's turn, cancelling any
+        search already running: the engine searches the position after
+        the reply it found best in its last search (or, if it has none,
+        game's own position) until cancelled or PONDER_TIME runs out.
+        """
+        self.cancel()
+        copy = copy_game(game)
+        reply = self.get_expected_reply(copy)
+        if reply is not None:
+            copy.push(reply)
+        self._start(game, copy, PONDERING, PONDER_TIME)
+
+    def get_expected_reply(self, game):
+        """
+        Returns the best move for the player whose turn it is in game
+        stored in the engine's transposition table, or None. A search may
+        be writing to the table meanwhile, so the move is checked to be
+        legal.
+        """
+        entry = self._engine.get_table().probe(game.get_board().get_hash())
+        if entry is None or entry[2] is None or not game.is_legal(entry[2]):
+            return None
+        return entry[2]
+
+    def take_move(self, game):
+        """
+        Returns the move found by a finished search of game's position
+        (by think, or by a ponder whose expected reply was played), or
+        None. A move is only returned once.
+        """
+        if self.get_state() != IDLE or self._result is None:
+            return None
+        key, move = self._result
+        if key != game.get_board().get_hash():
+            return None
+        self._result = None
+        return move
+
+    def cancel(self, wait=False):
+        """
+        Stops the running search, if any. If wait is True, also waits for
+        its thread to finish, e.g. before the engine is closed.
+        """
+        if self._stop_flag is not None:
+            self._stop_flag.value = 1
+        if wait and self._thread is not None:
+            self._thread.join()
+        self._state = IDLE
+        self._key = None
+
+    def _start(self, game, copy, state, max_time):
+        """
+        Starts a search of copy's position for game's position.
+        """
+        self._stop_flag = StopFlag()
+        self._state = state
+        self._key = game.get_board().get_hash()
+        self._result = None
+        self._thread = threading.Thread(
+            target=self._search,
+            args=(self._thread, self._stop_flag, copy, max_time),
+            daemon=True,
+        )
+        self._thread.start()
+
+    def _search(self, previous, stop_flag, game, max_time):
+        """
+        Runs a search on the background thread once the previous search's
+        thread has finished, keeping its move unless it was cancelled.
+        """
+        if previous is not None:
+            previous.join()
+        if stop_flag.value:
+            return
+        self._engine.set_stop_flag(stop_flag)
+        move = self._engine.search(game, max_time=max_time)[0]
+        if not stop_flag.value:
+            self._result = (game.get_board().get_hash(), move)
@@ -0,0 +1,164 @@
+import numpy as np
+
+from Bitboard import get_tables
+from Board import PIECE_CLASSES
+from ChessVar import ChessVar
+from Position import PIECE_KINDS, BLACK_BIT
+from Setup import Setup
+
+# Moves validated per chunk, which bounds the memory of the path lookups
+CHUNK_SIZE = 1 << 20
+
+# Validators are shared by every batch on a board of the same size.
+_VALIDATORS = {}
+
+
+def get_validator(rows=8, cols=8):
+    """
+    Returns the BatchValidator for a board of the given size, building
+    its tables on first use.
+    """
+    key = (rows, cols)
+    if key not in _VALIDATORS:
+        _VALIDATORS[key] = BatchValidator(rows, cols)
+    return _VALIDATORS[key]
+
+
+def stack_positions(positions):
+    """
+    Returns a (boards, turns) tuple for a list of Positions of the same
+    size: a (len(positions), rows * cols) uint8 array of piece codes and
+    an array of whose turn it is in each (0 for WHITE, 1 for BLACK).
+    """
+    boards = np.array([position.get_squares() for position in positions], np.uint8)
+    turns = np.array(
+        [position.get_game_turn() == "BLACK" for position in positions], np.uint8
+    )
+    return boards, turns
+
+
+class BatchValidator:
+    """
+    Represents a vectorized move validator for boards of one size. It
+    checks many (board, start, end) triples at once with NumPy, applying
+    the same rules as ChessVar (categorize_move, is_move_sanctioned and
+    is_move_unobstructed). The rules are precomputed once per piece code
+    and pair of squares by running ChessVar's own checks on an otherwise
+    empty board, for a move onto an empty square and for a capture;
+    squares strictly between the start and end of a straight move are
+    then checked for obstruction per board.
+    """
+
+    def __init__(self, rows=8, cols=8):
+        """
+        Builds the rule and path tables for a board with the given number
+        of rows and cols.
+        """
+        self._rows = rows
+        self._cols = cols
+        size = rows * cols
+        self._allowed_empty = np.zeros((16, size, size), bool)
+        self._allowed_capture = np.zeros((16, size, size), bool)
+        self._build_rules()
+
+        # Squares strictly between start and end, padded with the index of
+        # an extra always-empty square (size)
+        between = get_tables(rows, cols).between
+        longest = max(max(rows, cols) - 2, 1)
+        self._paths = np.full((size, size, longest), size, np.int32)
+        for start in range(size):
+            for end in range(size):
+                mask = between[start][end]
+                squares = [index for index in range(size) if mask >> index & 1]
+                self._paths[start, end, : len(squares)] = squares
+
+    def _build_rules(self):
+        """
+        Fills the rule tables by asking ChessVar whether each piece may
+        move between each pair of squares on an otherwise empty board.
+        """
+        rows = self._rows
+        cols = self._cols
+        size = rows * cols
+        game = ChessVar(setup=Setup(rows, cols, {}), sparse=False)
+        board_obj = game.get_board()
+        for code, kind in enumerate(PIECE_KINDS):
+            if kind == 0:
+                continue
+            color = kind.get_piece_color()
+            foe_color = "BLACK" if color == "WHITE" else "WHITE"
+            for start in range(size):
+                start_location = divmod(start, cols)
+                piece = board_obj.new_piece(
+                    kind.get_piece_type(), start_location[0], start_location[1], color
+                )
+                board_obj.place_piece(start_location, piece)
+                for end in range(size):
+                    if end == start:
+                        continue
+                    move_coords = (start_location, divmod(end, cols))
+                    bearing, directionality, length = game.categorize_move(move_coords)
+                    self._allowed_empty[code, start, end] = game.is_move_legal(
+                        piece, bearing, directionality, length, move_coords
+                    )
+                    board_obj.place_piece(
+                        move_coords[1], PIECE_CLASSES["PAWN"](0, 0, foe_color)
+                    )
+                    self._allowed_capture[code, start, end] = game.is_move_legal(
+                        piece, bearing, directionality, length, move_coords
+                    )
+                    board_obj.place_piece(move_coords[1], 0)
+                board_obj.place_piece(start_location, 0)
+
+    def get_rows(self):
+        return self._rows
+
+    def get_cols(self):
+        return self._cols
+
+    def validate(self, boards, board_index, starts, ends, turns=None):
+        """
+        Validates a batch of moves. boards is an (n, rows * cols) integer
+        array of piece codes (see Position.PIECE_CODES); move i moves the
+        piece on square starts[i] of board board_index[i] to square
+        ends[i], squares being numbered row * cols + col. If turns (an
+        array of n values, 0 for WHITE and 1 for BLACK) is given, the
+        moving piece must also belong to the player whose turn it is.
+        Returns a (legal, captured) tuple of arrays: whether each move is
+        legal, and the code of the piece each legal move captures (0 when
+        it captures nothing).
+        """
+        boards = np.asarray(boards)
+        board_index = np.asarray(board_index, np.intp)
+        starts = np.asarray(starts, np.intp)
+        ends = np.asarray(ends, np.intp)
+        # An extra empty square pads each board for the path lookups
+        padded = np.zeros((boards.shape[0], boards.shape[1] + 1), np.uint8)
+        padded[:, :-1] = boards
+
+        legal = np.zeros(len(starts), bool)
+        captured = np.zeros(len(starts), np.uint8)
+        for first in range(0, len(starts), CHUNK_SIZE):
+            chunk = slice(first, first + CHUNK_SIZE)
+            index = board_index[chunk]
+            start = starts[chunk]
+            end = ends[chunk]
+            piece = padded[index, start]
+            target = padded[index, end]
+
+            is_foe = (target != 0) & ((target & BLACK_BIT) != (piece & BLACK_BIT))
+            allowed = np.where(
+                is_foe,
+                self._allowed_capture[piece, start, end],
+                self._allowed_empty[piece, start, end] & (target == 0),
+            )
+            path_clear = (padded[index[:, None], self._paths[start, end]] == 0).all(
+                axis=1
+            )
+            chunk_legal = allowed & path_clear
+            if turns is not None:
+                turn = np.asarray(turns, np.uint8)[index]
+                chunk_legal &= (piece & BLACK_BIT) == turn * BLACK_BIT
+            legal[chunk] = chunk_legal
+            captured[chunk] = np.where(chunk_legal & is_foe, target, 0)
+        return legal, captured
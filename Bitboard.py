@@ -0,0 +1,289 @@
+PIECE_TYPES = ("PAWN", "ROOK", "KNIGHT", "BISHOP", "QUEEN", "KING")
+COLORS = ("WHITE", "BLACK")
+
+PAWN_STEPS = {"BLACK": 1, "WHITE": -1}
+
+# Ray directions as (row step, col step)
+ROOK_DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+BISHOP_DIRECTIONS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+
+
+def default_pawn_start_rows(rows):
+    """
+    Returns the rows on which each color's pawns may make their first (1
+    or 2 space) move on a board with the given number of rows: the second
+    row from each color's side.
+    """
+    return {"BLACK": 1, "WHITE": rows - 2}
+
+
+# Pawn start rows of the standard board; these mirror the default checks in
+# Pawn.is_move_sanctioned.
+PAWN_START_ROWS = default_pawn_start_rows(8)
+
+# Movement tables are shared by every board of the same size and pawn start
+# rows.
+_TABLES = {}
+
+
+def get_tables(rows, cols, pawn_start_rows=None):
+    """
+    Returns the movement tables for a board of the given size, building them
+    on first use. pawn_start_rows defaults to default_pawn_start_rows(rows).
+    """
+    if pawn_start_rows is None:
+        pawn_start_rows = default_pawn_start_rows(rows)
+    key = (rows, cols, pawn_start_rows["WHITE"], pawn_start_rows["BLACK"])
+    if key not in _TABLES:
+        _TABLES[key] = BitboardTables(rows, cols, pawn_start_rows)
+    return _TABLES[key]
+
+
+class BitboardTables:
+    """
+    Represents the precomputed target masks for every piece type from every
+    square, plus the mask of squares strictly between any two aligned
+    squares. Targets follow the same geometry as ChessVar.categorize_move, so
+    e.g. a KNIGHT may move to any square that is neither PERPENDICULAR nor
+    DIAGONAL to its start square.
+    """
+
+    def __init__(self, rows, cols, pawn_start_rows=None):
+        """
+        Builds the tables for a board with the given number of rows and
+        cols, and pawns making their first move from pawn_start_rows.
+        """
+        self._rows = rows
+        self._cols = cols
+        if pawn_start_rows is None:
+            pawn_start_rows = default_pawn_start_rows(rows)
+        size = rows * cols
+
+        self.rook = [0] * size
+        self.bishop = [0] * size
+        self.queen = [0] * size
+        self.knight = [0] * size
+        self.king = [0] * size
+        self.between = [[0] * size for _ in range(size)]
+        self.rays = {
+            direction: [0] * size for direction in ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+        }
+        self.pawn_push = {color: [0] * size for color in COLORS}
+        self.pawn_capture_near = {color: [0] * size for color in COLORS}
+        self.pawn_capture_far = {color: [0] * size for color in COLORS}
+
+        for start in range(size):
+            start_row, start_col = divmod(start, cols)
+            for end in range(size):
+                if end == start:
+                    continue
+                end_row, end_col = divmod(end, cols)
+                row_diff = end_row - start_row
+                col_diff = end_col - start_col
+                end_bit = 1 << end
+
+                if row_diff == 0 or col_diff == 0:
+                    self.rook[start] |= end_bit
+                    length = abs(row_diff) + abs(col_diff)
+                elif abs(row_diff) == abs(col_diff):
+                    self.bishop[start] |= end_bit
+                    length = abs(row_diff)
+                else:
+                    self.knight[start] |= end_bit
+                    continue
+
+                if length == 1:
+                    self.king[start] |= end_bit
+
+                # Squares strictly between start and end
+                row_step = (row_diff > 0) - (row_diff < 0)
+                col_step = (col_diff > 0) - (col_diff < 0)
+                for i in range(1, length):
+                    self.between[start][end] |= 1 << (
+                        (start_row + i * row_step) * cols + start_col + i * col_step
+                    )
+
+            self.queen[start] = self.rook[start] | self.bishop[start]
+
+            for row_step, col_step in self.rays:
+                row = start_row + row_step
+                col = start_col + col_step
+                while 0 <= row < rows and 0 <= col < cols:
+                    self.rays[(row_step, col_step)][start] |= 1 << (row * cols + col)
+                    row += row_step
+                    col += col_step
+
+            for color in COLORS:
+                step = PAWN_STEPS[color]
+                max_length = 2 if start_row == pawn_start_rows[color] else 1
+                for length in range(1, max_length + 1):
+                    end_row = start_row + length * step
+                    if not 0 <= end_row < rows:
+                        break
+                    self.pawn_push[color][start] |= 1 << (end_row * cols + start_col)
+                    for end_col in (start_col - length, start_col + length):
+                        if not 0 <= end_col < cols:
+                            continue
+                        end_bit = 1 << (end_row * cols + end_col)
+                        if length == 1:
+                            self.pawn_capture_near[color][start] |= end_bit
+                        else:
+                            self.pawn_capture_far[color][start] |= end_bit
+
+
+class Bitboards:
+    """
+    Represents a position as occupancy masks (one bit per square, so 64 bits
+    on the standard board) per color and per piece type. It is kept in sync
+    by Board.set_piece and answers move legality with mask operations
+    instead of building coordinate lists.
+    """
+
+    def __init__(self, rows=8, cols=8, pawn_start_rows=None):
+        """
+        Creates empty occupancy masks for a board of the given size, with
+        pawns making their first move from pawn_start_rows.
+        """
+        self._rows = rows
+        self._cols = cols
+        self._tables = get_tables(rows, cols, pawn_start_rows)
+        self._pieces = {
+            color: {piece_type: 0 for piece_type in PIECE_TYPES} for color in COLORS
+        }
+        self._colors = {color: 0 for color in COLORS}
+        self._occupied = 0
+
+    def get_occupied(self):
+        """
+        Returns the mask of all occupied squares.
+        """
+        return self._occupied
+
+    def get_color_mask(self, color):
+        """
+        Returns the mask of squares occupied by the given color.
+        """
+        return self._colors[color]
+
+    def get_piece_mask(self, color, piece_type):
+        """
+        Returns the mask of squares occupied by the given color and piece type.
+        """
+        return self._pieces[color][piece_type]
+
+    def get_tables(self):
+        """
+        Returns the movement tables for this board size.
+        """
+        return self._tables
+
+    def add_piece(self, location, color, piece_type):
+        """
+        Marks the given location as occupied by a piece.
+        """
+        bit = 1 << (location[0] * self._cols + location[1])
+        self._pieces[color][piece_type] |= bit
+        self._colors[color] |= bit
+        self._occupied |= bit
+
+    def remove_piece(self, location, color, piece_type):
+        """
+        Marks the given location as no longer occupied by a piece.
+        """
+        bit = ~(1 << (location[0] * self._cols + location[1]))
+        self._pieces[color][piece_type] &= bit
+        self._colors[color] &= bit
+        self._occupied &= bit
+
+    def is_move_legal(self, start_location, end_location, color, piece_type):
+        """
+        Checks if moving the given piece from start_location to end_location
+        is both sanctioned and unobstructed, with the same outcome as
+        ChessVar.is_move_legal. Returns True if legal, False otherwise.
+        """
+        cols = self._cols
+        start = start_location[0] * cols + start_location[1]
+        end = end_location[0] * cols + end_location[1]
+        end_bit = 1 << end
+
+        # Friend at end location (including a move onto itself)
+        if self._colors[color] & end_bit:
+            return False
+
+        tables = self._tables
+        if piece_type == "KNIGHT":
+            return bool(tables.knight[start] & end_bit)
+        if piece_type == "KING":
+            return bool(tables.king[start] & end_bit)
+        if piece_type == "PAWN":
+            if tables.pawn_push[color][start] & end_bit:
+                # Cannot capture moving PERPENDICULAR
+                return not (self._occupied & (end_bit | tables.between[start][end]))
+            if tables.pawn_capture_near[color][start] & end_bit:
+                # Cannot move diagonally unless capturing
+                return bool(self._occupied & end_bit)
+            if tables.pawn_capture_far[color][start] & end_bit:
+                return not (self._occupied & tables.between[start][end])
+            return False
+
+        if piece_type == "ROOK":
+            targets = tables.rook[start]
+        elif piece_type == "BISHOP":
+            targets = tables.bishop[start]
+        else:
+            targets = tables.queen[start]
+        if not targets & end_bit:
+            return False
+        return not (self._occupied & tables.between[start][end])
+
+    def get_legal_targets(self, location, color, piece_type):
+        """
+        Returns the mask of every end location the given piece can legally
+        move to from location, following the same rules as is_move_legal.
+        """
+        cols = self._cols
+        start = location[0] * cols + location[1]
+        friends = self._colors[color]
+        occupied = self._occupied
+        tables = self._tables
+
+        if piece_type == "KNIGHT":
+            return tables.knight[start] & ~friends
+        if piece_type == "KING":
+            return tables.king[start] & ~friends
+        if piece_type == "PAWN":
+            targets = tables.pawn_capture_near[color][start] & (occupied ^ friends)
+            for pawn_targets, empty_end in (
+                (tables.pawn_push[color][start], True),
+                (tables.pawn_capture_far[color][start], False),
+            ):
+                while pawn_targets:
+                    end_bit = pawn_targets & -pawn_targets
+                    pawn_targets ^= end_bit
+                    blockers = tables.between[start][end_bit.bit_length() - 1]
+                    blockers |= end_bit if empty_end else friends & end_bit
+                    if not occupied & blockers:
+                        targets |= end_bit
+            return targets
+
+        if piece_type == "ROOK":
+            directions = ROOK_DIRECTIONS
+        elif piece_type == "BISHOP":
+            directions = BISHOP_DIRECTIONS
+        else:
+            directions = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+
+        targets = 0
+        for direction in directions:
+            ray = tables.rays[direction][start]
+            blockers = ray & occupied
+            if blockers:
+                # The nearest blocker is the lowest bit on rays that step to
+                # higher square indices, and the highest bit otherwise
+                if direction[0] * cols + direction[1] > 0:
+                    nearest = (blockers & -blockers).bit_length() - 1
+                else:
+                    nearest = blockers.bit_length() - 1
+                ray ^= tables.rays[direction][nearest]
+            targets |= ray
+        return targets & ~friends
@@ -1,4 +1,23 @@
 from Piece import Piece, Pawn, Rook, Knight, Bishop, Queen, King
+from Bitboard import Bitboards, PIECE_TYPES, COLORS
+from Tracing import tracer, DEBUG
+from Zobrist import get_keys
+from Position import PIECE_KINDS, piece_code, piece_letter
+from Setup import get_standard_setup
+from Sparse import SparseGrid, LineOccupancy
+
+# Piece class of each piece type, used to build pieces from piece codes
+PIECE_CLASSES = {
+    "PAWN": Pawn,
+    "ROOK": Rook,
+    "KNIGHT": Knight,
+    "BISHOP": Bishop,
+    "QUEEN": Queen,
+    "KING": King,
+}
+
+# Boards with more squares than this are sparse unless told otherwise
+SPARSE_SQUARES = 256
 
 
 class Board:
@@ -9,57 +28,262 @@ class Board:
     this may change by the end).
     """
 
-    def __init__(self, rows=8, cols=8):
-        """
-        Initializes a Board object with Chess pieces in starting locations.
-        Uppercase letters represent black pieces, lowercase letters represent white pieces.
-        """
-        self._rows = rows
-        self._cols = cols
-
-        self._board = [[0 for x in range(self._cols)] for _ in range(self._rows)]
-        self._board[0][0] = Rook(0, 0, "BLACK")
-        self._board[0][1] = Knight(0, 1, "BLACK")
-        self._board[0][2] = Bishop(0, 2, "BLACK")
-        self._board[0][3] = Queen(0, 3, "BLACK")
-        self._board[0][4] = King(0, 4, "BLACK")
-        self._board[0][5] = Bishop(0, 5, "BLACK")
-        self._board[0][6] = Knight(0, 6, "BLACK")
-        self._board[0][7] = Rook(0, 7, "BLACK")
-        self._board[1][0] = Pawn(1, 0, "BLACK")
-        self._board[1][1] = Pawn(1, 1, "BLACK")
-        self._board[1][2] = Pawn(1, 2, "BLACK")
-        self._board[1][3] = Pawn(1, 3, "BLACK")
-        self._board[1][4] = Pawn(1, 4, "BLACK")
-        self._board[1][5] = Pawn(1, 5, "BLACK")
-        self._board[1][6] = Pawn(1, 6, "BLACK")
-        self._board[1][7] = Pawn(1, 7, "BLACK")
-
-        self._board[7][0] = Rook(7, 0, "WHITE")
-        self._board[7][1] = Knight(7, 1, "WHITE")
-        self._board[7][2] = Bishop(7, 2, "WHITE")
-        self._board[7][3] = Queen(7, 3, "WHITE")
-        self._board[7][4] = King(7, 4, "WHITE")
-        self._board[7][5] = Bishop(7, 5, "WHITE")
-        self._board[7][6] = Knight(7, 6, "WHITE")
-        self._board[7][7] = Rook(7, 7, "WHITE")
-        self._board[6][0] = Pawn(6, 0, "WHITE")
-        self._board[6][1] = Pawn(6, 1, "WHITE")
-        self._board[6][2] = Pawn(6, 2, "WHITE")
-        self._board[6][3] = Pawn(6, 3, "WHITE")
-        self._board[6][4] = Pawn(6, 4, "WHITE")
-        self._board[6][5] = Pawn(6, 5, "WHITE")
-        self._board[6][6] = Pawn(6, 6, "WHITE")
-        self._board[6][7] = Pawn(6, 7, "WHITE")
+    def __init__(self, rows=8, cols=8, use_bitboards=False, setup=None, sparse=None):
+        """
+        Initializes a Board object with Chess pieces in starting locations:
+        those of setup (a Setup, which also gives the board size) if given,
+        otherwise the standard setup for a rows x cols board.
+        If use_bitboards is True, occupancy masks are also kept for fast move validation.
+        If sparse is True, only occupied squares are stored, with the occupied
+        squares of every line kept sorted, so that boards with many more squares
+        than pieces stay fast; by default boards of more than SPARSE_SQUARES
+        squares are sparse.
+        """
+        if setup is None:
+            setup = get_standard_setup(rows, cols)
+        self._setup = setup
+        self._rows = setup.get_rows()
+        self._cols = setup.get_cols()
+        self._pawn_start_rows = setup.get_pawn_start_rows()
+
+        if sparse is None:
+            sparse = self._rows * self._cols > SPARSE_SQUARES
+        if sparse and use_bitboards:
+            raise ValueError("sparse boards cannot keep bitboards")
+        self._sparse = sparse
+
+        self._board = self._new_grid()
+        for (row, col), (color, piece_type) in setup.get_pieces().items():
+            self._board[row][col] = self.new_piece(piece_type, row, col, color)
 
         self._game_turn = "WHITE"
 
+        self._use_bitboards = use_bitboards
+        self._index_pieces()
+
+        self._selected_piece = None
+
+    def _new_grid(self):
+        """
+        Returns an empty grid of squares: a list of lists, or a SparseGrid
+        for a sparse board.
+        """
+        if self._sparse:
+            return SparseGrid()
+        return [[0 for x in range(self._cols)] for _ in range(self._rows)]
+
+    def _get_all_pieces(self):
+        """
+        Returns a list of the pieces on the board, row by row.
+        """
+        if self._sparse:
+            return self._board.get_pieces()
+        return [piece for row in self._board for piece in row if piece != 0]
+
+    def new_piece(self, piece_type, row, col, color):
+        """
+        Returns a new piece of the given type and color for the given
+        location, with pawns making their first move from this board's
+        pawn start row.
+        """
+        if piece_type == "PAWN":
+            return Pawn(row, col, color, self._pawn_start_rows[color])
+        return PIECE_CLASSES[piece_type](row, col, color)
+
+    def _index_pieces(self):
+        """
+        Builds the occupancy masks, hash, piece index and square codes
+        from the pieces on the board, and the line occupancy of a sparse
+        board.
+        """
+        pieces = self._get_all_pieces()
+        self._bitboards = None
+        if self._use_bitboards:
+            self._bitboards = Bitboards(self._rows, self._cols, self._pawn_start_rows)
+            for piece in pieces:
+                self._bitboards.add_piece(
+                    (piece.get_piece_row(), piece.get_piece_col()),
+                    piece.get_piece_color(),
+                    piece.get_piece_type(),
+                )
+
+        # Occupied squares of every line of a sparse board, updated
+        # incrementally
+        self._occupancy = None
+        if self._sparse:
+            self._occupancy = LineOccupancy()
+            for piece in pieces:
+                self._occupancy.add((piece.get_piece_row(), piece.get_piece_col()))
+
+        # Zobrist hash of the position, updated incrementally
+        self._zobrist_keys = get_keys(self._rows, self._cols)
+        self._hash = 0
+        for piece in pieces:
+            self._hash ^= self._zobrist_keys.piece_key(
+                piece, (piece.get_piece_row(), piece.get_piece_col())
+            )
+        if self._game_turn == "BLACK":
+            self._hash ^= self._zobrist_keys.black_to_move
+
+        # Locations of each color's pieces by type, updated incrementally
+        self._piece_index = {
+            color: {piece_type: set() for piece_type in PIECE_TYPES} for color in COLORS
+        }
+        for piece in pieces:
+            self._piece_index[piece.get_piece_color()][piece.get_piece_type()].add(
+                (piece.get_piece_row(), piece.get_piece_col())
+            )
+
+        # Piece code of each square, row by row, updated incrementally
+        self._squares = bytearray(self._rows * self._cols)
+        for piece in pieces:
+            self._squares[
+                piece.get_piece_row() * self._cols + piece.get_piece_col()
+            ] = piece_code(piece)
+
     def get_game_board(self):
         """
-        Get method which returns the current board.
+        Get method which returns the current board, indexed as
+        board[row][col] (a SparseGrid on a sparse board).
         """
         return self._board
 
+    def get_setup(self):
+        """
+        Get method which returns the Setup the board started from.
+        """
+        return self._setup
+
+    def get_pawn_start_rows(self):
+        """
+        Get method which returns the dict of pawn start rows by color.
+        """
+        return self._pawn_start_rows
+
+    def is_sparse(self):
+        """
+        Returns True if only the occupied squares of the board are stored.
+        """
+        return self._sparse
+
+    def get_occupancy(self):
+        """
+        Get method which returns the LineOccupancy of a sparse board, or
+        None for a dense one.
+        """
+        return self._occupancy
+
+    def get_piece_locations(self, color, piece_type):
+        """
+        Get method which returns the set of locations of the given color's
+        pieces of the given type. The set is kept up to date by the board
+        and must not be modified.
+        """
+        return self._piece_index[color][piece_type]
+
+    def get_color_locations(self, color):
+        """
+        Get method which returns a list of the locations of all of the
+        given color's pieces.
+        """
+        locations = []
+        for type_locations in self._piece_index[color].values():
+            locations.extend(type_locations)
+        return locations
+
+    def get_squares(self):
+        """
+        Get method which returns the piece code of every square, row by
+        row, as bytes (see Position.PIECE_CODES).
+        """
+        return bytes(self._squares)
+
+    def get_row_squares(self, row):
+        """
+        Get method which returns the piece code of every square of one
+        row as bytes.
+        """
+        start = row * self._cols
+        return bytes(self._squares[start : start + self._cols])
+
+    def set_squares(self, squares, game_turn="WHITE"):
+        """
+        Set method which replaces every piece on the board with the ones
+        given by a sequence of piece codes, row by row, and sets the turn.
+        """
+        if len(squares) != self._rows * self._cols:
+            raise ValueError(
+                f"expected {self._rows * self._cols} squares, got {len(squares)}"
+            )
+        self._board = self._new_grid()
+        for location_index, code in enumerate(squares):
+            if code:
+                kind = PIECE_KINDS[code]
+                row, col = divmod(location_index, self._cols)
+                self._board[row][col] = self.new_piece(
+                    kind.get_piece_type(), row, col, kind.get_piece_color()
+                )
+        self._game_turn = game_turn
+        self._selected_piece = None
+        self._index_pieces()
+
+    def update_squares(self, squares, game_turn="WHITE"):
+        """
+        Set method which changes the board to the pieces given by a
+        sequence of piece codes, row by row, and sets the turn, like
+        set_squares. Only squares whose piece differs are replaced, so
+        moving to a nearby position costs about as much as the moves
+        between them. Rows are compared whole before any of their squares.
+        """
+        if len(squares) != self._rows * self._cols:
+            raise ValueError(
+                f"expected {self._rows * self._cols} squares, got {len(squares)}"
+            )
+        cols = self._cols
+        current = self._squares
+        for row in range(self._rows):
+            start = row * cols
+            if squares[start : start + cols] == current[start : start + cols]:
+                continue
+            for col in range(cols):
+                code = squares[start + col]
+                if code != current[start + col]:
+                    piece = 0
+                    if code:
+                        kind = PIECE_KINDS[code]
+                        piece = self.new_piece(
+                            kind.get_piece_type(), row, col, kind.get_piece_color()
+                        )
+                    self.place_piece((row, col), piece)
+        self.set_game_turn(game_turn)
+        self.deselect()
+
+    def get_rows(self):
+        """
+        Get method which returns the number of rows on the board.
+        """
+        return self._rows
+
+    def get_cols(self):
+        """
+        Get method which returns the number of columns on the board.
+        """
+        return self._cols
+
+    def get_bitboards(self):
+        """
+        Get method which returns the occupancy masks, or None if the board
+        was created without them.
+        """
+        return self._bitboards
+
+    def get_hash(self):
+        """
+        Get method which returns the 64-bit Zobrist hash of the piece
+        locations and whose turn it is.
+        """
+        return self._hash
+
     def get_game_turn(self):
         """
         Get method which returns the current game turn.
@@ -70,6 +294,8 @@ class Board:
         """
         Set method which sets the game turn.
         """
+        if game_turn != self._game_turn:
+            self._hash ^= self._zobrist_keys.black_to_move
         self._game_turn = game_turn
 
     def get_piece(self, location):
@@ -84,7 +310,55 @@ class Board:
         """
         Set method which sets the piece at the given location.
         """
-        print(f"start_location: {start_location}, end_location: {end_location}")
+        if tracer.level >= DEBUG:
+            tracer.emit(DEBUG, "set_piece", start=start_location, end=end_location)
+        captured = self._board[end_location[0]][end_location[1]]
+
+        # Update the hash, including any captured piece
+        keys = self._zobrist_keys
+        self._hash ^= keys.piece_key(piece, start_location) ^ keys.piece_key(
+            piece, end_location
+        )
+        if captured != 0:
+            self._hash ^= keys.piece_key(captured, end_location)
+
+        # Update the piece index, including any captured piece
+        index = self._piece_index
+        if captured != 0:
+            index[captured.get_piece_color()][captured.get_piece_type()].discard(
+                end_location
+            )
+        type_locations = index[piece.get_piece_color()][piece.get_piece_type()]
+        type_locations.discard(start_location)
+        type_locations.add(end_location)
+
+        # Keep occupancy masks in sync, including any captured piece
+        if self._bitboards is not None:
+            if captured != 0:
+                self._bitboards.remove_piece(
+                    end_location,
+                    captured.get_piece_color(),
+                    captured.get_piece_type(),
+                )
+            self._bitboards.remove_piece(
+                start_location, piece.get_piece_color(), piece.get_piece_type()
+            )
+            self._bitboards.add_piece(
+                end_location, piece.get_piece_color(), piece.get_piece_type()
+            )
+
+        # Keep the line occupancy of a sparse board in sync
+        if self._occupancy is not None:
+            self._occupancy.remove(start_location)
+            if captured == 0:
+                self._occupancy.add(end_location)
+
+        squares = self._squares
+        squares[end_location[0] * self._cols + end_location[1]] = squares[
+            start_location[0] * self._cols + start_location[1]
+        ]
+        squares[start_location[0] * self._cols + start_location[1]] = 0
+
         # Set piece at start location to empty
         self._board[start_location[0]][start_location[1]] = 0
 
@@ -94,27 +368,79 @@ class Board:
         # Update piece row and col
         piece.set_row_col(end_location)
 
+    def place_piece(self, location, piece):
+        """
+        Set method which puts a piece (or 0 for an empty square) at the
+        given location, replacing whatever was there.
+        """
+        current = self._board[location[0]][location[1]]
+        if current != 0:
+            self._hash ^= self._zobrist_keys.piece_key(current, location)
+        if piece != 0:
+            self._hash ^= self._zobrist_keys.piece_key(piece, location)
+
+        if current != 0:
+            self._piece_index[current.get_piece_color()][
+                current.get_piece_type()
+            ].discard(location)
+        if piece != 0:
+            self._piece_index[piece.get_piece_color()][piece.get_piece_type()].add(
+                location
+            )
+
+        if self._bitboards is not None:
+            if current != 0:
+                self._bitboards.remove_piece(
+                    location, current.get_piece_color(), current.get_piece_type()
+                )
+            if piece != 0:
+                self._bitboards.add_piece(
+                    location, piece.get_piece_color(), piece.get_piece_type()
+                )
+
+        if self._occupancy is not None:
+            if current != 0 and piece == 0:
+                self._occupancy.remove(location)
+            elif current == 0 and piece != 0:
+                self._occupancy.add(location)
+
+        self._squares[location[0] * self._cols + location[1]] = piece_code(piece)
+        self._board[location[0]][location[1]] = piece
+        if piece != 0:
+            piece.set_row_col(location)
+
     def print_board(self):
         """
-        Prints the Chess piece locations on the current board.
+        Prints the Chess piece locations on the current board, one row
+        per line, with WHITE pieces in uppercase and "." for empty squares.
         """
-        for row in self._board:
-            print(row)
+        for row in range(self._rows):
+            print(
+                " ".join(
+                    piece_letter(code)
+                    for code in self._squares[row * self._cols : (row + 1) * self._cols]
+                )
+            )
 
     def draw(self, win):
-        for i in range(self._rows):
-            for j in range(self._cols):
-                if self._board[i][j] != 0:
-                    self._board[i][j].draw_piece(win)
+        for color in COLORS:
+            for row, col in self.get_color_locations(color):
+                self._board[row][col].draw_piece(win)
+
+    def deselect(self):
+        """
+        Clears the selection highlight, if a piece is selected.
+        """
+        if self._selected_piece is not None:
+            self._selected_piece.set_selected(False)
+            self._selected_piece = None
 
     def select(self, row, col):
-        for i in range(self._rows):
-            for j in range(self._cols):
-                if self._board[i][j] != 0:
-                    self._board[i][j]._selected = False
+        self.deselect()
 
         if self._board[row][col] != 0:
             self._board[row][col].set_selected(True)
+            self._selected_piece = self._board[row][col]
 
 
 def main():
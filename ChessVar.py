@@ -1,5 +1,31 @@
+import time
+
 from Piece import Piece
 from Board import Board
+from Bitboard import ROOK_DIRECTIONS, BISHOP_DIRECTIONS
+from Tracing import tracer, INFO, DEBUG
+from Profiling import profiler
+from Position import Position
+from History import GameHistory
+from MoveTables import get_move_tables, categorize, squares_between, pawn_moves
+
+# Directions along which each sliding piece moves, as (row step, col step)
+SLIDING_DIRECTIONS = {
+    "ROOK": ROOK_DIRECTIONS,
+    "BISHOP": BISHOP_DIRECTIONS,
+    "QUEEN": ROOK_DIRECTIONS + BISHOP_DIRECTIONS,
+}
+
+# Number of pieces of one type a player must capture to win on the standard
+# board; other setups take them from the pieces the other player starts with
+WIN_THRESHOLDS = {
+    "KNIGHT": 2,
+    "BISHOP": 2,
+    "ROOK": 2,
+    "QUEEN": 1,
+    "KING": 1,
+    "PAWN": 8,
+}
 
 
 class ChessVar:
@@ -12,17 +38,66 @@ class ChessVar:
     the end.
     """
 
-    def __init__(self):
+    def __init__(self, use_bitboards=False, move_cache=None, setup=None, sparse=None):
         """
         Initializes a ChessVar object with starting board, turn, and
         game state as private data members. Some way to keep track of
-        captured pieces will be added later.
+        captured pieces will be added later. If use_bitboards is True,
+        moves are validated against the board's occupancy masks. If
+        move_cache is a TranspositionTable, legal move lists are cached
+        in it by position hash. setup (a Setup) gives the board size and
+        starting pieces, by default those of the standard board; sparse
+        chooses the sparse board backend (see Board).
         """
-        self._game_board_obj = Board()
+        self._game_board_obj = Board(
+            use_bitboards=use_bitboards, setup=setup, sparse=sparse
+        )
+        board_obj = self._game_board_obj
+        setup = board_obj.get_setup()
+        # Sparse boards work out move geometry as needed instead
+        self._move_tables = None
+        if not board_obj.is_sparse():
+            self._move_tables = get_move_tables(
+                board_obj.get_rows(),
+                board_obj.get_cols(),
+                board_obj.get_pawn_start_rows(),
+            )
+        self._win_thresholds = {}
+        for color in ("WHITE", "BLACK"):
+            thresholds = setup.get_win_thresholds(color)
+            self._win_thresholds[color] = {
+                piece_type: thresholds[piece_type]
+                for piece_type in WIN_THRESHOLDS
+                if piece_type in thresholds
+            }
         self._game_state = "UNFINISHED"
         self._white_captured_pieces = {}
         self._black_captured_pieces = {}
-        print("\n --- Starting new game! --- \n")
+        # Pieces of each type each color still has to capture to win, and
+        # how many types each color has no pieces left to capture of
+        self._remaining_to_win = {
+            "WHITE": dict(self._win_thresholds["WHITE"]),
+            "BLACK": dict(self._win_thresholds["BLACK"]),
+        }
+        self._types_won = {"WHITE": 0, "BLACK": 0}
+        self._move_stack = []
+        self._move_cache = move_cache
+        # Created on first use, so games which never look back pay nothing
+        self._history = None
+        if tracer.level >= DEBUG:
+            tracer.emit(DEBUG, "new_game")
+
+    def get_board(self):
+        """
+        Get method which returns the Board object.
+        """
+        return self._game_board_obj
+
+    def get_setup(self):
+        """
+        Get method which returns the Setup the game started from.
+        """
+        return self._game_board_obj.get_setup()
 
     def get_game_state(self):
         """
@@ -50,6 +125,7 @@ class ChessVar:
             self._white_captured_pieces[piece_type] = 1
         else:
             self._white_captured_pieces[piece_type] += 1
+        self._update_remaining_to_win("WHITE", piece_type, -1)
 
     def get_black_captured_pieces(self):
         """
@@ -65,6 +141,66 @@ class ChessVar:
             self._black_captured_pieces[piece_type] = 1
         else:
             self._black_captured_pieces[piece_type] += 1
+        self._update_remaining_to_win("BLACK", piece_type, -1)
+
+    def get_distance_to_win(self, color):
+        """
+        Get method which returns a dict of how many more pieces of each
+        type the given color must capture to win. The dict is kept up to
+        date by the game and must not be modified. Types the other color
+        started without are left out.
+        """
+        return self._remaining_to_win[color]
+
+    def get_win_thresholds(self, color):
+        """
+        Get method which returns a dict of how many pieces of each type
+        the given color must capture to win (WIN_THRESHOLDS on the
+        standard board).
+        """
+        return self._win_thresholds[color]
+
+    def _update_remaining_to_win(self, color, piece_type, change):
+        """
+        Changes the number of pieces of piece_type color must capture to
+        win, keeping count of the types with none left to capture.
+        """
+        remaining = self._remaining_to_win[color]
+        if piece_type not in remaining:
+            return
+        was_won = remaining[piece_type] <= 0
+        remaining[piece_type] += change
+        is_won = remaining[piece_type] <= 0
+        if is_won != was_won:
+            self._types_won[color] += 1 if is_won else -1
+
+    def capture_piece(self, piece_at_end_location):
+        """
+        Records the piece at the end location (if any) as captured by
+        the other color.
+        """
+        if piece_at_end_location == 0:
+            return
+        if piece_at_end_location.get_piece_color() == "WHITE":
+            self.set_black_captured_pieces(piece_at_end_location.get_piece_type())
+        else:
+            self.set_white_captured_pieces(piece_at_end_location.get_piece_type())
+
+    def uncapture_piece(self, captured_piece):
+        """
+        Reverts capture_piece() for the given piece.
+        """
+        if captured_piece.get_piece_color() == "WHITE":
+            color = "BLACK"
+            captured_pieces = self._black_captured_pieces
+        else:
+            color = "WHITE"
+            captured_pieces = self._white_captured_pieces
+        captured_type = captured_piece.get_piece_type()
+        captured_pieces[captured_type] -= 1
+        if captured_pieces[captured_type] == 0:
+            del captured_pieces[captured_type]
+        self._update_remaining_to_win(color, captured_type, 1)
 
     def get_move_coords(self, start_location, end_location):
         """
@@ -79,48 +215,19 @@ class ChessVar:
         the type of move by returning the bearing, directionality
         and length of the move based on start and end locations.
         """
-        # Categorize according to:
-        # 1) north, south, east or west
-        if move_coords[0][0] > move_coords[1][0]:
-            bearing = "NORTH"
-        elif move_coords[0][0] < move_coords[1][0]:
-            bearing = "SOUTH"
-        elif move_coords[0][1] > move_coords[1][1]:
-            bearing = "WEST"
-        elif move_coords[0][1] < move_coords[1][1]:
-            bearing = "EAST"
-        else:
-            bearing = None
-
-        # 2) perpendicular or diagonal or L-shaped
-        if (
-            move_coords[0][1] == move_coords[1][1]
-            or move_coords[0][0] == move_coords[1][0]
-        ):
-            directionality = "PERPENDICULAR"
-        elif abs(move_coords[0][0] - move_coords[1][0]) == abs(
-            move_coords[0][1] - move_coords[1][1]
-        ):
-            directionality = "DIAGONAL"
-        else:
-            directionality = "L-SHAPED"
-
-        # 3) length of move
-        if directionality == "PERPENDICULAR":
-            length = abs(move_coords[0][0] - move_coords[1][0]) + abs(
-                move_coords[0][1] - move_coords[1][1]
-            )
-        elif directionality == "DIAGONAL":
-            length = abs(move_coords[0][0] - move_coords[1][0])
-        else:
-            length = None
-
-        return bearing, directionality, length
+        # Categorized once per board size (see MoveTables.categorize)
+        tables = self._move_tables
+        if tables is None:
+            return categorize(*move_coords)
+        (start_row, start_col), (end_row, end_col) = move_coords
+        cols = self._game_board_obj.get_cols()
+        return tables.categories[start_row * cols + start_col][end_row * cols + end_col]
 
     def is_move_unobstructed(self, piece_obj, directionality, length, move_coords):
         """
         Checks if proposed move is obstructed (or if same color piece at end location),
         thereby preventing move. Will return True if move is unobstructed, False otherwise.
+        Does not change the game; captures are recorded by push().
         """
         # First checks what is at the end location (nothing, friend, or foe).
         # Then if directionality == "L-SHAPED", return True
@@ -131,7 +238,8 @@ class ChessVar:
         end_coords = move_coords[1]
 
         piece_at_end_location = self._game_board_obj.get_piece(end_coords)
-        print(f"What is at end location? {piece_at_end_location}")
+        if tracer.level >= DEBUG:
+            tracer.emit(DEBUG, "end_location", piece=piece_at_end_location)
 
         # Get piece attributes
         if piece_at_end_location == 0:
@@ -143,7 +251,12 @@ class ChessVar:
 
         # 1. Friend at end location. Obstructed. Nothing captured.
         if piece_obj.get_piece_color() == piece_at_end_location_color:
-            print("Error: There is a piece of the same color at the end location.")
+            if tracer.level >= INFO:
+                tracer.emit(
+                    INFO,
+                    "move_rejected",
+                    reason="There is a piece of the same color at the end location.",
+                )
             return False
 
         # 2. L-Shaped move.
@@ -153,15 +266,14 @@ class ChessVar:
                 return True
             # Foe at end location. Unobstructed. Captured.
             else:
-                print(
-                    f"{piece_at_end_location_color} {piece_at_end_location_type}"
-                    f" is at the end location; it will be captured."
-                )
-                # Capture piece
-                if piece_at_end_location_color == "WHITE":
-                    self.set_black_captured_pieces(piece_at_end_location_type)
-                else:
-                    self.set_white_captured_pieces(piece_at_end_location_type)
+                if tracer.level >= INFO:
+                    tracer.emit(
+                        INFO,
+                        "capture",
+                        color=piece_at_end_location_color,
+                        piece_type=piece_at_end_location_type,
+                        location=end_coords,
+                    )
                 return True
 
         # 3. Length == 1.
@@ -171,7 +283,12 @@ class ChessVar:
                 if piece_obj.get_piece_type() == "PAWN":
                     # Check if pawn is moving diagonally
                     if directionality == "DIAGONAL":
-                        print("Error: PAWN cannot move diagonally unless capturing.")
+                        if tracer.level >= INFO:
+                            tracer.emit(
+                                INFO,
+                                "move_rejected",
+                                reason="PAWN cannot move diagonally unless capturing.",
+                            )
                         return False
                     else:
                         return True
@@ -182,122 +299,110 @@ class ChessVar:
                 # Check if PAWN is moving PERPENDICULAR - cannot capture
                 if piece_obj.get_piece_type() == "PAWN":
                     if directionality == "PERPENDICULAR":
-                        print("Error: PAWN cannot capture moving PERPENDICULAR.")
+                        if tracer.level >= INFO:
+                            tracer.emit(
+                                INFO,
+                                "move_rejected",
+                                reason="PAWN cannot capture moving PERPENDICULAR.",
+                            )
                         return False
                     else:
-                        print(
-                            f"{piece_at_end_location_color} {piece_at_end_location_type}"
-                            f" is at the end location; it will be captured."
-                        )
-                        # Capture piece
-                        if piece_at_end_location_color == "WHITE":
-                            self.set_black_captured_pieces(piece_at_end_location_type)
-                        else:
-                            self.set_white_captured_pieces(piece_at_end_location_type)
+                        if tracer.level >= INFO:
+                            tracer.emit(
+                                INFO,
+                                "capture",
+                                color=piece_at_end_location_color,
+                                piece_type=piece_at_end_location_type,
+                                location=end_coords,
+                            )
                         return True
                 else:
-                    print(
-                        f"{piece_at_end_location_color} {piece_at_end_location_type}"
-                        f" is at the end location; it will be captured."
-                    )
-                    # Capture piece
-                    if piece_at_end_location_color == "WHITE":
-                        self.set_black_captured_pieces(piece_at_end_location_type)
-                    else:
-                        self.set_white_captured_pieces(piece_at_end_location_type)
+                    if tracer.level >= INFO:
+                        tracer.emit(
+                            INFO,
+                            "capture",
+                            color=piece_at_end_location_color,
+                            piece_type=piece_at_end_location_type,
+                            location=end_coords,
+                        )
                     return True
 
         # 4. Length > 1.
         if length > 1:
-            # 1. Determine if range is positive or negative
-            # 2. Exlude with slice the first coord (start location)
-            # 3. Include end location
-            # 4. Create dict of coords to traverse
-            if move_coords[0][0] > move_coords[1][0]:
-                y_coords = [
-                    y for y in range(move_coords[0][0], move_coords[1][0] - 1, -1)
-                ][1:]
-            elif move_coords[0][0] < move_coords[1][0]:
-                y_coords = [y for y in range(move_coords[0][0], move_coords[1][0] + 1)][
-                    1:
-                ]
-            else:
-                y_coords = [move_coords[0][0]]
-
-            if move_coords[0][1] > move_coords[1][1]:
-                x_coords = [
-                    x for x in range(move_coords[0][1], move_coords[1][1] - 1, -1)
-                ][1:]
-            elif move_coords[0][1] < move_coords[1][1]:
-                x_coords = [x for x in range(move_coords[0][1], move_coords[1][1] + 1)][
-                    1:
-                ]
-            else:
-                x_coords = [move_coords[0][1]]
-
-            # Dict of coords
-            if directionality == "DIAGONAL":
-                coords_list = list(zip(y_coords, x_coords))
-
-            elif directionality == "PERPENDICULAR":
-                coords_list = [(y, x) for y in y_coords for x in x_coords]
+            if directionality not in ("DIAGONAL", "PERPENDICULAR"):
+                if tracer.level >= INFO:
+                    tracer.emit(
+                        INFO,
+                        "move_rejected",
+                        reason=f"{directionality} is not a valid directionality.",
+                    )
+                return False
 
-            else:
-                print(f"Error: {directionality} is not a valid directionality.")
+            # Any piece on the path obstructs the move
+            start_coords = move_coords[0]
+            if tracer.level >= DEBUG:
+                tracer.emit(
+                    DEBUG,
+                    "path",
+                    squares=list(squares_between(start_coords, end_coords))
+                    + [end_coords],
+                )
+            blocker = self._find_blocker(start_coords, end_coords)
+            if blocker is not None:
+                if tracer.level >= INFO:
+                    tracer.emit(
+                        INFO,
+                        "move_rejected",
+                        reason="There is a piece obstructing the move.",
+                        location=blocker,
+                    )
                 return False
 
-            print(f"Coords list: {coords_list}")
-            # Cycle through coords_dict and check if any are != "-"
-            # Check last coord separately to determine if capture is necessary
-            for coords in coords_list:
-                # Are we at the end location?
-                if coords == end_coords:
-                    # Nothing at end location. Unobstructed. Nothing captured.
-                    if piece_at_end_location_color is None:
-                        return True
-                    else:
-                        # Check if PAWN moving PERPENDICULAR - cannot capture
-                        if piece_obj.get_piece_type() == "PAWN":
-                            if directionality == "PERPENDICULAR":
-                                print(
-                                    "Error: PAWN cannot capture moving PERPENDICULAR."
-                                )
-                                return False
-                            else:
-                                print(
-                                    f"{piece_at_end_location_color} {piece_at_end_location_type}"
-                                    f" is at the end location; it will be captured."
-                                )
-                                # Capture piece
-                                if piece_at_end_location_color == "WHITE":
-                                    self.set_black_captured_pieces(
-                                        piece_at_end_location_type
-                                    )
-                                else:
-                                    self.set_white_captured_pieces(
-                                        piece_at_end_location_type
-                                    )
-                                return True
-                        else:
-                            print(
-                                f"{piece_at_end_location_color} {piece_at_end_location_type}"
-                                f" is at the end location; it will be captured."
-                            )
-                            # Capture piece
-                            if piece_at_end_location_color == "WHITE":
-                                self.set_black_captured_pieces(
-                                    piece_at_end_location_type
-                                )
-                            else:
-                                self.set_white_captured_pieces(
-                                    piece_at_end_location_type
-                                )
-                            return True
+            # Nothing at end location. Unobstructed. Nothing captured.
+            if piece_at_end_location_color is None:
+                return True
+            # Check if PAWN moving PERPENDICULAR - cannot capture
+            if (
+                piece_obj.get_piece_type() == "PAWN"
+                and directionality == "PERPENDICULAR"
+            ):
+                if tracer.level >= INFO:
+                    tracer.emit(
+                        INFO,
+                        "move_rejected",
+                        reason="PAWN cannot capture moving PERPENDICULAR.",
+                    )
+                return False
+            if tracer.level >= INFO:
+                tracer.emit(
+                    INFO,
+                    "capture",
+                    color=piece_at_end_location_color,
+                    piece_type=piece_at_end_location_type,
+                    location=end_coords,
+                )
+            return True
 
-                else:
-                    if self._game_board_obj.get_piece(coords) != 0:
-                        print("Error: There is a piece obstructing the move.")
-                        return False
+    def _find_blocker(self, start_location, end_location):
+        """
+        Returns the location of the piece nearest the start strictly
+        between the start and end of a PERPENDICULAR or DIAGONAL move, or
+        None if the path is clear.
+        """
+        tables = self._move_tables
+        if tables is None:
+            return self._game_board_obj.get_occupancy().get_blocker(
+                start_location, end_location
+            )
+        # Squares strictly between start and end, precomputed
+        cols = self._game_board_obj.get_cols()
+        board = self._game_board_obj.get_game_board()
+        for row, col in tables.paths[start_location[0] * cols + start_location[1]][
+            end_location[0] * cols + end_location[1]
+        ]:
+            if board[row][col] != 0:
+                return row, col
+        return None
 
     def is_move_legal(
         self,
@@ -316,95 +421,617 @@ class ChessVar:
         move_sanctioned = piece_obj.is_move_sanctioned(
             bearing, directionality, length, move_coords
         )
-        print(f"Is move sanctioned? {move_sanctioned}")
+        if tracer.level >= DEBUG:
+            tracer.emit(DEBUG, "sanctioned", result=move_sanctioned)
 
         # 2. Move is unobstructed
         move_unobstructed = self.is_move_unobstructed(
             piece_obj, directionality, length, move_coords
         )
-        print(f"Is move unobstructed? {move_unobstructed}")
+        if tracer.level >= DEBUG:
+            tracer.emit(DEBUG, "unobstructed", result=move_unobstructed)
 
         if move_sanctioned and move_unobstructed:
             return True
         else:
             return False
 
-    def is_game_won(self, captured_pieces_dict):
+    def is_game_won(self, color):
         """
-        Cycles through captured pieces dictionary and checks if 2 knights,
-        2 bishops, 2 rooks, 1 queen, 1 king, or 8 pawns have been
-        captured. If so, returns True. Otherwise, returns False.
+        Checks if the given color has captured 2 knights, 2 bishops,
+        2 rooks, 1 queen, 1 king, or 8 pawns. If so, returns True.
+        Otherwise, returns False. The counts are kept up to date on every
+        capture, so this is a constant-time lookup.
         """
-        print(f"Captured pieces dictionary: {captured_pieces_dict}")
-        win_dict = {
-            "KNIGHT": 2,
-            "BISHOP": 2,
-            "ROOK": 2,
-            "QUEEN": 1,
-            "KING": 1,
-            "PAWN": 8,
-        }
-        for piece_type, count in captured_pieces_dict.items():
-            if count == win_dict[piece_type]:
-                return True
-            return False
+        return self._types_won[color] > 0
 
-    def make_move(self, start_location, end_location):
+    def is_legal(self, move):
         """
-        Takes two parameters: strings that represent the square
-        moved from and the square moved to. If the square being
-        moved from does not contain a piece belonging to the player
-        whose turn it is, or if the indicated move is not legal, or
-        if the game has already been won, then it returns False.
-        Otherwise, it makes the indicated move, removes any captured
-        piece, updates the game state if necessary, updates whose turn
-        it is, and returns True.
+        Takes a move as a (start_location, end_location) tuple. Returns
+        False if the game has already been won, if the start location
+        does not contain a piece belonging to the player whose turn it
+        is, or if the move is not sanctioned or is obstructed. Otherwise
+        returns True. Does not change the game. Counts and times each
+        phase in the shared profiler when it is enabled.
         """
+        start_location, end_location = move
+        profiling = profiler.enabled
+        if profiling:
+            start_ns = profiler.start_validation()
+            profiling = start_ns is not None
+
         # First check if game has been won
         if self._game_state != "UNFINISHED":
-            print("Error: A move is not allowed; the game has already been won.")
+            if profiling:
+                profiler.phase("turn_check", start_ns)
+                profiler.reject("game_over")
+            if tracer.level >= INFO:
+                tracer.emit(
+                    INFO,
+                    "move_rejected",
+                    reason="A move is not allowed; the game has already been won.",
+                )
             return False
 
         # If no piece at start location, return False
         if self._game_board_obj.get_piece(start_location) == 0:
-            print("Error: There is no piece at the start location.")
+            if profiling:
+                profiler.phase("turn_check", start_ns)
+                profiler.reject("no_piece")
+            if tracer.level >= INFO:
+                tracer.emit(
+                    INFO,
+                    "move_rejected",
+                    reason="There is no piece at the start location.",
+                )
             return False
         piece = self._game_board_obj.get_piece(start_location)
 
         # Next check if piece belongs to player whose turn it is
         # Whose turn is it?
         game_turn = self._game_board_obj.get_game_turn()
-        print(f"It is {game_turn}'s turn.")
 
         # Get piece attributes
         piece_type = piece.get_piece_type()
         piece_color = piece.get_piece_color()
 
-        print(f"The piece selected to move is: {piece_color} {piece_type}")
+        if tracer.level >= DEBUG:
+            tracer.emit(
+                DEBUG,
+                "move",
+                turn=game_turn,
+                color=piece_color,
+                piece_type=piece_type,
+                start=start_location,
+                end=end_location,
+            )
 
-        if game_turn == "WHITE":
-            if piece_color == "BLACK":
-                print("Error: It's WHITE's turn and the selected piece is BLACK.")
-                return False
-        else:
-            if piece_color == "WHITE":
-                print("Error: It's BLACK's turn and the selected piece is WHITE.")
-                return False
+        if piece_color != game_turn:
+            if profiling:
+                profiler.phase("turn_check", start_ns)
+                profiler.reject("wrong_turn")
+            if tracer.level >= INFO:
+                tracer.emit(
+                    INFO,
+                    "move_rejected",
+                    reason=f"It's {game_turn}'s turn and the selected piece is "
+                    f"{piece_color}.",
+                )
+            return False
+        if profiling:
+            start_ns = profiler.phase("turn_check", start_ns)
+
+        # Validate with occupancy masks if the board keeps them
+        bitboards = self._game_board_obj.get_bitboards()
+        if bitboards is not None:
+            legal = bitboards.is_move_legal(
+                start_location, end_location, piece_color, piece_type
+            )
+            if profiling:
+                profiler.phase("bitboard_check", start_ns)
+                if not legal:
+                    profiler.reject("bitboard_illegal")
+            if legal:
+                return True
+            if tracer.level >= INFO:
+                tracer.emit(
+                    INFO,
+                    "illegal_move",
+                    start=start_location,
+                    end=end_location,
+                )
+            return False
 
         # Get move coordinates
         move_coords = self.get_move_coords(start_location, end_location)
-        print(f"Move coordinates: {move_coords}")
 
         # Categorize type of move
         bearing, directionality, length = self.categorize_move(move_coords)
-        print(f"bearing, direction and length: {bearing, directionality, length}")
+        if profiling:
+            start_ns = profiler.phase("categorize_move", start_ns)
+        if tracer.level >= DEBUG:
+            tracer.emit(
+                DEBUG,
+                "categorized",
+                bearing=bearing,
+                directionality=directionality,
+                length=length,
+            )
 
         # Check if the move is legal
-        if self.is_move_legal(piece, bearing, directionality, length, move_coords):
-            print(f"Moving {piece} from {start_location} to {end_location} is legal")
+        if profiling:
+            legal = self._is_move_legal_profiled(
+                piece, bearing, directionality, length, move_coords, start_ns
+            )
+        else:
+            legal = self.is_move_legal(
+                piece, bearing, directionality, length, move_coords
+            )
+        if legal:
+            if tracer.level >= DEBUG:
+                tracer.emit(DEBUG, "legal_move", start=start_location, end=end_location)
             return True
-            # # Move piece and update board
-            # self._game_board_obj.set_piece(start_location, end_location, piece)
         else:
-            print("Move is either not sanctioned or obstructed!")
+            if tracer.level >= INFO:
+                tracer.emit(
+                    INFO,
+                    "illegal_move",
+                    start=start_location,
+                    end=end_location,
+                )
+            return False
+
+    def _is_move_legal_profiled(
+        self, piece_obj, bearing, directionality, length, move_coords, start_ns
+    ):
+        """
+        Does the same as is_move_legal() for a validation sampled by the
+        profiler, timing each check and recording why a rejected move is
+        illegal.
+        """
+        move_sanctioned = piece_obj.is_move_sanctioned(
+            bearing, directionality, length, move_coords
+        )
+        start_ns = profiler.phase("is_move_sanctioned", start_ns)
+        if tracer.level >= DEBUG:
+            tracer.emit(DEBUG, "sanctioned", result=move_sanctioned)
+
+        move_unobstructed = self.is_move_unobstructed(
+            piece_obj, directionality, length, move_coords
+        )
+        profiler.phase("is_move_unobstructed", start_ns)
+        if tracer.level >= DEBUG:
+            tracer.emit(DEBUG, "unobstructed", result=move_unobstructed)
+
+        if not move_sanctioned:
+            profiler.reject("not_sanctioned")
+        elif not move_unobstructed:
+            profiler.reject(
+                self._obstruction_reason(piece_obj, directionality, length, move_coords)
+            )
+        return move_sanctioned and move_unobstructed
+
+    def _obstruction_reason(self, piece_obj, directionality, length, move_coords):
+        """
+        Returns the profiler's rejection category for a move which
+        is_move_unobstructed() rejected.
+        """
+        piece_at_end_location = self._game_board_obj.get_piece(move_coords[1])
+        if piece_at_end_location != 0:
+            if piece_at_end_location.get_piece_color() == piece_obj.get_piece_color():
+                return "same_color_at_end"
+        if piece_obj.get_piece_type() == "PAWN":
+            if piece_at_end_location == 0 and length == 1:
+                return "pawn_diagonal_without_capture"
+            if piece_at_end_location != 0 and directionality == "PERPENDICULAR":
+                if self._find_blocker(*move_coords) is None:
+                    return "pawn_perpendicular_capture"
+        return "obstructed"
+
+    def make_move(self, start_location, end_location):
+        """
+        Takes two parameters: strings that represent the square
+        moved from and the square moved to. If the square being
+        moved from does not contain a piece belonging to the player
+        whose turn it is, or if the indicated move is not legal, or
+        if the game has already been won, then it returns False.
+        Otherwise, it makes the indicated move, removes any captured
+        piece, updates the game state if necessary, updates whose turn
+        it is, records the move in the game history if there is one, and
+        returns True.
+        """
+        move = (start_location, end_location)
+        if not self.is_legal(move):
             return False
+        if profiler.enabled:
+            profiler.accepted += 1
+            if profiler.timing:
+                start_ns = time.perf_counter_ns()
+                self.push(move)
+                profiler.phase("push", start_ns)
+            else:
+                self.push(move)
+        else:
+            self.push(move)
+        if self._history is not None:
+            self._history.record(move)
+        return True
+
+    def push(self, move):
+        """
+        Applies a move given as a (start_location, end_location) tuple:
+        moves the piece, records any captured piece, updates the game
+        state if the move wins the game and otherwise updates whose turn
+        it is. The move is not checked; use is_legal() first. Every push
+        can be reverted exactly with pop().
+        """
+        start_location, end_location = move
+        board_obj = self._game_board_obj
+        piece = board_obj.get_piece(start_location)
+        captured_piece = board_obj.get_piece(end_location)
+
+        self._move_stack.append(
+            (
+                move,
+                piece,
+                captured_piece,
+                self._game_state,
+                board_obj.get_game_turn(),
+            )
+        )
+
+        board_obj.set_piece(start_location, end_location, piece)
+        self.capture_piece(captured_piece)
+
+        # Check if game has been won with current move
+        piece_color = piece.get_piece_color()
+        if captured_piece != 0 and self._types_won[piece_color]:
+            self._game_state = piece_color + "_WON"
+
+        # Update game turn
+        if self._game_state == "UNFINISHED":
+            if board_obj.get_game_turn() == "WHITE":
+                board_obj.set_game_turn("BLACK")
+            else:
+                board_obj.set_game_turn("WHITE")
+
+    def pop(self):
+        """
+        Reverts the last pushed move, restoring the board squares, the
+        captured pieces, the game state and whose turn it is. Returns
+        the reverted move.
+        """
+        move, piece, captured_piece, game_state, game_turn = self._move_stack.pop()
+        start_location, end_location = move
+        board_obj = self._game_board_obj
+
+        board_obj.set_piece(end_location, start_location, piece)
+        if captured_piece != 0:
+            board_obj.place_piece(end_location, captured_piece)
+            self.uncapture_piece(captured_piece)
+
+        self._game_state = game_state
+        board_obj.set_game_turn(game_turn)
+        return move
+
+    def get_move_count(self):
+        """
+        Returns the number of moves made since the game started (or since
+        the last set_position) which have not been popped.
+        """
+        return len(self._move_stack)
+
+    def get_position(self):
+        """
+        Returns a compact Position snapshot of the game: the piece codes
+        of the board, whose turn it is, the game state and the captured
+        pieces. The move history is not included.
+        """
+        board_obj = self._game_board_obj
+        return Position.build(
+            board_obj.get_squares(),
+            board_obj.get_rows(),
+            board_obj.get_cols(),
+            board_obj.get_game_turn(),
+            self._game_state,
+            self._white_captured_pieces,
+            self._black_captured_pieces,
+        )
+
+    def get_history(self):
+        """
+        Returns the GameHistory of the game, creating it on first use with
+        the current position as its root. Moves made with make_move from
+        then on are recorded in it.
+        """
+        if self._history is None:
+            self._history = GameHistory(self)
+        return self._history
+
+    def undo(self):
+        """
+        Moves the game one ply back in its history (see get_history).
+        Returns False if there is no earlier position.
+        """
+        return self.get_history().undo()
+
+    def redo(self):
+        """
+        Moves the game one ply forward in its history, along the line last
+        undone. Returns False if there is no later position.
+        """
+        return self.get_history().redo()
+
+    def go_to_ply(self, ply):
+        """
+        Moves the game to the given ply of the current line of its history.
+        """
+        self.get_history().go_to_ply(ply)
+
+    def set_position(self, position):
+        """
+        Replaces the game with the given Position snapshot and clears the
+        move history and game history, so earlier moves can no longer be
+        popped or undone.
+        """
+        self._load_position(position)
+        self._history = None
+
+    def _load_position(self, position):
+        """
+        Replaces the game with the given Position snapshot and clears the
+        move stack, keeping the game history.
+        """
+        self._game_board_obj.update_squares(
+            position.get_squares(), position.get_game_turn()
+        )
+        self._game_state = position.get_game_state()
+        self._white_captured_pieces = {}
+        self._black_captured_pieces = {}
+        self._remaining_to_win = {
+            "WHITE": dict(self._win_thresholds["WHITE"]),
+            "BLACK": dict(self._win_thresholds["BLACK"]),
+        }
+        self._types_won = {"WHITE": 0, "BLACK": 0}
+        for color in ("WHITE", "BLACK"):
+            for piece_type, count in position.get_captured_pieces(color).items():
+                for _ in range(count):
+                    if color == "WHITE":
+                        self.set_white_captured_pieces(piece_type)
+                    else:
+                        self.set_black_captured_pieces(piece_type)
+        self._move_stack = []
+
+    def legal_moves(self):
+        """
+        Returns a list of all legal moves for the player whose turn it is,
+        as (start_location, end_location) tuples. Returns an empty list if
+        the game has already been won.
+        """
+        if self._game_state != "UNFINISHED":
+            return []
+
+        board_obj = self._game_board_obj
+        if self._move_cache is not None:
+            cached_moves = self._move_cache.probe(board_obj.get_hash())
+            if cached_moves is not None:
+                return list(cached_moves)
+
+        moves = []
+        for location in sorted(
+            board_obj.get_color_locations(board_obj.get_game_turn())
+        ):
+            moves.extend(self.legal_moves_from(location))
+
+        if self._move_cache is not None:
+            self._move_cache.store(board_obj.get_hash(), tuple(moves))
+        return moves
+
+    def get_pieces_reaching(self, square, color):
+        """
+        Returns a list of the locations of the given color's pieces which
+        could legally move to (or capture on) square if it were that
+        color's turn.
+        """
+        board_obj = self._game_board_obj
+        bitboards = board_obj.get_bitboards()
+        locations = []
+        for piece_type in WIN_THRESHOLDS:
+            for location in board_obj.get_piece_locations(color, piece_type):
+                if bitboards is not None:
+                    legal = bitboards.is_move_legal(location, square, color, piece_type)
+                else:
+                    move_coords = self.get_move_coords(location, square)
+                    bearing, directionality, length = self.categorize_move(move_coords)
+                    legal = self.is_move_legal(
+                        board_obj.get_piece(location),
+                        bearing,
+                        directionality,
+                        length,
+                        move_coords,
+                    )
+                if legal:
+                    locations.append(location)
+        locations.sort()
+        return locations
+
+    def legal_moves_from(self, square):
+        """
+        Returns a list of all legal moves for the piece on the given square,
+        as (start_location, end_location) tuples ordered by end location.
+        Moves are generated from each piece's movement pattern with the same
+        rules as is_move_sanctioned() and is_move_unobstructed(). Returns an
+        empty list if there is no piece of the player whose turn it is on
+        the square, or if the game has already been won.
+        """
+        if self._game_state != "UNFINISHED":
+            return []
+
+        board_obj = self._game_board_obj
+        piece = board_obj.get_piece(square)
+        if piece == 0 or piece.get_piece_color() != board_obj.get_game_turn():
+            return []
+
+        piece_type = piece.get_piece_type()
+        piece_color = piece.get_piece_color()
+        cols = board_obj.get_cols()
+
+        # Read the targets straight off the occupancy masks if available
+        bitboards = board_obj.get_bitboards()
+        if bitboards is not None:
+            targets = bitboards.get_legal_targets(square, piece_color, piece_type)
+            moves = []
+            while targets:
+                end_bit = targets & -targets
+                targets ^= end_bit
+                moves.append((square, divmod(end_bit.bit_length() - 1, cols)))
+            return moves
+
+        tables = self._move_tables
+        if tables is None:
+            return [
+                (square, end_location)
+                for end_location in sorted(
+                    self._get_sparse_targets(square, piece_type, piece_color)
+                )
+            ]
+
+        board = board_obj.get_game_board()
+        start = square[0] * cols + square[1]
+        end_locations = []
+
+        def is_foe(end_row, end_col):
+            end_piece = board[end_row][end_col]
+            return end_piece != 0 and end_piece.get_piece_color() != piece_color
+
+        if piece_type in SLIDING_DIRECTIONS:
+            for direction in SLIDING_DIRECTIONS[piece_type]:
+                for end_row, end_col in tables.rays[direction][start]:
+                    if board[end_row][end_col] != 0:
+                        if is_foe(end_row, end_col):
+                            end_locations.append((end_row, end_col))
+                        break
+                    end_locations.append((end_row, end_col))
+
+        elif piece_type == "KING" or piece_type == "KNIGHT":
+            # A KNIGHT reaches every square not PERPENDICULAR or DIAGONAL
+            if piece_type == "KING":
+                targets = tables.king[start]
+            else:
+                targets = tables.knight[start]
+            for end_row, end_col in targets:
+                if board[end_row][end_col] == 0 or is_foe(end_row, end_col):
+                    end_locations.append((end_row, end_col))
+
+        else:
+            # Forward moves only onto empty squares, through empty squares
+            for (end_row, end_col), via in tables.pawn_pushes[piece_color][start]:
+                if via is not None and board[via[0]][via[1]] != 0:
+                    break
+                if board[end_row][end_col] == 0:
+                    end_locations.append((end_row, end_col))
+            # Diagonal moves capture 1 space away; 2 spaces away they may
+            # also land on an empty square
+            for (end_row, end_col), via, may_land_empty in tables.pawn_captures[
+                piece_color
+            ][start]:
+                if via is not None and board[via[0]][via[1]] != 0:
+                    continue
+                if is_foe(end_row, end_col) or (
+                    may_land_empty and board[end_row][end_col] == 0
+                ):
+                    end_locations.append((end_row, end_col))
+
+        end_locations.sort()
+        return [(square, end_location) for end_location in end_locations]
+
+    def _get_sparse_targets(self, square, piece_type, piece_color):
+        """
+        Returns a list of the end locations the piece of the given type
+        and color on square can legally move to on a sparse board, with
+        the same rules as legal_moves_from(). Rays are cut at the nearest
+        piece found in the board's line occupancy, so no empty squares
+        are scanned.
+        """
+        board_obj = self._game_board_obj
+        board = board_obj.get_game_board()
+        occupancy = board_obj.get_occupancy()
+        rows = board_obj.get_rows()
+        cols = board_obj.get_cols()
+        row, col = square
+        end_locations = []
+
+        def is_foe(end_row, end_col):
+            end_piece = board[end_row][end_col]
+            return end_piece != 0 and end_piece.get_piece_color() != piece_color
+
+        if piece_type in SLIDING_DIRECTIONS:
+            for direction in SLIDING_DIRECTIONS[piece_type]:
+                row_step, col_step = direction
+                blocker = occupancy.get_nearest(square, direction)
+                if blocker is not None:
+                    length = max(abs(blocker[0] - row), abs(blocker[1] - col))
+                    if is_foe(*blocker):
+                        end_locations.append(blocker)
+                    length -= 1
+                else:
+                    # Squares to the edge of the board
+                    length = min(
+                        (row, rows + cols, rows - 1 - row)[row_step + 1],
+                        (col, rows + cols, cols - 1 - col)[col_step + 1],
+                    )
+                for i in range(1, length + 1):
+                    end_locations.append((row + i * row_step, col + i * col_step))
+
+        elif piece_type == "KING":
+            for end_row in range(max(row - 1, 0), min(row + 2, rows)):
+                for end_col in range(max(col - 1, 0), min(col + 2, cols)):
+                    if board[end_row][end_col] == 0 or is_foe(end_row, end_col):
+                        if (end_row, end_col) != square:
+                            end_locations.append((end_row, end_col))
+
+        elif piece_type == "KNIGHT":
+            # Every square not PERPENDICULAR or DIAGONAL to the start
+            for end_row in range(rows):
+                distance = abs(end_row - row)
+                if distance == 0:
+                    continue
+                excluded = {col, col - distance, col + distance}
+                pieces = board.get(end_row)
+                if pieces:
+                    excluded.update(
+                        end_col
+                        for end_col, end_piece in pieces.items()
+                        if end_piece.get_piece_color() == piece_color
+                    )
+                end_locations.extend(
+                    (end_row, end_col)
+                    for end_col in range(cols)
+                    if end_col not in excluded
+                )
+
+        else:
+            pushes, captures = pawn_moves(
+                square,
+                piece_color,
+                rows,
+                cols,
+                board_obj.get_pawn_start_rows()[piece_color],
+            )
+            # Forward moves only onto empty squares, through empty squares
+            for (end_row, end_col), via in pushes:
+                if via is not None and board[via[0]][via[1]] != 0:
+                    break
+                if board[end_row][end_col] == 0:
+                    end_locations.append((end_row, end_col))
+            # Diagonal moves capture 1 space away; 2 spaces away they may
+            # also land on an empty square
+            for (end_row, end_col), via, may_land_empty in captures:
+                if via is not None and board[via[0]][via[1]] != 0:
+                    continue
+                if is_foe(end_row, end_col) or (
+                    may_land_empty and board[end_row][end_col] == 0
+                ):
+                    end_locations.append((end_row, end_col))
+
+        return end_locations
@@ -0,0 +1,471 @@
+import time
+
+from TranspositionTable import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+from Evaluation import load_weights, load_default_weights
+
+# Score of a won game; wins found sooner score higher
+WIN_SCORE = 1000000
+WIN_BOUND = WIN_SCORE - 1000
+
+# Value of being d captures away from capturing every piece of one type.
+# Every type counts, since any one of them wins the game.
+DEFAULT_DISTANCE_WEIGHTS = {1: 400, 2: 120, 3: 50, 4: 25, 5: 12, 6: 6, 7: 3, 8: 0}
+
+# How often (in nodes) the time budget is checked
+CHECK_INTERVAL = 512
+
+
+class SearchAborted(Exception):
+    """
+    Raised inside the search when the time or node budget runs out.
+    """
+
+
+class Engine:
+    """
+    Represents a computer player for ChessVar which chooses moves with an
+    iterative-deepening alpha-beta (negamax) search, a transposition
+    table, capture-first move ordering with killer moves, and a captures
+    only quiescence search. The evaluation scores each side by how close
+    it is to capturing every piece of one type, the win condition checked
+    by ChessVar.is_game_won, or uses weights fitted offline (see
+    Evaluation and Training).
+    """
+
+    def __init__(
+        self,
+        max_time=1.0,
+        max_nodes=None,
+        max_depth=64,
+        tt_entries=1 << 18,
+        distance_weights=None,
+        book=None,
+        book_plies=16,
+        book_rng=None,
+        weights=None,
+        table=None,
+        exact_depth=False,
+        stop_flag=None,
+    ):
+        """
+        Creates an Engine which searches for at most max_time seconds,
+        max_nodes nodes (None for no limit) and max_depth plies per move.
+        If book is an OpeningBook, its moves are played without searching
+        for the first book_plies plies of a game, picked at random by
+        weight if book_rng (a random.Random) is given. weights (an
+        EvalWeights or the path of a weights file, by default the file
+        named by CHESSVAR_WEIGHTS if set) replaces the built-in
+        evaluation, and its distance weights order captures unless
+        distance_weights is given. table replaces the engine's own
+        transposition table, e.g. with a SharedTranspositionTable. If
+        exact_depth is True, table entries only cut the search off at the
+        depth they were searched to, so a fixed-depth search scores moves
+        the same whatever else the table holds. The search also stops
+        when stop_flag (e.g. a multiprocessing.Value), if given, is set.
+        """
+        self._max_time = max_time
+        self._max_nodes = max_nodes
+        self._max_depth = max_depth
+        if table is None:
+            table = TranspositionTable(tt_entries)
+        self._table = table
+        self._exact_depth = exact_depth
+        self._stop_flag = stop_flag
+        if weights is None:
+            weights = load_default_weights()
+        elif isinstance(weights, str):
+            weights = load_weights(weights)
+        self._weights = weights
+        if distance_weights is None:
+            if weights is not None:
+                distance_weights = weights.get_distance_weights()
+            else:
+                distance_weights = DEFAULT_DISTANCE_WEIGHTS
+        self._distance_weights = distance_weights
+        self._book = book
+        self._book_plies = book_plies
+        self._book_rng = book_rng
+
+        self._game = None
+        self._nodes = 0
+        self._deadline = None
+        self._node_limit = None
+        self._killers = []
+        self._last_info = {}
+
+    def get_last_info(self):
+        """
+        Returns a dict describing the last search: the best move, its
+        score, the depth completed, the number of nodes, the time taken
+        and whether the move came from the opening book.
+        """
+        return self._last_info
+
+    def get_table(self):
+        """
+        Returns the engine's transposition table.
+        """
+        return self._table
+
+    def get_weights(self):
+        """
+        Returns the engine's EvalWeights, or None if it uses the built-in
+        evaluation.
+        """
+        return self._weights
+
+    def evaluate(self, game, color):
+        """
+        Returns the score of the position for color: the value of how
+        close color is to winning minus the value of how close the other
+        color is, or the score given by the engine's EvalWeights.
+        """
+        if self._weights is not None:
+            return self._weights.evaluate(game, color)
+        weights = self._distance_weights
+        other_color = "BLACK" if color == "WHITE" else "WHITE"
+        score = 0
+        for distance in game.get_distance_to_win(color).values():
+            score += weights.get(distance, 0)
+        for distance in game.get_distance_to_win(other_color).values():
+            score -= weights.get(distance, 0)
+        return score
+
+    def choose_move(self, game):
+        """
+        Returns the move the engine would play for the player whose turn
+        it is, or None if there are no legal moves. The game is left as
+        it was.
+        """
+        return self.search(game)[0]
+
+    def search(self, game, max_depth=None, max_time=None, max_nodes=None):
+        """
+        Searches the game's position with iterative deepening until the
+        depth, time or node budget runs out (arguments override the
+        engine's defaults). Returns a (move, score, depth) tuple for the
+        deepest completed iteration, with score from the point of view of
+        the player whose turn it is. A book move is returned at once with
+        a score and depth of 0.
+        """
+        if max_depth is None:
+            max_depth = self._max_depth
+        if max_time is None:
+            max_time = self._max_time
+        if max_nodes is None:
+            max_nodes = self._max_nodes
+
+        start = time.perf_counter()
+        if self._book is not None and game.get_move_count() < self._book_plies:
+            move = self._book.choose_move(game, self._book_rng)
+            if move is not None:
+                self._last_info = {
+                    "move": move,
+                    "score": 0,
+                    "depth": 0,
+                    "nodes": 0,
+                    "seconds": time.perf_counter() - start,
+                    "book": True,
+                }
+                return move, 0, 0
+
+        self._game = game
+        self._nodes = 0
+        self._deadline = None if max_time is None else start + max_time
+        self._node_limit = max_nodes
+        self._killers = [[None, None] for _ in range(max_depth + 64)]
+
+        color = game.get_board().get_game_turn()
+        moves = game.legal_moves()
+        best_move = moves[0] if moves else None
+        best_score = 0
+        completed_depth = 0
+
+        if len(moves) > 1:
+            for depth in range(1, max_depth + 1):
+                try:
+                    score, move = self._search_root(moves, depth, color)
+                except SearchAborted:
+                    break
+                best_move, best_score, completed_depth = move, score, depth
+                # Search the best move first on the next iteration
+                moves.remove(move)
+                moves.insert(0, move)
+                if abs(score) >= WIN_BOUND:
+                    break
+
+        self._game = None
+        self._last_info = {
+            "move": best_move,
+            "score": best_score,
+            "depth": completed_depth,
+            "nodes": self._nodes,
+            "seconds": time.perf_counter() - start,
+            "book": False,
+        }
+        return best_move, best_score, completed_depth
+
+    def set_exact_depth(self, exact_depth):
+        """
+        Sets whether table entries only cut the search off at the depth
+        they were searched to (see __init__).
+        """
+        self._exact_depth = exact_depth
+
+    def set_stop_flag(self, stop_flag):
+        """
+        Sets the flag (see __init__) which stops the search when set, e.g.
+        from another thread.
+        """
+        self._stop_flag = stop_flag
+
+    def search_move(self, game, move, depth, alpha=None, max_time=None):
+        """
+        Returns the score of playing move in the game's position for the
+        player whose turn it is, searching the reply to depth - 1 plies.
+        A score greater than alpha (by default lower than any score) is
+        exact; a lower one only bounds the move's score from above.
+        Returns None if max_time seconds or the stop flag run out first.
+        Used to split the root moves of a search between processes.
+        """
+        if alpha is None:
+            alpha = -WIN_SCORE - 1
+        start = time.perf_counter()
+        self._game = game
+        self._nodes = 0
+        self._deadline = None if max_time is None else start + max_time
+        self._node_limit = None
+        self._killers = [[None, None] for _ in range(depth + 64)]
+        other = "BLACK" if game.get_board().get_game_turn() == "WHITE" else "WHITE"
+        game.push(move)
+        try:
+            # Moves still queued when a parallel search is stopped return at once
+            self._check_budget()
+            score = -self._negamax(depth - 1, -WIN_SCORE - 1, -alpha, 1, other)
+        except SearchAborted:
+            score = None
+        finally:
+            game.pop()
+            self._game = None
+        self._last_info = {
+            "move": move,
+            "score": score,
+            "depth": depth,
+            "nodes": self._nodes,
+            "seconds": time.perf_counter() - start,
+            "book": False,
+        }
+        return score
+
+    def _check_budget(self):
+        """
+        Raises SearchAborted if the time or node budget has run out.
+        """
+        if self._node_limit is not None and self._nodes >= self._node_limit:
+            raise SearchAborted()
+        if self._deadline is not None and time.perf_counter() >= self._deadline:
+            raise SearchAborted()
+        if self._stop_flag is not None and self._stop_flag.value:
+            raise SearchAborted()
+
+    def _search_root(self, moves, depth, color):
+        """
+        Searches every root move to the given depth. Returns the best
+        (score, move) tuple.
+        """
+        game = self._game
+        other = "BLACK" if color == "WHITE" else "WHITE"
+        alpha = -WIN_SCORE - 1
+        best_move = moves[0]
+        for move in moves:
+            game.push(move)
+            try:
+                score = -self._negamax(depth - 1, -WIN_SCORE - 1, -alpha, 1, other)
+            finally:
+                game.pop()
+            if score > alpha:
+                alpha = score
+                best_move = move
+
+        self._table.store(game.get_board().get_hash(), (alpha, EXACT, best_move), depth)
+        return alpha, best_move
+
+    def _capture_gain(self, color, captured_type):
+        """
+        Returns how much color's evaluation rises by capturing a piece of
+        captured_type, used to order captures. Capturing a type color
+        cannot win by (left out of its win thresholds) gains nothing.
+        """
+        distance = self._game.get_distance_to_win(color).get(captured_type)
+        if distance is None:
+            return 0
+        if distance <= 1:
+            return WIN_SCORE
+        weights = self._distance_weights
+        return weights.get(distance - 1, 0) - weights.get(distance, 0)
+
+    def _ordered_moves(self, color, tt_move, ply):
+        """
+        Returns the legal moves ordered best first: the transposition
+        table move, then captures by gain, then killer moves, then the
+        remaining quiet moves.
+        """
+        board = self._game.get_board().get_game_board()
+        killers = self._killers[ply]
+        tt_moves = []
+        captures = []
+        killer_moves = []
+        quiet = []
+        for move in self._game.legal_moves():
+            end_row, end_col = move[1]
+            target = board[end_row][end_col]
+            if move == tt_move:
+                tt_moves.append(move)
+            elif target != 0:
+                captures.append(
+                    (self._capture_gain(color, target.get_piece_type()), move)
+                )
+            elif move == killers[0] or move == killers[1]:
+                killer_moves.append(move)
+            else:
+                quiet.append(move)
+
+        captures.sort(key=lambda entry: entry[0], reverse=True)
+        return tt_moves + [move for _, move in captures] + killer_moves + quiet
+
+    def _negamax(self, depth, alpha, beta, ply, color):
+        """
+        Returns the score of the current position for color, the player
+        to move, searched to the given depth with an alpha-beta window.
+        """
+        self._nodes += 1
+        if self._nodes % CHECK_INTERVAL == 0:
+            self._check_budget()
+
+        game = self._game
+        # The previous move won the game
+        if game.get_game_state() != "UNFINISHED":
+            return -WIN_SCORE + ply
+
+        if depth <= 0:
+            return self._quiesce(alpha, beta, ply, color)
+
+        key = game.get_board().get_hash()
+        tt_move = None
+        entry = self._table.probe_with_depth(key)
+        if entry is not None:
+            (score, flag, tt_move), entry_depth = entry
+            if entry_depth == depth or (entry_depth > depth and not self._exact_depth):
+                score = self._score_from_table(score, ply)
+                if flag == EXACT:
+                    return score
+                if flag == LOWER_BOUND and score > alpha:
+                    alpha = score
+                elif flag == UPPER_BOUND and score < beta:
+                    beta = score
+                if alpha >= beta:
+                    return score
+
+        moves = self._ordered_moves(color, tt_move, ply)
+        if not moves:
+            return 0
+
+        other = "BLACK" if color == "WHITE" else "WHITE"
+        original_alpha = alpha
+        best_score = -WIN_SCORE - 1
+        best_move = moves[0]
+        board = game.get_board().get_game_board()
+        for move in moves:
+            is_capture = board[move[1][0]][move[1][1]] != 0
+            game.push(move)
+            try:
+                score = -self._negamax(depth - 1, -beta, -alpha, ply + 1, other)
+            finally:
+                game.pop()
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        if not is_capture:
+                            killers = self._killers[ply]
+                            if killers[0] != move:
+                                killers[1] = killers[0]
+                                killers[0] = move
+                        break
+
+        if best_score <= original_alpha:
+            flag = UPPER_BOUND
+        elif best_score >= beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        self._table.store(
+            key, (self._score_to_table(best_score, ply), flag, best_move), depth
+        )
+        return best_score
+
+    def _quiesce(self, alpha, beta, ply, color):
+        """
+        Returns the score of the current position for color after
+        searching captures only, so positions are not scored in the
+        middle of an exchange.
+        """
+        self._nodes += 1
+        if self._nodes % CHECK_INTERVAL == 0:
+            self._check_budget()
+
+        game = self._game
+        if game.get_game_state() != "UNFINISHED":
+            return -WIN_SCORE + ply
+
+        stand_pat = self.evaluate(game, color)
+        if stand_pat >= beta:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+
+        board = game.get_board().get_game_board()
+        captures = []
+        for move in game.legal_moves():
+            target = board[move[1][0]][move[1][1]]
+            if target != 0:
+                captures.append(
+                    (self._capture_gain(color, target.get_piece_type()), move)
+                )
+        captures.sort(key=lambda entry: entry[0], reverse=True)
+
+        other = "BLACK" if color == "WHITE" else "WHITE"
+        for _, move in captures:
+            game.push(move)
+            try:
+                score = -self._quiesce(-beta, -alpha, ply + 1, other)
+            finally:
+                game.pop()
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    def _score_to_table(self, score, ply):
+        """
+        Converts a win score found ply moves from the root into one
+        relative to the stored position.
+        """
+        if score >= WIN_BOUND:
+            return score + ply
+        if score <= -WIN_BOUND:
+            return score - ply
+        return score
+
+    def _score_from_table(self, score, ply):
+        """
+        Converts a stored win score back into one relative to the root.
+        """
+        if score >= WIN_BOUND:
+            return score - ply
+        if score <= -WIN_BOUND:
+            return score + ply
+        return score
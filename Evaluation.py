@@ -0,0 +1,203 @@
+import json
+import os
+
+from Bitboard import PIECE_TYPES
+
+# Weights file format written by Training.py and read by Engine
+WEIGHTS_FORMAT = "chessvar-eval-weights"
+WEIGHTS_VERSION = 1
+
+# Distances to a win (captures still needed of one type) with a feature
+MAX_DISTANCE = 8
+
+# Features of a position for one color, by group. Each is the value for
+# that color minus the value for the other color, so a position scores
+# the same for one color as minus its score for the other:
+#   distance_d: piece types the color is d captures away from winning by
+#   material_T: pieces of type T the color has
+#   mobility: legal moves the color has
+#   attacked_T: pieces of type T of the other color the color can capture
+FEATURE_GROUPS = {
+    "distance": tuple(
+        f"distance_{distance}" for distance in range(1, MAX_DISTANCE + 1)
+    ),
+    "material": tuple(f"material_{piece_type}" for piece_type in PIECE_TYPES),
+    "mobility": ("mobility",),
+    "attacked": tuple(f"attacked_{piece_type}" for piece_type in PIECE_TYPES),
+}
+FEATURE_NAMES = tuple(name for names in FEATURE_GROUPS.values() for name in names)
+
+
+def load_weights(path):
+    """
+    Returns the EvalWeights of a weights file, raising ValueError if it is
+    not one.
+    """
+    with open(path) as weights_file:
+        data = json.load(weights_file)
+    if data.get("format") != WEIGHTS_FORMAT or data.get("version") != WEIGHTS_VERSION:
+        raise ValueError(f"{path} is not a version {WEIGHTS_VERSION} weights file")
+    return EvalWeights(data["weights"])
+
+
+def save_weights(path, weights, info=None):
+    """
+    Writes a weights file for the given dict of weights by feature name,
+    with info (a dict, e.g. how the weights were fitted) stored alongside.
+    """
+    data = {"format": WEIGHTS_FORMAT, "version": WEIGHTS_VERSION}
+    data.update(info or {})
+    data["weights"] = {name: weights.get(name, 0.0) for name in FEATURE_NAMES}
+    with open(path, "w") as weights_file:
+        json.dump(data, weights_file, indent=2)
+        weights_file.write("\n")
+
+
+def load_default_weights():
+    """
+    Returns the EvalWeights of the file named by the CHESSVAR_WEIGHTS
+    environment variable, or None if it is not set.
+    """
+    path = os.environ.get("CHESSVAR_WEIGHTS")
+    if not path:
+        return None
+    return load_weights(path)
+
+
+def _get_color_moves(game, color):
+    """
+    Returns the legal moves color would have if it were its turn.
+    """
+    board_obj = game.get_board()
+    game_turn = board_obj.get_game_turn()
+    if game_turn == color:
+        return game.legal_moves()
+    board_obj.set_game_turn(color)
+    try:
+        return game.legal_moves()
+    finally:
+        board_obj.set_game_turn(game_turn)
+
+
+def _count_attacked(game, moves):
+    """
+    Returns a dict of how many pieces of each type the given moves
+    capture, counting each captured square once.
+    """
+    board_obj = game.get_board()
+    counts = {}
+    for end_location in {move[1] for move in moves}:
+        target = board_obj.get_piece(end_location)
+        if target != 0:
+            piece_type = target.get_piece_type()
+            counts[piece_type] = counts.get(piece_type, 0) + 1
+    return counts
+
+
+class EvalWeights:
+    """
+    Represents a linear evaluation: a weight, in engine score units, for
+    each feature of FEATURE_NAMES. A position scores the sum of its
+    features for a color times their weights. Feature groups whose
+    weights are all zero are not computed, so weights without mobility
+    or attacked features evaluate without generating any moves.
+    """
+
+    def __init__(self, weights):
+        """
+        Creates EvalWeights from a dict of weights by feature name;
+        features left out weigh 0. Raises ValueError for unknown names.
+        """
+        unknown = set(weights) - set(FEATURE_NAMES)
+        if unknown:
+            raise ValueError(f"unknown features: {', '.join(sorted(unknown))}")
+        self._weights = {name: float(weights.get(name, 0.0)) for name in FEATURE_NAMES}
+        self._distance_weights = {
+            distance: self._weights[f"distance_{distance}"]
+            for distance in range(1, MAX_DISTANCE + 1)
+        }
+        self._material_weights = {
+            piece_type: self._weights[f"material_{piece_type}"]
+            for piece_type in PIECE_TYPES
+            if self._weights[f"material_{piece_type}"]
+        }
+        self._attacked_weights = {
+            piece_type: self._weights[f"attacked_{piece_type}"]
+            for piece_type in PIECE_TYPES
+            if self._weights[f"attacked_{piece_type}"]
+        }
+        self._mobility_weight = self._weights["mobility"]
+
+    def get_weights(self):
+        """
+        Returns the dict of weights by feature name. The dict must not be
+        modified.
+        """
+        return self._weights
+
+    def get_distance_weights(self):
+        """
+        Returns the weights of the distance features as a dict by
+        distance, in the form of Engine's distance_weights.
+        """
+        return self._distance_weights
+
+    def get_features(self, game, color):
+        """
+        Returns the list of every feature of the game's position for
+        color, in FEATURE_NAMES order.
+        """
+        board_obj = game.get_board()
+        other_color = "BLACK" if color == "WHITE" else "WHITE"
+        features = []
+        for distance in range(1, MAX_DISTANCE + 1):
+            features.append(
+                list(game.get_distance_to_win(color).values()).count(distance)
+                - list(game.get_distance_to_win(other_color).values()).count(distance)
+            )
+        for piece_type in PIECE_TYPES:
+            features.append(
+                len(board_obj.get_piece_locations(color, piece_type))
+                - len(board_obj.get_piece_locations(other_color, piece_type))
+            )
+        moves = _get_color_moves(game, color)
+        other_moves = _get_color_moves(game, other_color)
+        features.append(len(moves) - len(other_moves))
+        attacked = _count_attacked(game, moves)
+        other_attacked = _count_attacked(game, other_moves)
+        for piece_type in PIECE_TYPES:
+            features.append(
+                attacked.get(piece_type, 0) - other_attacked.get(piece_type, 0)
+            )
+        return features
+
+    def evaluate(self, game, color):
+        """
+        Returns the score of the game's position for color, rounded to a
+        whole number of engine score units.
+        """
+        board_obj = game.get_board()
+        other_color = "BLACK" if color == "WHITE" else "WHITE"
+        weights = self._distance_weights
+        score = 0.0
+        for distance in game.get_distance_to_win(color).values():
+            score += weights.get(distance, 0.0)
+        for distance in game.get_distance_to_win(other_color).values():
+            score -= weights.get(distance, 0.0)
+        for piece_type, weight in self._material_weights.items():
+            score += weight * (
+                len(board_obj.get_piece_locations(color, piece_type))
+                - len(board_obj.get_piece_locations(other_color, piece_type))
+            )
+        if self._mobility_weight or self._attacked_weights:
+            moves = _get_color_moves(game, color)
+            other_moves = _get_color_moves(game, other_color)
+            score += self._mobility_weight * (len(moves) - len(other_moves))
+            if self._attacked_weights:
+                attacked = _count_attacked(game, moves)
+                other_attacked = _count_attacked(game, other_moves)
+                for piece_type, weight in self._attacked_weights.items():
+                    score += weight * (
+                        attacked.get(piece_type, 0) - other_attacked.get(piece_type, 0)
+                    )
+        return round(score)
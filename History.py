@@ -0,0 +1,316 @@
+from Position import Position, GAME_STATES, captured_bytes
+
+# Moves further from the current node than this are reached by restoring
+# the target's snapshot rather than by popping and pushing moves one by one
+RESTORE_DISTANCE = 16
+
+
+def _captured_bytes(game):
+    """
+    Returns the pieces of each type captured by WHITE and by BLACK in the
+    given game, in Position's layout.
+    """
+    return captured_bytes(
+        game.get_white_captured_pieces(), game.get_black_captured_pieces()
+    )
+
+
+class HistoryNode:
+    """
+    Represents one position in a game's history tree: the move which led
+    to it from its parent node, and an immutable snapshot of the game
+    after that move. The snapshot holds the piece codes of each row as a
+    separate bytes object, and a node shares every row its move did not
+    change (and the captured pieces, unless its move captured) with its
+    parent, so each node costs about one move's worth of memory however
+    long the game or however many variations branch from it. Nodes also
+    remember the child they were last left through, where redo goes.
+    """
+
+    __slots__ = (
+        "_parent",
+        "_move",
+        "_ply",
+        "_rows",
+        "_game_turn",
+        "_game_state",
+        "_captured",
+        "_children",
+        "_next",
+    )
+
+    def __init__(self, parent, move, rows, game_turn, game_state, captured):
+        """
+        Creates a HistoryNode reached from parent (None for the root) by
+        move. rows is a tuple of the bytes of piece codes of each row, and
+        captured the bytes of pieces captured by WHITE and by BLACK.
+        """
+        self._parent = parent
+        self._move = move
+        self._ply = 0 if parent is None else parent._ply + 1
+        self._rows = rows
+        self._game_turn = game_turn
+        self._game_state = game_state
+        self._captured = captured
+        self._children = ()
+        self._next = None
+
+    def get_parent(self):
+        """
+        Returns the node before this one, or None for the root.
+        """
+        return self._parent
+
+    def get_move(self):
+        """
+        Returns the (start_location, end_location) move which led to this
+        node, or None for the root.
+        """
+        return self._move
+
+    def get_ply(self):
+        """
+        Returns the number of moves from the root to this node.
+        """
+        return self._ply
+
+    def get_children(self):
+        """
+        Returns a tuple of the nodes reached from this one, in the order
+        they were first played: the main line first, then its variations.
+        """
+        return self._children
+
+    def get_child(self, move):
+        """
+        Returns the node reached from this one by move, or None if move
+        has not been played here.
+        """
+        for child in self._children:
+            if child._move == move:
+                return child
+        return None
+
+    def get_game_turn(self):
+        return self._game_turn
+
+    def get_game_state(self):
+        return self._game_state
+
+    def get_position(self):
+        """
+        Returns the node's snapshot as a new Position.
+        """
+        buffer = bytearray(b"".join(self._rows))
+        buffer.append(1 if self._game_turn == "BLACK" else 0)
+        buffer.append(GAME_STATES.index(self._game_state))
+        buffer.extend(self._captured)
+        return Position(buffer, len(self._rows), len(self._rows[0]))
+
+    def add_child(self, move, game):
+        """
+        Returns a new child node reached by move, taking its snapshot from
+        game, which must be in the position after move. Only the rows of
+        the move's start and end squares are copied from the board.
+        """
+        board_obj = game.get_board()
+        rows = list(self._rows)
+        for location in move:
+            rows[location[0]] = board_obj.get_row_squares(location[0])
+        captured = _captured_bytes(game)
+        if captured == self._captured:
+            captured = self._captured
+        child = HistoryNode(
+            self,
+            move,
+            tuple(rows),
+            board_obj.get_game_turn(),
+            game.get_game_state(),
+            captured,
+        )
+        self._children += (child,)
+        return child
+
+
+class GameHistory:
+    """
+    Represents the full history of a ChessVar game as a tree of
+    HistoryNodes, with the game's current position at one node. Moves
+    made with ChessVar.make_move are recorded as they are played; playing
+    a different move from an earlier position starts a variation. The game
+    can be moved to any node, one ply back or forward (undo and redo), or
+    to any ply of the current line, without replaying from the start.
+    """
+
+    def __init__(self, game):
+        """
+        Creates a GameHistory whose root is the current position of game.
+        """
+        board_obj = game.get_board()
+        self._game = game
+        self._root = HistoryNode(
+            None,
+            None,
+            tuple(
+                board_obj.get_row_squares(row) for row in range(board_obj.get_rows())
+            ),
+            board_obj.get_game_turn(),
+            game.get_game_state(),
+            _captured_bytes(game),
+        )
+        self._current = self._root
+        # The node at which the game's move stack was last empty: moves
+        # between it and the current node can be popped
+        self._base = self._root
+        self._base_move_count = game.get_move_count()
+
+    def get_root(self):
+        return self._root
+
+    def get_current(self):
+        return self._current
+
+    def get_ply(self):
+        """
+        Returns the ply of the current node.
+        """
+        return self._current._ply
+
+    def record(self, move):
+        """
+        Records that move was just played from the current node, reusing
+        the node for it if it was played there before, and makes its node
+        the current node. Returns the node.
+        """
+        current = self._current
+        child = current.get_child(move)
+        if child is None:
+            child = current.add_child(move, self._game)
+        current._next = child
+        self._current = child
+        return child
+
+    def get_moves(self, node=None):
+        """
+        Returns the list of moves from the root to node, by default the
+        current node.
+        """
+        if node is None:
+            node = self._current
+        moves = []
+        while node._parent is not None:
+            moves.append(node._move)
+            node = node._parent
+        moves.reverse()
+        return moves
+
+    def get_line(self):
+        """
+        Returns the list of nodes of the current line from the root to its
+        end, following from the current node the moves last undone (or
+        else the main line).
+        """
+        nodes = []
+        node = self._current
+        while node is not None:
+            nodes.append(node)
+            node = node._parent
+        nodes.reverse()
+        node = self._get_next(self._current)
+        while node is not None:
+            nodes.append(node)
+            node = self._get_next(node)
+        return nodes
+
+    def _get_next(self, node):
+        """
+        Returns the node redo moves to from node, or None if there is none.
+        """
+        child = node._next
+        if child is None and node._children:
+            child = node._children[0]
+        return child
+
+    def undo(self):
+        """
+        Moves the game one ply back. Returns False if it is at the root.
+        """
+        parent = self._current._parent
+        if parent is None:
+            return False
+        self.go_to(parent)
+        return True
+
+    def redo(self):
+        """
+        Moves the game one ply forward along the current line. Returns
+        False if there is no later move.
+        """
+        child = self._get_next(self._current)
+        if child is None:
+            return False
+        self.go_to(child)
+        return True
+
+    def go_to_ply(self, ply):
+        """
+        Moves the game to the given ply of the current line. Raises
+        ValueError if the line is not that long.
+        """
+        node = self._current
+        while node._ply > ply:
+            node = node._parent
+        while node is not None and node._ply < ply:
+            node = self._get_next(node)
+        if node is None or ply < 0:
+            raise ValueError(f"the current line has no ply {ply}")
+        self.go_to(node)
+
+    def go_to(self, node):
+        """
+        Moves the game to the given node of this history. Nearby nodes are
+        reached by popping moves back to the common ancestor and pushing
+        the moves from there; distant ones by restoring the node's
+        snapshot, so the cost depends on the distance moved or the board
+        size rather than on the length of the game.
+        """
+        current = self._current
+        if node is current:
+            return
+
+        # Walk up from both nodes to their common ancestor
+        ancestor = current
+        path = []
+        while ancestor._ply > node._ply:
+            ancestor = ancestor._parent
+        target = node
+        while target._ply > ancestor._ply:
+            path.append(target)
+            target = target._parent
+        while ancestor is not target:
+            ancestor = ancestor._parent
+            path.append(target)
+            target = target._parent
+            if ancestor is None:
+                raise ValueError("node is not in this history")
+        path.reverse()
+        for child in path:
+            child._parent._next = child
+
+        game = self._game
+        pops = current._ply - ancestor._ply
+        if (
+            pops + len(path) <= RESTORE_DISTANCE
+            and ancestor._ply >= self._base._ply
+            and game.get_move_count() - self._base_move_count
+            == current._ply - self._base._ply
+        ):
+            for _ in range(pops):
+                game.pop()
+            for child in path:
+                game.push(child._move)
+        else:
+            game._load_position(node.get_position())
+            self._base = node
+            self._base_move_count = 0
+        self._current = node
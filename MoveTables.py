@@ -0,0 +1,190 @@
+from Bitboard import (
+    COLORS,
+    PAWN_STEPS,
+    ROOK_DIRECTIONS,
+    BISHOP_DIRECTIONS,
+    default_pawn_start_rows,
+)
+
+# Move tables are shared by every board of the same size and pawn start rows.
+_MOVE_TABLES = {}
+
+
+def get_move_tables(rows, cols, pawn_start_rows=None):
+    """
+    Returns the move tables for a board of the given size, building them
+    on first use. pawn_start_rows defaults to
+    Bitboard.default_pawn_start_rows(rows).
+    """
+    if pawn_start_rows is None:
+        pawn_start_rows = default_pawn_start_rows(rows)
+    key = (rows, cols, pawn_start_rows["WHITE"], pawn_start_rows["BLACK"])
+    if key not in _MOVE_TABLES:
+        _MOVE_TABLES[key] = MoveTables(rows, cols, pawn_start_rows)
+    return _MOVE_TABLES[key]
+
+
+def categorize(start_location, end_location):
+    """
+    Returns the (bearing, directionality, length) of a move, as described
+    in ChessVar.categorize_move.
+    """
+    start_row, start_col = start_location
+    end_row, end_col = end_location
+
+    # 1) north, south, east or west
+    if start_row > end_row:
+        bearing = "NORTH"
+    elif start_row < end_row:
+        bearing = "SOUTH"
+    elif start_col > end_col:
+        bearing = "WEST"
+    elif start_col < end_col:
+        bearing = "EAST"
+    else:
+        bearing = None
+
+    # 2) perpendicular or diagonal or L-shaped, and 3) length of move
+    if start_col == end_col or start_row == end_row:
+        directionality = "PERPENDICULAR"
+        length = abs(start_row - end_row) + abs(start_col - end_col)
+    elif abs(start_row - end_row) == abs(start_col - end_col):
+        directionality = "DIAGONAL"
+        length = abs(start_row - end_row)
+    else:
+        directionality = "L-SHAPED"
+        length = None
+
+    return bearing, directionality, length
+
+
+def squares_between(start_location, end_location):
+    """
+    Returns the locations strictly between the start and end of a
+    PERPENDICULAR or DIAGONAL move, nearest the start first.
+    """
+    start_row, start_col = start_location
+    end_row, end_col = end_location
+    row_step = (end_row > start_row) - (end_row < start_row)
+    col_step = (end_col > start_col) - (end_col < start_col)
+    length = max(abs(end_row - start_row), abs(end_col - start_col))
+    return tuple(
+        (start_row + i * row_step, start_col + i * col_step) for i in range(1, length)
+    )
+
+
+def pawn_moves(location, color, rows, cols, start_row):
+    """
+    Returns the (pushes, captures) a pawn of the given color could make
+    from location, whatever else is on the board: forward moves as (end,
+    square passed through or None), and diagonal moves as (end, square
+    passed through or None, whether the move may land on an empty square).
+    Pawns on start_row may move 2 spaces.
+    """
+    row, col = location
+    step = PAWN_STEPS[color]
+    pushes = []
+    captures = []
+    max_length = 2 if row == start_row else 1
+    for length in range(1, max_length + 1):
+        end_row = row + length * step
+        if not 0 <= end_row < rows:
+            break
+        via = None if length == 1 else (row + step, col)
+        pushes.append(((end_row, col), via))
+        for end_col in (col - length, col + length):
+            if not 0 <= end_col < cols:
+                continue
+            if length == 1:
+                captures.append(((end_row, end_col), None, False))
+            else:
+                via = (row + step, (col + end_col) // 2)
+                captures.append(((end_row, end_col), via, True))
+    return tuple(pushes), tuple(captures)
+
+
+class MoveTables:
+    """
+    Represents the precomputed move geometry of a board, with squares
+    given as (row, col) locations and tables indexed by row * cols + col:
+    the category of every move, the squares strictly between the ends of
+    every straight move, the rays in each direction from every square,
+    the KNIGHT and KING targets, and the pawn moves of each color. The
+    list-based move validation and generation in ChessVar look these up
+    instead of building paths move by move.
+    """
+
+    def __init__(self, rows, cols, pawn_start_rows=None):
+        """
+        Builds the tables for a board with the given number of rows and
+        cols, and pawns making their first move from pawn_start_rows.
+        """
+        if pawn_start_rows is None:
+            pawn_start_rows = default_pawn_start_rows(rows)
+        self._rows = rows
+        self._cols = cols
+        size = rows * cols
+        locations = [divmod(square, cols) for square in range(size)]
+
+        # (bearing, directionality, length) of every move; equal
+        # categories share one tuple
+        shared = {}
+        self.categories = [
+            [
+                shared.setdefault(category, category)
+                for category in (categorize(start, end) for end in locations)
+            ]
+            for start in locations
+        ]
+
+        # Squares strictly between start and end of a straight move
+        self.paths = [[()] * size for _ in range(size)]
+
+        # Squares in each direction from every square, nearest first
+        self.rays = {
+            direction: [()] * size for direction in ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+        }
+
+        # Squares neither PERPENDICULAR nor DIAGONAL, and squares 1 away
+        self.knight = [()] * size
+        self.king = [()] * size
+
+        # Forward moves as (end, square passed through or None), and
+        # diagonal moves as (end, square passed through or None, whether
+        # the move may land on an empty square)
+        self.pawn_pushes = {color: [()] * size for color in COLORS}
+        self.pawn_captures = {color: [()] * size for color in COLORS}
+
+        for start, (start_row, start_col) in enumerate(locations):
+            knight = []
+            for end, (end_row, end_col) in enumerate(locations):
+                bearing, directionality, length = self.categories[start][end]
+                if directionality == "L-SHAPED":
+                    knight.append((end_row, end_col))
+                elif length and length > 1:
+                    self.paths[start][end] = squares_between(
+                        (start_row, start_col), (end_row, end_col)
+                    )
+            self.knight[start] = tuple(knight)
+
+            king = []
+            for row_step, col_step in self.rays:
+                ray = []
+                row = start_row + row_step
+                col = start_col + col_step
+                while 0 <= row < rows and 0 <= col < cols:
+                    ray.append((row, col))
+                    row += row_step
+                    col += col_step
+                self.rays[(row_step, col_step)][start] = tuple(ray)
+                if ray:
+                    king.append(ray[0])
+            self.king[start] = tuple(king)
+
+            for color in COLORS:
+                (
+                    self.pawn_pushes[color][start],
+                    self.pawn_captures[color][start],
+                ) = pawn_moves(
+                    (start_row, start_col), color, rows, cols, pawn_start_rows[color]
+                )
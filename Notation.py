@@ -0,0 +1,548 @@
+import argparse
+import sys
+from collections import OrderedDict
+
+from ChessVar import ChessVar
+from Bitboard import PIECE_TYPES
+from Position import Position, PIECE_CODES, PIECE_LETTERS, piece_letter
+from Setup import Setup
+
+LETTER_TYPES = {letter: piece_type for piece_type, letter in PIECE_LETTERS.items()}
+
+# Game state field of a FEN string, and result token of a game record
+STATE_FIELDS = {"UNFINISHED": "-", "WHITE_WON": "w", "BLACK_WON": "b"}
+FIELD_STATES = {field: state for state, field in STATE_FIELDS.items()}
+RESULTS = {"UNFINISHED": "*", "WHITE_WON": "1-0", "BLACK_WON": "0-1"}
+RESULT_STATES = {result: state for state, result in RESULTS.items()}
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - - -"
+
+# Longest movetext line written by write_game
+LINE_LENGTH = 79
+
+# Games kept for reuse by a GameCache, one per starting setup
+GAME_CACHE_SIZE = 8
+
+# Square names by (location, rows), built on first use
+_SQUARE_NAMES = {}
+
+
+class NotationError(ValueError):
+    """
+    Raised when a position string, move or game record is malformed or
+    does not replay to the result it records.
+    """
+
+
+def _column_name(col):
+    """
+    Returns the letters naming a column: a-z, then aa, ab, ...
+    """
+    name = ""
+    col += 1
+    while col:
+        col, remainder = divmod(col - 1, 26)
+        name = chr(ord("a") + remainder) + name
+    return name
+
+
+def square_name(location, rows=8):
+    """
+    Returns the name of a (row, col) location, such as "e2". Row 0 is
+    the last rank, the side BLACK starts on.
+    """
+    key = (location, rows)
+    name = _SQUARE_NAMES.get(key)
+    if name is None:
+        name = _column_name(location[1]) + str(rows - location[0])
+        _SQUARE_NAMES[key] = name
+    return name
+
+
+def parse_square(name, rows=8, cols=8):
+    """
+    Returns the (row, col) location named by a square name such as "e2".
+    """
+    index = 0
+    while index < len(name) and name[index].isalpha():
+        index += 1
+    letters, digits = name[:index], name[index:]
+    if not letters or not digits.isdigit():
+        raise NotationError(f"bad square {name!r}")
+    col = 0
+    for letter in letters:
+        if not "a" <= letter <= "z":
+            raise NotationError(f"bad square {name!r}")
+        col = col * 26 + ord(letter) - ord("a") + 1
+    row = rows - int(digits)
+    col -= 1
+    if not (0 <= row < rows and 0 <= col < cols):
+        raise NotationError(f"square {name!r} is off the board")
+    return row, col
+
+
+def format_move(move, rows=8):
+    """
+    Returns the text of a (start_location, end_location) move, such as
+    "e2e4".
+    """
+    return square_name(move[0], rows) + square_name(move[1], rows)
+
+
+def parse_move(text, rows=8, cols=8):
+    """
+    Returns the (start_location, end_location) move written as text. The
+    squares may be separated by "-" or "x", as in "e2-e4" or "e2xf3".
+    """
+    for separator in ("-", "x"):
+        if separator in text[1:]:
+            start, _, end = text.partition(separator)
+            if start.isalnum() and end.isalnum():
+                return parse_square(start, rows, cols), parse_square(end, rows, cols)
+    # Split before the second run of letters
+    index = 0
+    while index < len(text) and text[index].isalpha():
+        index += 1
+    while index < len(text) and text[index].isdigit():
+        index += 1
+    return (
+        parse_square(text[:index], rows, cols),
+        parse_square(text[index:], rows, cols),
+    )
+
+
+def _format_captured(captured, color):
+    """
+    Returns the captured field of a FEN string: one letter per piece of
+    the other color captured by color, or "-" if there are none.
+    """
+    letters = ""
+    for piece_type in PIECE_TYPES:
+        letter = PIECE_LETTERS[piece_type]
+        if color == "BLACK":
+            letter = letter.upper()
+        letters += letter * captured.get(piece_type, 0)
+    return letters or "-"
+
+
+def _parse_captured(field, color):
+    """
+    Returns the captured pieces dict given by a captured field of a FEN
+    string for the pieces captured by color.
+    """
+    captured = {}
+    if field == "-":
+        return captured
+    for letter in field:
+        piece_type = LETTER_TYPES.get(letter.lower())
+        if piece_type is None or letter.isupper() != (color == "BLACK"):
+            raise NotationError(f"bad captured piece {letter!r}")
+        captured[piece_type] = captured.get(piece_type, 0) + 1
+    return captured
+
+
+def position_to_fen(position):
+    """
+    Returns the FEN-like string of a Position. Its fields are the piece
+    placement (from the rank BLACK starts on, WHITE pieces in
+    uppercase), whose turn it is ("w" or "b"), the winner ("w", "b" or
+    "-"), and the pieces captured by WHITE and by BLACK ("-" for none).
+    """
+    rows = position.get_rows()
+    cols = position.get_cols()
+    squares = position.get_squares()
+    ranks = []
+    for row in range(rows):
+        rank = ""
+        empty = 0
+        for code in squares[row * cols : (row + 1) * cols]:
+            if code == 0:
+                empty += 1
+                continue
+            if empty:
+                rank += str(empty)
+                empty = 0
+            rank += piece_letter(code)
+        if empty:
+            rank += str(empty)
+        ranks.append(rank)
+
+    return " ".join(
+        (
+            "/".join(ranks),
+            "w" if position.get_game_turn() == "WHITE" else "b",
+            STATE_FIELDS[position.get_game_state()],
+            _format_captured(position.get_captured_pieces("WHITE"), "WHITE"),
+            _format_captured(position.get_captured_pieces("BLACK"), "BLACK"),
+        )
+    )
+
+
+def board_size(fen):
+    """
+    Returns the (rows, cols) of the board described by a FEN-like string.
+    """
+    ranks = fen.split()[0].split("/")
+    cols = 0
+    empty = ""
+    for char in ranks[0] + "/":
+        if char.isdigit():
+            empty += char
+            continue
+        if empty:
+            cols += int(empty)
+            empty = ""
+        if char != "/":
+            cols += 1
+    return len(ranks), cols
+
+
+def position_from_fen(fen):
+    """
+    Returns the Position described by a FEN-like string (see
+    position_to_fen). The board size is taken from the placement.
+    """
+    fields = fen.split()
+    if len(fields) != 5:
+        raise NotationError(f"expected 5 fields in {fen!r}")
+    placement, turn, state, white_captured, black_captured = fields
+    if turn not in ("w", "b"):
+        raise NotationError(f"bad turn {turn!r}")
+    if state not in FIELD_STATES:
+        raise NotationError(f"bad game state {state!r}")
+
+    ranks = placement.split("/")
+    squares = bytearray()
+    cols = None
+    for rank in ranks:
+        rank_squares = bytearray()
+        empty = ""
+        for char in rank:
+            if char.isdigit():
+                empty += char
+                continue
+            if empty:
+                rank_squares.extend(bytes(int(empty)))
+                empty = ""
+            piece_type = LETTER_TYPES.get(char.lower())
+            if piece_type is None:
+                raise NotationError(f"bad piece {char!r}")
+            color = "WHITE" if char.isupper() else "BLACK"
+            rank_squares.append(PIECE_CODES[(color, piece_type)])
+        if empty:
+            rank_squares.extend(bytes(int(empty)))
+        if cols is None:
+            cols = len(rank_squares)
+        elif len(rank_squares) != cols:
+            raise NotationError(f"ranks of different lengths in {placement!r}")
+        squares.extend(rank_squares)
+
+    return Position.build(
+        squares,
+        len(ranks),
+        cols,
+        "WHITE" if turn == "w" else "BLACK",
+        FIELD_STATES[state],
+        _parse_captured(white_captured, "WHITE"),
+        _parse_captured(black_captured, "BLACK"),
+    )
+
+
+def game_to_fen(game):
+    """
+    Returns the FEN-like string of a ChessVar's current position.
+    """
+    return position_to_fen(game.get_position())
+
+
+def game_from_fen(fen, use_bitboards=False):
+    """
+    Returns a new ChessVar set up from a FEN-like string, with the
+    position as its setup (see Setup.from_position).
+    """
+    position = position_from_fen(fen)
+    game = ChessVar(use_bitboards=use_bitboards, setup=Setup.from_position(position))
+    game.set_position(position)
+    return game
+
+
+class GameRecord:
+    """
+    Represents one game of a game record file: its tag pairs, the FEN of
+    its starting position and its moves as (start_location,
+    end_location) tuples. A game which could not be parsed has an error
+    message instead of moves.
+    """
+
+    def __init__(self, tags=None, moves=None, error=None):
+        """
+        Creates a GameRecord with the given tags dict and list of moves,
+        or the error met while parsing it.
+        """
+        self._tags = {} if tags is None else tags
+        self._moves = [] if moves is None else moves
+        self._error = error
+
+    def get_tags(self):
+        """
+        Get method which returns the dict of tag pairs.
+        """
+        return self._tags
+
+    def get_moves(self):
+        """
+        Get method which returns the list of moves.
+        """
+        return self._moves
+
+    def get_error(self):
+        """
+        Get method which returns the parse error message, or None.
+        """
+        return self._error
+
+    def get_start_fen(self):
+        """
+        Get method which returns the FEN of the starting position.
+        """
+        return self._tags.get("FEN", START_FEN)
+
+    def get_result(self):
+        """
+        Get method which returns the recorded game state, such as
+        "WHITE_WON".
+        """
+        return RESULT_STATES.get(self._tags.get("Result", "*"), "UNFINISHED")
+
+
+def write_game(output, moves, tags=None, start_fen=None, result="UNFINISHED"):
+    """
+    Writes one game to a text file in the PGN-like record format: tag
+    pairs, a blank line, the numbered moves and result token, and a
+    blank line. start_fen is written as a FEN tag when it is not the
+    standard starting position.
+    """
+    tags = dict(tags or {})
+    tags["Result"] = RESULTS[result]
+    if start_fen is not None and start_fen != START_FEN:
+        tags["FEN"] = start_fen
+    rows = 8
+    if start_fen is not None:
+        rows = board_size(start_fen)[0]
+    black_first = start_fen is not None and start_fen.split()[1] == "b"
+
+    for name, value in tags.items():
+        escaped = str(value).replace("\\", "\\\\").replace('"', '\\"')
+        output.write(f'[{name} "{escaped}"]\n')
+    output.write("\n")
+
+    line = ""
+    tokens = []
+    for ply, move in enumerate(moves):
+        ply += black_first
+        if ply % 2 == 0:
+            tokens.append(f"{ply // 2 + 1}.")
+        elif not tokens:
+            tokens.append(f"{ply // 2 + 1}...")
+        tokens.append(format_move(move, rows))
+    tokens.append(RESULTS[result])
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > LINE_LENGTH:
+            output.write(line + "\n")
+            line = token
+        else:
+            line = f"{line} {token}" if line else token
+    output.write(line + "\n\n")
+
+
+def _parse_tag(line):
+    """
+    Returns the (name, value) of a tag pair line such as [Result "1-0"].
+    """
+    name, _, value = line.strip()[1:-1].partition(" ")
+    value = value.strip()
+    if not name or len(value) < 2 or value[0] != '"' or value[-1] != '"':
+        raise NotationError(f"bad tag pair {line.strip()!r}")
+    return name, value[1:-1].replace('\\"', '"').replace("\\\\", "\\")
+
+
+def read_games(source):
+    """
+    Yields a GameRecord for each game of a record file, reading it line
+    by line so any number of games can be read in constant memory. A
+    malformed game is yielded with its error (see GameRecord.get_error)
+    and reading carries on with the next game.
+    """
+    tags = {}
+    tokens = []
+    error = None
+    in_moves = False
+    for line_number, line in enumerate(source, 1):
+        stripped = line.strip()
+        if stripped.startswith("["):
+            if in_moves:
+                # The previous game has no result token
+                yield GameRecord(tags, error=error or "game has no result token")
+                tags = {}
+                tokens = []
+                error = None
+                in_moves = False
+            try:
+                name, value = _parse_tag(stripped)
+            except NotationError as tag_error:
+                error = error or f"line {line_number}: {tag_error}"
+            else:
+                tags[name] = value
+            continue
+        if not stripped:
+            continue
+        in_moves = True
+        for token in stripped.split():
+            if token in RESULT_STATES:
+                yield _make_record(tags, tokens, token, error)
+                tags = {}
+                tokens = []
+                error = None
+                in_moves = False
+            elif not token.rstrip(".").isdigit():
+                tokens.append(token)
+    if tags or tokens:
+        yield GameRecord(tags, error=error or "game has no result token")
+
+
+def _make_record(tags, tokens, result, error=None):
+    """
+    Returns the GameRecord for the given tags, move tokens and result
+    token, or one holding the first error found.
+    """
+    if error is None and tags.setdefault("Result", result) != result:
+        error = f"result token {result} does not match tag {tags['Result']}"
+    if error is not None:
+        return GameRecord(tags, error=error)
+    try:
+        position_from_fen(tags.get("FEN", START_FEN))
+        rows, cols = board_size(tags.get("FEN", START_FEN))
+        moves = [parse_move(token, rows, cols) for token in tokens]
+    except NotationError as move_error:
+        return GameRecord(tags, error=str(move_error))
+    return GameRecord(tags, moves)
+
+
+def replay_game(record, game=None):
+    """
+    Replays a GameRecord through ChessVar, checking every move is legal
+    and the game ends in the recorded result. Reuses game when given,
+    otherwise plays a new game whose setup is the record's starting
+    position. Returns the game in its final position; raises NotationError if the
+    record is invalid.
+    """
+    if record.get_error() is not None:
+        raise NotationError(record.get_error())
+    position = position_from_fen(record.get_start_fen())
+    if game is None:
+        game = ChessVar(setup=Setup.from_position(position))
+    board_obj = game.get_board()
+    rows = board_obj.get_rows()
+    if (position.get_rows(), position.get_cols()) != (rows, board_obj.get_cols()):
+        raise NotationError(
+            f"a {position.get_rows()}x{position.get_cols()} board does not "
+            f"fit a {rows}x{board_obj.get_cols()} game"
+        )
+    game.set_position(position)
+    for ply, move in enumerate(record.get_moves(), 1):
+        if not game.make_move(*move):
+            raise NotationError(f"illegal move {format_move(move, rows)} at ply {ply}")
+    if game.get_game_state() != record.get_result():
+        raise NotationError(
+            f"game ends {game.get_game_state()}, record says {record.get_result()}"
+        )
+    return game
+
+
+class GameCache:
+    """
+    Represents ChessVar games kept for reuse when replaying many records:
+    one per starting setup, which depends on a start FEN's placement and
+    on its captured pieces (they count towards the win thresholds, see
+    Setup.from_position). Only the most recently used games are kept, so
+    memory does not grow with the number of distinct setups.
+    """
+
+    def __init__(self, max_games=GAME_CACHE_SIZE, use_bitboards=False):
+        self._max_games = max_games
+        self._use_bitboards = use_bitboards
+        self._games = OrderedDict()
+
+    def get_game(self, start_fen):
+        """
+        Returns a ChessVar whose setup is the position of start_fen. The
+        game is not moved to that position; raises NotationError if the
+        FEN is invalid.
+        """
+        position = position_from_fen(start_fen)
+        placement, _, _, white_captured, black_captured = start_fen.split()
+        key = (placement, white_captured, black_captured)
+        game = self._games.get(key)
+        if game is None:
+            game = ChessVar(
+                use_bitboards=self._use_bitboards,
+                setup=Setup.from_position(position),
+            )
+            self._games[key] = game
+            if len(self._games) > self._max_games:
+                self._games.popitem(last=False)
+        else:
+            self._games.move_to_end(key)
+        return game
+
+
+def verify_games(source, use_bitboards=False):
+    """
+    Yields a (game_number, error) tuple for each game of a record file,
+    with error None when the game replays to its recorded result. Each
+    game is played with its starting position as its setup, so a player
+    wins by capturing every piece of one type the other starts it with.
+    Games are reused through a GameCache, so memory does not grow with
+    the number of games.
+    """
+    games = GameCache(use_bitboards=use_bitboards)
+    for game_number, record in enumerate(read_games(source), 1):
+        try:
+            if record.get_error() is not None:
+                raise NotationError(record.get_error())
+            replay_game(record, games.get_game(record.get_start_fen()))
+        except ValueError as error:
+            yield game_number, str(error)
+        else:
+            yield game_number, None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Replays and validates every game of a ChessVar game "
+        "record file."
+    )
+    parser.add_argument("records", help="game record file ('-' for stdin)")
+    parser.add_argument(
+        "--bitboards", action="store_true", help="validate with bitboards"
+    )
+    parser.add_argument("--quiet", action="store_true", help="only print the summary")
+    args = parser.parse_args(argv)
+
+    source = sys.stdin if args.records == "-" else open(args.records)
+    valid = 0
+    invalid = 0
+    with source:
+        for game_number, error in verify_games(source, args.bitboards):
+            if error is None:
+                valid += 1
+                continue
+            invalid += 1
+            if not args.quiet:
+                print(f"game {game_number}: {error}")
+    print(f"{valid} valid, {invalid} invalid")
+    return 1 if invalid else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+import argparse
+import json
+import mmap
+import struct
+import sys
+
+from ChessVar import ChessVar
+from Notation import read_games, format_move
+
+# File layout: a header (magic, rows, cols, number of records), then the
+# records sorted by position hash. Each record is the position hash, the
+# start and end square indexes of a move and the move's weight.
+MAGIC = b"CVBOOK1\0"
+HEADER = struct.Struct("<8sHHI")
+RECORD = struct.Struct("<QHHI")
+KEY = struct.Struct("<Q")
+
+MAX_WEIGHT = (1 << 32) - 1
+
+# Weight a book move earns for each game in which it was played, by how
+# the game ended for the player who played it
+WIN_WEIGHT = 2
+UNFINISHED_WEIGHT = 1
+LOSS_WEIGHT = 0
+
+
+class OpeningBook:
+    """
+    Represents an opening book file: weighted moves keyed by position
+    hash (see Board.get_hash), built from self-play games by build_book.
+    The file is memory-mapped read-only and binary searched in place, so
+    opening it is instant and processes using the same book share one
+    copy of it in memory.
+    """
+
+    def __init__(self, path):
+        """
+        Opens the book file at path.
+        """
+        self._path = path
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._rows, self._cols, self._count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not an opening book")
+
+    def __len__(self):
+        return self._count
+
+    def __getstate__(self):
+        """
+        Pickles a book by its path, so it can be handed to worker
+        processes, which map the same file.
+        """
+        return self._path
+
+    def __setstate__(self, path):
+        self.__init__(path)
+
+    def get_path(self):
+        return self._path
+
+    def close(self):
+        """
+        Unmaps and closes the book file.
+        """
+        self._map.close()
+        self._file.close()
+
+    def _first_record(self, key):
+        """
+        Returns the index of the first record whose hash is not less than
+        key.
+        """
+        low = 0
+        high = self._count
+        book = self._map
+        while low < high:
+            middle = (low + high) // 2
+            if KEY.unpack_from(book, HEADER.size + middle * RECORD.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def get_moves(self, key):
+        """
+        Returns a list of (move, weight) tuples for the position with the
+        given hash, heaviest first, or an empty list if it is not in the
+        book.
+        """
+        moves = []
+        cols = self._cols
+        book = self._map
+        for index in range(self._first_record(key), self._count):
+            record_key, start, end, weight = RECORD.unpack_from(
+                book, HEADER.size + index * RECORD.size
+            )
+            if record_key != key:
+                break
+            moves.append(
+                (((start // cols, start % cols), (end // cols, end % cols)), weight)
+            )
+        return moves
+
+    def choose_move(self, game, rng=None):
+        """
+        Returns a book move for the game's current position, or None if
+        the position is not in the book. Picks the heaviest move, or with
+        rng (a random.Random) a random move in proportion to its weight.
+        Moves which are not legal in the game are never returned.
+        """
+        board_obj = game.get_board()
+        if (board_obj.get_rows(), board_obj.get_cols()) != (self._rows, self._cols):
+            return None
+        moves = [
+            (move, weight)
+            for move, weight in self.get_moves(board_obj.get_hash())
+            if game.is_legal(move)
+        ]
+        if not moves:
+            return None
+        if rng is None:
+            return moves[0][0]
+        pick = rng.uniform(0, sum(weight for _, weight in moves))
+        for move, weight in moves:
+            pick -= weight
+            if pick <= 0:
+                return move
+        return moves[-1][0]
+
+
+def build_book(games, path, max_plies=12, min_weight=1):
+    """
+    Builds an opening book file at path from games, an iterable of
+    (moves, game_state) tuples of games played from the start position.
+    Each of the first max_plies moves of a game earns WIN_WEIGHT,
+    UNFINISHED_WEIGHT or LOSS_WEIGHT, by how the game ended for the
+    player who made it; moves with less than min_weight in total are
+    left out. Returns the number of records written.
+    """
+    weights = {}
+    game = ChessVar()
+    start = game.get_position()
+    board_obj = game.get_board()
+    cols = board_obj.get_cols()
+    for moves, game_state in games:
+        game.set_position(start)
+        for move in moves[:max_plies]:
+            color = board_obj.get_game_turn()
+            key = board_obj.get_hash()
+            if not game.make_move(*move):
+                break
+            if game_state == "UNFINISHED":
+                weight = UNFINISHED_WEIGHT
+            elif game_state == color + "_WON":
+                weight = WIN_WEIGHT
+            else:
+                weight = LOSS_WEIGHT
+            start_index = move[0][0] * cols + move[0][1]
+            end_index = move[1][0] * cols + move[1][1]
+            entry = (key, start_index, end_index)
+            weights[entry] = weights.get(entry, 0) + weight
+            if game.get_game_state() != "UNFINISHED":
+                break
+
+    records = sorted(
+        (
+            (key, -weight, start_index, end_index)
+            for (key, start_index, end_index), weight in weights.items()
+            if weight >= min_weight
+        )
+    )
+    with open(path, "wb") as book_file:
+        book_file.write(HEADER.pack(MAGIC, board_obj.get_rows(), cols, len(records)))
+        for key, weight, start_index, end_index in records:
+            book_file.write(
+                RECORD.pack(key, start_index, end_index, min(-weight, MAX_WEIGHT))
+            )
+    return len(records)
+
+
+def read_game_moves(path, input_format):
+    """
+    Yields a (moves, game_state) tuple for each game of a self-play
+    output file: game records ("pgn") or JSON Lines written with
+    --record-moves ("jsonl").
+    """
+    with open(path) as source:
+        if input_format == "pgn":
+            for record in read_games(source):
+                if record.get_error() is None and "FEN" not in record.get_tags():
+                    yield record.get_moves(), record.get_result()
+            return
+        for line in source:
+            result = json.loads(line)
+            if "move_list" not in result:
+                continue
+            moves = [(tuple(start), tuple(end)) for start, end in result["move_list"]]
+            if result["winner"] is None:
+                yield moves, "UNFINISHED"
+            else:
+                yield moves, result["winner"] + "_WON"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Builds an opening book from self-play games, or shows "
+        "the book moves of the start position."
+    )
+    parser.add_argument("book", help="opening book file")
+    parser.add_argument(
+        "--games", help="self-play output to build the book from (see selfplay.py)"
+    )
+    parser.add_argument(
+        "--format",
+        choices=["pgn", "jsonl"],
+        default="pgn",
+        help="format of the --games file",
+    )
+    parser.add_argument(
+        "--plies", type=int, default=12, help="book moves taken from each game"
+    )
+    parser.add_argument(
+        "--min-weight", type=int, default=2, help="leave out lighter moves"
+    )
+    args = parser.parse_args(argv)
+
+    if args.games is not None:
+        count = build_book(
+            read_game_moves(args.games, args.format),
+            args.book,
+            args.plies,
+            args.min_weight,
+        )
+        print(f"Wrote {count} book moves to {args.book}", file=sys.stderr)
+        return 0
+
+    book = OpeningBook(args.book)
+    game = ChessVar()
+    print(f"{len(book)} book moves")
+    for move, weight in book.get_moves(game.get_board().get_hash()):
+        print(f"{format_move(move)} {weight}")
+    book.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,258 @@
+import multiprocessing
+import os
+import time
+
+from ChessVar import ChessVar
+from Engine import Engine, WIN_SCORE, WIN_BOUND
+from Position import Position
+from TranspositionTable import SharedTranspositionTable
+
+# Lower than any score: no root move has been scored at this depth yet
+NO_SCORE = -WIN_SCORE - 1
+
+# Seconds between checks of the stop flag while waiting for the workers
+STOP_POLL_INTERVAL = 0.05
+
+# State of a worker process, set up by _init_worker
+_worker = {}
+
+
+def _init_worker(words, best_score, abort_flag, engine_options):
+    """
+    Sets up a worker process: an Engine searching into the shared table,
+    stopped by the shared abort flag.
+    """
+    _worker["engine"] = Engine(
+        max_time=None,
+        table=SharedTranspositionTable(words=words),
+        stop_flag=abort_flag,
+        **engine_options,
+    )
+    _worker["best_score"] = best_score
+    _worker["search_id"] = None
+    _worker["game"] = None
+
+
+def _search_root_move(task):
+    """
+    Searches one root move in a worker process. task is a (search_id,
+    setup, buffer, index, move, depth, exact_depth) tuple. The move is
+    searched with a window just below the best score found so far at this
+    depth, so it is scored exactly if it could be the best move. Returns
+    an (index, score, is_exact, nodes) tuple, score being None if the
+    search was stopped.
+    """
+    search_id, setup, buffer, index, move, depth, exact_depth = task
+    if _worker["search_id"] != search_id:
+        _worker["game"] = ChessVar(setup=setup)
+        _worker["search_id"] = search_id
+    game = _worker["game"]
+    game.set_position(Position(buffer, setup.get_rows(), setup.get_cols()))
+
+    engine = _worker["engine"]
+    engine.set_exact_depth(exact_depth)
+    best_score = _worker["best_score"]
+    alpha = best_score.value - 1
+    score = engine.search_move(game, move, depth, alpha)
+    if score is not None and score > best_score.value:
+        with best_score.get_lock():
+            if score > best_score.value:
+                best_score.value = score
+    is_exact = score is not None and score > alpha
+    return index, score, is_exact, engine.get_last_info()["nodes"]
+
+
+class ParallelEngine:
+    """
+    Represents a computer player which searches on several processes at
+    once by splitting the root moves between them. Each depth of the
+    iterative deepening searches the first root move (the best of the
+    previous depth), then hands the others to a pool of workers, which
+    share a SharedTranspositionTable and the best score found so far at
+    that depth. A move is searched with a window just below that
+    score, so every move which could be best gets an exact score and the
+    others an upper bound; the best move is the first, in root order, of
+    those with the highest exact score. In fixed-depth mode (no time
+    limit) table entries only cut the search off at their own depth, so
+    the move and score found do not depend on the number of workers or
+    on how their searches interleave.
+    """
+
+    def __init__(
+        self,
+        workers=None,
+        max_time=1.0,
+        max_depth=64,
+        tt_entries=1 << 20,
+        stop_flag=None,
+        **engine_options,
+    ):
+        """
+        Creates a ParallelEngine with the given number of worker processes
+        (by default one per CPU) which searches for at most max_time
+        seconds (None for fixed-depth mode) and max_depth plies per move,
+        or until stop_flag (e.g. a multiprocessing.Value), if given, is
+        set. Other keyword arguments (distance_weights, weights) are
+        passed to each worker's Engine. Call close() when done with it.
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        self._workers = workers
+        self._max_time = max_time
+        self._max_depth = max_depth
+        self._table = SharedTranspositionTable(tt_entries)
+        self._best_score = multiprocessing.Value("i", NO_SCORE)
+        self._stop_flag = stop_flag
+        self._abort_flag = multiprocessing.RawValue("b", 0)
+        self._pool = multiprocessing.Pool(
+            workers,
+            _init_worker,
+            (
+                self._table.get_words(),
+                self._best_score,
+                self._abort_flag,
+                engine_options,
+            ),
+        )
+        self._search_count = 0
+        self._last_info = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Stops the worker processes.
+        """
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def get_workers(self):
+        return self._workers
+
+    def get_table(self):
+        """
+        Returns the shared transposition table.
+        """
+        return self._table
+
+    def set_stop_flag(self, stop_flag):
+        """
+        Sets the flag (see __init__) which stops the search when set, e.g.
+        from another thread.
+        """
+        self._stop_flag = stop_flag
+
+    def get_last_info(self):
+        """
+        Returns a dict describing the last search, like
+        Engine.get_last_info, with the nodes of every worker added up.
+        """
+        return self._last_info
+
+    def _run_tasks(self, tasks, deadline):
+        """
+        Searches root moves on the workers and returns their results in
+        task order. If the deadline passes or the stop flag is set first,
+        the workers are stopped and the moves left unsearched score None.
+        """
+        pending = [self._pool.apply_async(_search_root_move, (task,)) for task in tasks]
+        results = []
+        for result in pending:
+            while not self._abort_flag.value:
+                timeout = STOP_POLL_INTERVAL
+                if deadline is not None:
+                    timeout = min(timeout, max(deadline - time.perf_counter(), 0))
+                result.wait(timeout)
+                if result.ready():
+                    break
+                if (deadline is not None and time.perf_counter() >= deadline) or (
+                    self._stop_flag is not None and self._stop_flag.value
+                ):
+                    self._abort_flag.value = 1
+            results.append(result.get())
+        return results
+
+    def choose_move(self, game):
+        """
+        Returns the move the engine would play for the player whose turn
+        it is, or None if there are no legal moves. The game is left as
+        it was.
+        """
+        return self.search(game)[0]
+
+    def search(self, game, max_depth=None, max_time=None):
+        """
+        Searches the game's position with iterative deepening until the
+        depth or time budget runs out (arguments override the engine's
+        defaults). Returns a (move, score, depth) tuple for the deepest
+        completed iteration, with score from the point of view of the
+        player whose turn it is.
+        """
+        if max_depth is None:
+            max_depth = self._max_depth
+        if max_time is None:
+            max_time = self._max_time
+
+        start = time.perf_counter()
+        deadline = None if max_time is None else start + max_time
+        self._search_count += 1
+        setup = game.get_setup()
+        buffer = game.get_position().to_bytes()
+
+        moves = game.legal_moves()
+        best_move = moves[0] if moves else None
+        best_score = 0
+        completed_depth = 0
+        nodes = 0
+
+        if len(moves) > 1:
+            for depth in range(1, max_depth + 1):
+                self._best_score.value = NO_SCORE
+                self._abort_flag.value = 0
+                tasks = [
+                    (
+                        self._search_count,
+                        setup,
+                        buffer,
+                        index,
+                        move,
+                        depth,
+                        deadline is None,
+                    )
+                    for index, move in enumerate(moves)
+                ]
+                # The other moves start once the first one's score bounds them
+                results = self._run_tasks(tasks[:1], deadline)
+                if results[0][1] is not None:
+                    results += self._run_tasks(tasks[1:], deadline)
+                nodes += sum(result[3] for result in results)
+                if any(score is None for _, score, _, _ in results):
+                    break
+
+                score, index = max(
+                    (score, -index) for index, score, is_exact, _ in results if is_exact
+                )
+                move = moves[-index]
+                best_move, best_score, completed_depth = move, score, depth
+                # Search the best move first on the next iteration
+                moves.remove(move)
+                moves.insert(0, move)
+                if abs(score) >= WIN_BOUND:
+                    break
+
+        self._last_info = {
+            "move": best_move,
+            "score": best_score,
+            "depth": completed_depth,
+            "nodes": nodes,
+            "seconds": time.perf_counter() - start,
+            "book": False,
+            "workers": self._workers,
+        }
+        return best_move, best_score, completed_depth
@@ -1,35 +1,97 @@
-import pygame
 from pathlib import Path
+from Tracing import tracer, INFO
+from Bitboard import PAWN_START_ROWS
 
 # Setup images
 img_dir = Path(__file__).parent / "img"
 
-# Piece images
-b_pawn = pygame.image.load(img_dir / "black_pawn.png")
-b_rook = pygame.image.load(img_dir / "black_rook.png")
-b_knight = pygame.image.load(img_dir / "black_knight.png")
-b_bishop = pygame.image.load(img_dir / "black_bishop.png")
-b_queen = pygame.image.load(img_dir / "black_queen.png")
-b_king = pygame.image.load(img_dir / "black_king.png")
-w_pawn = pygame.image.load(img_dir / "white_pawn.png")
-w_rook = pygame.image.load(img_dir / "white_rook.png")
-w_knight = pygame.image.load(img_dir / "white_knight.png")
-w_bishop = pygame.image.load(img_dir / "white_bishop.png")
-w_queen = pygame.image.load(img_dir / "white_queen.png")
-w_king = pygame.image.load(img_dir / "white_king.png")
+# Piece images are only loaded (and pygame only imported) the first time a
+# piece is drawn, so the rules engine runs without a display. Sprites are
+# cached per (piece type, color, size) in the display's pixel format.
+_sprite_cache = {}
+
+# Where each piece sits in the img/sprites.png atlas, as (x, y, width, height)
+ATLAS_RECTS = {
+    ("WHITE", "PAWN"): (22, 493, 13, 16),
+    ("WHITE", "ROOK"): (78, 492, 14, 18),
+    ("WHITE", "KNIGHT"): (60, 473, 16, 18),
+    ("WHITE", "BISHOP"): (42, 452, 18, 19),
+    ("WHITE", "QUEEN"): (22, 473, 18, 18),
+    ("WHITE", "KING"): (0, 474, 20, 20),
+    ("BLACK", "PAWN"): (37, 493, 13, 16),
+    ("BLACK", "ROOK"): (78, 472, 14, 18),
+    ("BLACK", "KNIGHT"): (42, 473, 16, 18),
+    ("BLACK", "BISHOP"): (22, 452, 18, 19),
+    ("BLACK", "QUEEN"): (62, 452, 16, 18),
+    ("BLACK", "KING"): (0, 452, 20, 20),
+}
+
+# Sprites come from the separate PNG files or are sliced from the atlas
+SPRITE_SOURCES = ("files", "atlas")
+_sprite_source = "files"
+_atlas_img = None
+
+
+def set_sprite_source(source):
+    """
+    Chooses whether sprites are loaded from the separate PNG files
+    ("files") or sliced from img/sprites.png ("atlas").
+    """
+    global _sprite_source
+    if source not in SPRITE_SOURCES:
+        raise ValueError(f"Unknown sprite source: {source}")
+    _sprite_source = source
+    _sprite_cache.clear()
+
+
+def set_board_rect(rect, rows=8, cols=8):
+    """
+    Sets the (x, y, width, height) area of the window the board is drawn
+    in, and the number of rows and cols of squares it is divided into.
+    Sprites for the new square size are built the next time each piece is
+    drawn.
+    """
+    Piece.RECT = tuple(rect)
+    Piece.startX = Piece.RECT[0]
+    Piece.startY = Piece.RECT[1]
+    Piece.ROWS = rows
+    Piece.COLS = cols
+    _sprite_cache.clear()
+
+
+def _load_source_img(color, piece_type):
+    """
+    Returns the unscaled image for the given piece color and type.
+    """
+    import pygame
 
-# Scale images
-b_img = [b_pawn, b_rook, b_knight, b_bishop, b_queen, b_king]
-w_img = [w_pawn, w_rook, w_knight, w_bishop, w_queen, w_king]
+    global _atlas_img
+    if _sprite_source == "atlas":
+        if _atlas_img is None:
+            _atlas_img = pygame.image.load(img_dir / "sprites.png")
+        return _atlas_img.subsurface(ATLAS_RECTS[(color, piece_type)])
+    return pygame.image.load(img_dir / f"{color.lower()}_{piece_type.lower()}.png")
 
-B_img = []
-W_img = []
 
-for img in b_img:
-    B_img.append(pygame.transform.scale(img, (70, 70)))
+def get_sprite(color, piece_type, size):
+    """
+    Returns the image for the given piece color and type scaled to
+    size x size pixels, building it into the cache on first use. Once a
+    window exists the image is converted to the display's pixel format
+    so blits do not convert it again every frame.
+    """
+    key = (piece_type, color, size)
+    sprite = _sprite_cache.get(key)
+    if sprite is None:
+        import pygame
 
-for img in w_img:
-    W_img.append(pygame.transform.scale(img, (70, 70)))
+        sprite = pygame.transform.scale(
+            _load_source_img(color, piece_type), (size, size)
+        )
+        if pygame.display.get_surface() is not None:
+            sprite = sprite.convert_alpha()
+        _sprite_cache[key] = sprite
+    return sprite
 
 
 # Piece class
@@ -46,6 +108,8 @@ class Piece:
     RECT = (0, 0, 600, 600)
     startX = RECT[0]
     startY = RECT[1]
+    ROWS = 8
+    COLS = 8
 
     def __init__(self, row, col, color):
         """
@@ -78,38 +142,60 @@ class Piece:
         self._piece_row = end_coords[0]
         self._piece_col = end_coords[1]
 
+    def get_sprite_size(self):
+        """
+        Returns the width (and height) in pixels the piece is drawn at:
+        its square less a margin of 1/15 of the square.
+        """
+        square = min(self.RECT[2] / self.COLS, self.RECT[3] / self.ROWS)
+        return max(int(square) - round(square / 15), 1)
+
     def draw_piece(self, win):
         """
         Draws piece on board.
         """
-        draw_this = self.get_image()
+        import pygame
 
-        x = 5 + self.startX + (self._piece_col * self.RECT[2] / 8)
-        y = 5 + self.startY + (self._piece_row * self.RECT[3] / 8)
+        size = self.get_sprite_size()
+        draw_this = self.get_image(size)
+
+        margin = round(min(self.RECT[2] / self.COLS, self.RECT[3] / self.ROWS) / 15)
+        x = margin + self.startX + (self._piece_col * self.RECT[2] / self.COLS)
+        y = margin + self.startY + (self._piece_row * self.RECT[3] / self.ROWS)
 
         if self._selected:
-            pygame.draw.rect(win, (255, 0, 0), (x, y, 70, 70), 5)
+            pygame.draw.rect(win, (255, 0, 0), (x, y, size, size), margin)
 
         win.blit(draw_this, (x, y))
 
 
 class Pawn(Piece):
     # Pawn piece which inherits from Piece class
-    def __init__(self, row, col, color):
+    def __init__(self, row, col, color, start_row=None):
+        """
+        Creates a Pawn which may move 1 or 2 spaces from start_row (by
+        default its color's start row on the standard board).
+        """
         super().__init__(row, col, color)
+        if start_row is None:
+            start_row = PAWN_START_ROWS[color]
+        self._start_row = start_row
 
     def get_piece_type(self):
         return "PAWN"
 
+    def get_start_row(self):
+        """
+        Returns the row from which the pawn may make its first move.
+        """
+        return self._start_row
+
     def get_piece_color(self):
         return self._piece_color
 
     # Get image of piece
-    def get_image(self):
-        if self.get_piece_color() == "BLACK":
-            return B_img[0]
-        else:
-            return W_img[0]
+    def get_image(self, size):
+        return get_sprite(self.get_piece_color(), self.get_piece_type(), size)
 
     def is_move_sanctioned(self, bearing, directionality, length, move_coords):
         """
@@ -120,54 +206,75 @@ class Pawn(Piece):
         """
         # Check directionality is correct
         if directionality == "L-SHAPED":
-            print("Error: PAWN cannot move in an L-shape.")
+            if tracer.level >= INFO:
+                tracer.emit(
+                    INFO, "move_rejected", reason="PAWN cannot move in an L-shape."
+                )
             return False
 
         if self.get_piece_color() == "BLACK":
             # Check bearing is correct
             if bearing != "SOUTH":
-                print("Error: BLACK PAWN must move SOUTH.")
+                if tracer.level >= INFO:
+                    tracer.emit(
+                        INFO, "move_rejected", reason="BLACK PAWN must move SOUTH."
+                    )
                 return False
 
             # First move
-            if move_coords[0][0] == 1:
+            if move_coords[0][0] == self.get_start_row():
                 if length <= 2:
                     return True
                 else:
-                    print(
-                        "Error: BLACK PAWN can only move SOUTH for 1 or 2 spaces on its first move."
-                    )
+                    if tracer.level >= INFO:
+                        tracer.emit(
+                            INFO,
+                            "move_rejected",
+                            reason="BLACK PAWN can only move SOUTH for 1 or 2 spaces on its first move.",
+                        )
                     return False
             else:
                 if length == 1:
                     return True
                 else:
-                    print(
-                        "Error: BLACK PAWN can only move SOUTH for 1 space after its first move."
-                    )
+                    if tracer.level >= INFO:
+                        tracer.emit(
+                            INFO,
+                            "move_rejected",
+                            reason="BLACK PAWN can only move SOUTH for 1 space after its first move.",
+                        )
                     return False
 
         else:
             if bearing != "NORTH":
-                print("Error: WHITE PAWN must move NORTH.")
+                if tracer.level >= INFO:
+                    tracer.emit(
+                        INFO, "move_rejected", reason="WHITE PAWN must move NORTH."
+                    )
                 return False
 
             # First move
-            if move_coords[0][0] == 6:
+            if move_coords[0][0] == self.get_start_row():
                 if length <= 2:
                     return True
                 else:
-                    print(
-                        "Error: WHITE PAWN can only move NORTH for 1 or 2 spaces on its first move."
-                    )
+                    if tracer.level >= INFO:
+                        tracer.emit(
+                            INFO,
+                            "move_rejected",
+                            reason="WHITE PAWN can only move NORTH for 1 or 2 spaces on its first move.",
+                        )
                     return False
             else:
                 if length == 1:
                     return True
                 else:
-                    print(
-                        "Error: WHITE PAWN can only move NORTH for 1 space after its first move."
-                    )
+                    if tracer.level >= INFO:
+                        tracer.emit(
+                            INFO,
+                            "move_rejected",
+                            reason="WHITE PAWN can only move NORTH for 1 space after its first move.",
+                        )
                     return False
 
 
@@ -183,11 +290,8 @@ class Rook(Piece):
         return self._piece_color
 
     # Get image of piece
-    def get_image(self):
-        if self.get_piece_color() == "BLACK":
-            return B_img[1]
-        else:
-            return W_img[1]
+    def get_image(self, size):
+        return get_sprite(self.get_piece_color(), self.get_piece_type(), size)
 
     def is_move_sanctioned(self, bearing, directionality, length, move_coords):
         """
@@ -215,11 +319,8 @@ class Knight(Piece):
         return self._piece_color
 
     # Get image of piece
-    def get_image(self):
-        if self.get_piece_color() == "BLACK":
-            return B_img[2]
-        else:
-            return W_img[2]
+    def get_image(self, size):
+        return get_sprite(self.get_piece_color(), self.get_piece_type(), size)
 
     def is_move_sanctioned(self, bearing, directionality, length, move_coords):
         """
@@ -247,11 +348,8 @@ class Bishop(Piece):
         return self._piece_color
 
     # Get image of piece
-    def get_image(self):
-        if self.get_piece_color() == "BLACK":
-            return B_img[3]
-        else:
-            return W_img[3]
+    def get_image(self, size):
+        return get_sprite(self.get_piece_color(), self.get_piece_type(), size)
 
     def is_move_sanctioned(self, bearing, directionality, length, move_coords):
         """
@@ -279,11 +377,8 @@ class Queen(Piece):
         return self._piece_color
 
     # Get image of piece
-    def get_image(self):
-        if self.get_piece_color() == "BLACK":
-            return B_img[4]
-        else:
-            return W_img[4]
+    def get_image(self, size):
+        return get_sprite(self.get_piece_color(), self.get_piece_type(), size)
 
     def is_move_sanctioned(self, bearing, directionality, length, move_coords):
         """
@@ -312,11 +407,8 @@ class King(Piece):
         return self._piece_color
 
     # Get image of piece
-    def get_image(self):
-        if self.get_piece_color() == "BLACK":
-            return B_img[5]
-        else:
-            return W_img[5]
+    def get_image(self, size):
+        return get_sprite(self.get_piece_color(), self.get_piece_type(), size)
 
     def is_move_sanctioned(self, bearing, directionality, length, move_coords):
         """
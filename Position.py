@@ -0,0 +1,210 @@
+from Bitboard import PIECE_TYPES, COLORS
+
+# Piece codes: 0 is an empty square, WHITE pieces are 1-6 and BLACK pieces
+# are 9-14 (the 8 bit marks BLACK), in PIECE_TYPES order.
+EMPTY = 0
+BLACK_BIT = 8
+PIECE_CODES = {
+    (color, piece_type): index + 1 + (BLACK_BIT if color == "BLACK" else 0)
+    for color in COLORS
+    for index, piece_type in enumerate(PIECE_TYPES)
+}
+
+# Letter of each piece type, as in FEN; WHITE pieces are written in uppercase
+PIECE_LETTERS = {
+    "PAWN": "p",
+    "ROOK": "r",
+    "KNIGHT": "n",
+    "BISHOP": "b",
+    "QUEEN": "q",
+    "KING": "k",
+}
+
+GAME_STATES = ("UNFINISHED", "WHITE_WON", "BLACK_WON")
+
+# Most pieces of one type a color can have captured: a position stores
+# each count in one byte
+MAX_CAPTURED = 255
+
+
+def piece_code(piece):
+    """
+    Returns the code of the given piece, or EMPTY for 0.
+    """
+    if piece == 0:
+        return EMPTY
+    return PIECE_CODES[(piece.get_piece_color(), piece.get_piece_type())]
+
+
+def captured_bytes(white_captured, black_captured):
+    """
+    Returns the pieces of each type captured by WHITE and by BLACK, given
+    as dicts, in Position's layout. Raises ValueError if a count is more
+    than MAX_CAPTURED.
+    """
+    counts = [
+        captured.get(piece_type, 0)
+        for captured in (white_captured, black_captured)
+        for piece_type in PIECE_TYPES
+    ]
+    if max(counts) > MAX_CAPTURED:
+        raise ValueError(
+            f"{max(counts)} captured pieces of one type; "
+            f"a position holds at most {MAX_CAPTURED}"
+        )
+    return bytes(counts)
+
+
+def piece_letter(code):
+    """
+    Returns the letter of a piece code, or "." for EMPTY.
+    """
+    if code == EMPTY:
+        return "."
+    kind = PIECE_KINDS[code]
+    letter = PIECE_LETTERS[kind.get_piece_type()]
+    return letter.upper() if kind.get_piece_color() == "WHITE" else letter
+
+
+class PieceKind:
+    """
+    Represents the behavior shared by every piece of one color and type.
+    There is exactly one PieceKind per piece code (see PIECE_KINDS), so a
+    position stores only codes and looks the behavior up. It has the
+    same get_piece_color and get_piece_type methods as the Piece classes,
+    but no location.
+    """
+
+    __slots__ = ("_code", "_piece_color", "_piece_type")
+
+    def __init__(self, code, color, piece_type):
+        self._code = code
+        self._piece_color = color
+        self._piece_type = piece_type
+
+    def __repr__(self):
+        return f"PieceKind({self._piece_color}, {self._piece_type})"
+
+    def get_code(self):
+        return self._code
+
+    def get_piece_color(self):
+        return self._piece_color
+
+    def get_piece_type(self):
+        return self._piece_type
+
+
+# Shared flyweights indexed by piece code (0 for an empty square)
+PIECE_KINDS = [0] * 16
+for (_color, _piece_type), _code in PIECE_CODES.items():
+    PIECE_KINDS[_code] = PieceKind(_code, _color, _piece_type)
+
+
+class Position:
+    """
+    Represents a compact snapshot of a game in a single bytearray: one
+    piece code per square (row by row), then whose turn it is, the game
+    state, and the number of pieces of each type captured by WHITE and
+    by BLACK. Cloning a position is a single buffer copy, so very many
+    positions can be kept in memory.
+    """
+
+    __slots__ = ("_buffer", "_rows", "_cols")
+
+    def __init__(self, buffer, rows=8, cols=8):
+        """
+        Creates a Position from a buffer laid out as described above.
+        """
+        self._buffer = bytearray(buffer)
+        self._rows = rows
+        self._cols = cols
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, Position)
+            and self._buffer == other._buffer
+            and self._cols == other._cols
+        )
+
+    def __hash__(self):
+        return hash(bytes(self._buffer))
+
+    def clone(self):
+        """
+        Returns an independent copy of the position.
+        """
+        return Position(self._buffer, self._rows, self._cols)
+
+    def to_bytes(self):
+        """
+        Returns the position's buffer as bytes.
+        """
+        return bytes(self._buffer)
+
+    def get_rows(self):
+        return self._rows
+
+    def get_cols(self):
+        return self._cols
+
+    def get_squares(self):
+        """
+        Returns a memoryview of the piece codes, one per square.
+        """
+        return memoryview(self._buffer)[: self._rows * self._cols]
+
+    def get_code(self, location):
+        """
+        Returns the piece code at the given location.
+        """
+        return self._buffer[location[0] * self._cols + location[1]]
+
+    def get_piece(self, location):
+        """
+        Returns the shared PieceKind at the given location, or 0 if the
+        square is empty.
+        """
+        return PIECE_KINDS[self._buffer[location[0] * self._cols + location[1]]]
+
+    def set_code(self, location, code):
+        """
+        Sets the piece code at the given location.
+        """
+        self._buffer[location[0] * self._cols + location[1]] = code
+
+    def get_game_turn(self):
+        return "BLACK" if self._buffer[self._rows * self._cols] else "WHITE"
+
+    def get_game_state(self):
+        return GAME_STATES[self._buffer[self._rows * self._cols + 1]]
+
+    def get_captured_pieces(self, color):
+        """
+        Returns a dict of the number of pieces of each type captured by
+        the given color, leaving out types with none captured.
+        """
+        offset = self._rows * self._cols + 2
+        if color == "BLACK":
+            offset += len(PIECE_TYPES)
+        return {
+            piece_type: self._buffer[offset + index]
+            for index, piece_type in enumerate(PIECE_TYPES)
+            if self._buffer[offset + index]
+        }
+
+    @staticmethod
+    def build(
+        squares, rows, cols, game_turn, game_state, white_captured, black_captured
+    ):
+        """
+        Returns a Position from a sequence of square codes, whose turn it
+        is, the game state and the captured pieces dicts of each color.
+        Raises ValueError if more than MAX_CAPTURED pieces of one type
+        were captured.
+        """
+        buffer = bytearray(squares)
+        buffer.append(1 if game_turn == "BLACK" else 0)
+        buffer.append(GAME_STATES.index(game_state))
+        buffer.extend(captured_bytes(white_captured, black_captured))
+        return Position(buffer, rows, cols)
@@ -0,0 +1,181 @@
+import os
+import time
+
+# Phases of ChessVar.make_move, in the order they run. The list path runs
+# categorize_move, is_move_sanctioned and is_move_unobstructed; boards
+# with occupancy masks run bitboard_check instead. push applies the move,
+# including the (constant-time) check of whether it wins the game.
+PHASES = (
+    "turn_check",
+    "categorize_move",
+    "is_move_sanctioned",
+    "is_move_unobstructed",
+    "bitboard_check",
+    "push",
+)
+
+# Categories of rejected moves
+REJECTIONS = (
+    "game_over",
+    "no_piece",
+    "wrong_turn",
+    "not_sanctioned",
+    "same_color_at_end",
+    "obstructed",
+    "pawn_diagonal_without_capture",
+    "pawn_perpendicular_capture",
+    "bitboard_illegal",
+)
+
+
+class Profiler:
+    """
+    Represents counters for the phases of move validation: how often
+    each phase runs, how long it takes and why moves are rejected.
+    Callers start each validation with a check, e.g.
+
+        if profiler.enabled:
+            start_ns = profiler.start_validation()
+
+    so that when profiling is off the only cost is one attribute lookup.
+    When it is on, every validation is counted but only one in
+    sample_every is followed through its phases (start_validation
+    returns None for the others), which keeps the overhead low enough to
+    leave on. Phase calls, times and rejections in the report are
+    estimated from the sampled validations.
+    """
+
+    def __init__(self, sample_every=16):
+        """
+        Creates a disabled Profiler which samples one validation in
+        sample_every.
+        """
+        self.enabled = False
+        self.timing = False
+        self.sample_every = sample_every
+        self.reset()
+
+    def enable(self, sample_every=None):
+        """
+        Turns profiling on, optionally changing how often validations are
+        sampled.
+        """
+        if sample_every is not None:
+            self.sample_every = sample_every
+        self.enabled = True
+
+    def disable(self):
+        """
+        Turns profiling off, keeping the counters.
+        """
+        self.enabled = False
+
+    def reset(self):
+        """
+        Clears every counter.
+        """
+        self.validations = 0
+        self.sampled = 0
+        self.accepted = 0
+        self.calls = {phase: 0 for phase in PHASES}
+        self.ns = {phase: 0 for phase in PHASES}
+        self.rejections = {reason: 0 for reason in REJECTIONS}
+        self.started = time.time()
+        self._countdown = 0
+
+    def start_validation(self):
+        """
+        Counts a validation and returns the start time in nanoseconds if
+        it is sampled, or None. timing tells whether the current
+        validation is sampled.
+        """
+        self.validations += 1
+        self._countdown -= 1
+        if self._countdown <= 0:
+            self._countdown = self.sample_every
+            self.sampled += 1
+            self.timing = True
+            return time.perf_counter_ns()
+        self.timing = False
+        return None
+
+    def phase(self, phase, start_ns):
+        """
+        Records a sampled call of phase which began at start_ns. Returns
+        the time the next phase begins.
+        """
+        now = time.perf_counter_ns()
+        self.calls[phase] += 1
+        self.ns[phase] += now - start_ns
+        return now
+
+    def reject(self, reason):
+        """
+        Records a sampled rejected move by its category (one of
+        REJECTIONS).
+        """
+        self.rejections[reason] += 1
+
+    def get_report(self):
+        """
+        Returns a dict of the counters: validations (sampled and in
+        total) and accepted moves, and for each phase its estimated calls
+        and total seconds and its mean nanoseconds per call, plus the
+        estimated rejections by category.
+        """
+        scale = self.validations / self.sampled if self.sampled else 0.0
+        phases = {}
+        for phase in PHASES:
+            calls = self.calls[phase]
+            mean_ns = self.ns[phase] / calls if calls else 0.0
+            phases[phase] = {
+                "calls": round(calls * scale),
+                "seconds": self.ns[phase] * scale / 1e9,
+                "mean_ns": mean_ns,
+            }
+        return {
+            "enabled": self.enabled,
+            "uptime": time.time() - self.started,
+            "validations": self.validations,
+            "sampled": self.sampled,
+            "accepted": self.accepted,
+            "phases": phases,
+            "rejections": {
+                reason: round(count * scale)
+                for reason, count in self.rejections.items()
+            },
+        }
+
+
+def format_report(report):
+    """
+    Returns a report dict (see Profiler.get_report) as a text table.
+    """
+    lines = [
+        f"{report['validations']} validations, {report['accepted']} moves made "
+        f"in {report['uptime']:.1f}s",
+        f"{'phase':<22}{'calls':>12}{'mean ns':>12}{'est. seconds':>14}",
+    ]
+    total = sum(entry["seconds"] for entry in report["phases"].values()) or 1.0
+    for phase, entry in report["phases"].items():
+        if not entry["calls"]:
+            continue
+        lines.append(
+            f"{phase:<22}{entry['calls']:>12}{entry['mean_ns']:>12.0f}"
+            f"{entry['seconds']:>14.4f} {100 * entry['seconds'] / total:5.1f}%"
+        )
+    rejected = {
+        reason: count for reason, count in report["rejections"].items() if count
+    }
+    lines.append(f"rejections: {sum(rejected.values())}")
+    for reason, count in sorted(rejected.items(), key=lambda item: -item[1]):
+        lines.append(f"  {reason:<32}{count:>10}")
+    return "\n".join(lines)
+
+
+# Shared profiler used by the rules engine. Set CHESSVAR_PROFILE=1 to turn
+# it on at startup.
+profiler = Profiler()
+
+if os.environ.get("CHESSVAR_PROFILE", "") not in ("", "0"):
+    profiler.enable()
@@ -0,0 +1,177 @@
+from Bitboard import COLORS, default_pawn_start_rows
+from Position import PIECE_KINDS, MAX_CAPTURED
+
+# Back rank of the standard setup; wider boards repeat it across the row
+BACK_RANK = (
+    "ROOK",
+    "KNIGHT",
+    "BISHOP",
+    "QUEEN",
+    "KING",
+    "BISHOP",
+    "KNIGHT",
+    "ROOK",
+)
+
+# Standard setups are shared by every game of the same size.
+_STANDARD_SETUPS = {}
+
+
+def parse_board_size(text):
+    """
+    Returns the (rows, cols) of a board size written as "ROWSxCOLS", such
+    as "16x16", or as a single number for a square board.
+    """
+    rows, _, cols = text.lower().partition("x")
+    try:
+        rows = int(rows)
+        cols = int(cols) if cols else rows
+    except ValueError:
+        raise ValueError(f"bad board size {text!r}") from None
+    if rows < 4 or cols < 1:
+        raise ValueError(f"a {rows}x{cols} board is too small for a setup")
+    return rows, cols
+
+
+def get_standard_setup(rows=8, cols=8):
+    """
+    Returns the standard setup for a board of the given size, building it
+    on first use: each color's back rank on the row nearest it, repeating
+    BACK_RANK across wider boards, and a row of pawns in front of it.
+    """
+    key = (rows, cols)
+    if key not in _STANDARD_SETUPS:
+        if rows < 4 or cols < 1:
+            raise ValueError(f"a {rows}x{cols} board is too small for a setup")
+        pieces = {}
+        for col in range(cols):
+            piece_type = BACK_RANK[col % len(BACK_RANK)]
+            pieces[(0, col)] = ("BLACK", piece_type)
+            pieces[(1, col)] = ("BLACK", "PAWN")
+            pieces[(rows - 2, col)] = ("WHITE", "PAWN")
+            pieces[(rows - 1, col)] = ("WHITE", piece_type)
+        _STANDARD_SETUPS[key] = Setup(rows, cols, pieces)
+    return _STANDARD_SETUPS[key]
+
+
+def _check_piece_count(color, piece_type, count):
+    """
+    Raises ValueError if color has more pieces of a type than a position
+    can record captured.
+    """
+    if count > MAX_CAPTURED:
+        raise ValueError(
+            f"{count} {color} {piece_type} pieces; a setup may have at most "
+            f"{MAX_CAPTURED} of one type per color"
+        )
+
+
+class Setup:
+    """
+    Represents the starting position of a game: the board size, the
+    color and type of the piece on each occupied square, and the row
+    from which each color's pawns may make their first (1 or 2 space)
+    move. A player wins by capturing every piece of one type that the
+    other player starts with, unless other win thresholds are given.
+    """
+
+    def __init__(self, rows, cols, pieces, pawn_start_rows=None, win_thresholds=None):
+        """
+        Creates a Setup for a board with the given number of rows and
+        cols. pieces is a dict of (color, piece_type) tuples by (row, col)
+        location. pawn_start_rows is a dict of rows by color, by default
+        the second row from each color's side. win_thresholds is a dict by
+        color of how many pieces of each type that color must capture to
+        win, by default every piece of that type the other color has.
+        Raises ValueError if a color has more than MAX_CAPTURED pieces of
+        one type, as positions could not record them all captured.
+        """
+        for row, col in pieces:
+            if not (0 <= row < rows and 0 <= col < cols):
+                raise ValueError(f"({row}, {col}) is off a {rows}x{cols} board")
+        self._rows = rows
+        self._cols = cols
+        self._pieces = dict(pieces)
+        for color in COLORS:
+            for piece_type, count in self.get_piece_counts(color).items():
+                _check_piece_count(color, piece_type, count)
+        if pawn_start_rows is None:
+            pawn_start_rows = default_pawn_start_rows(rows)
+        self._pawn_start_rows = dict(pawn_start_rows)
+        if win_thresholds is None:
+            win_thresholds = {
+                color: self.get_piece_counts(COLORS[1 - index])
+                for index, color in enumerate(COLORS)
+            }
+        self._win_thresholds = {color: dict(win_thresholds[color]) for color in COLORS}
+
+    @staticmethod
+    def from_position(position, pawn_start_rows=None):
+        """
+        Returns a Setup with the size and pieces of the given Position.
+        Pieces the position records as captured count as pieces their
+        color started with, so a player must capture every piece of one
+        type that is on the board or already captured.
+        """
+        cols = position.get_cols()
+        pieces = {}
+        for index, code in enumerate(position.get_squares()):
+            if code:
+                kind = PIECE_KINDS[code]
+                pieces[divmod(index, cols)] = (
+                    kind.get_piece_color(),
+                    kind.get_piece_type(),
+                )
+        setup = Setup(position.get_rows(), cols, pieces, pawn_start_rows)
+        for index, color in enumerate(COLORS):
+            thresholds = setup._win_thresholds[color]
+            for piece_type, count in position.get_captured_pieces(color).items():
+                thresholds[piece_type] = thresholds.get(piece_type, 0) + count
+                _check_piece_count(
+                    COLORS[1 - index], piece_type, thresholds[piece_type]
+                )
+        return setup
+
+    def get_rows(self):
+        """
+        Get method which returns the number of rows on the board.
+        """
+        return self._rows
+
+    def get_cols(self):
+        """
+        Get method which returns the number of columns on the board.
+        """
+        return self._cols
+
+    def get_pieces(self):
+        """
+        Get method which returns the dict of (color, piece_type) tuples by
+        location. The dict must not be modified.
+        """
+        return self._pieces
+
+    def get_pawn_start_rows(self):
+        """
+        Get method which returns the dict of pawn start rows by color.
+        """
+        return self._pawn_start_rows
+
+    def get_piece_counts(self, color):
+        """
+        Get method which returns a dict of how many pieces of each type
+        the given color starts with.
+        """
+        counts = {}
+        for piece_color, piece_type in self._pieces.values():
+            if piece_color == color:
+                counts[piece_type] = counts.get(piece_type, 0) + 1
+        return counts
+
+    def get_win_thresholds(self, color):
+        """
+        Get method which returns a dict of how many pieces of each type
+        the given color must capture to win. Types it cannot win by are
+        left out. The dict must not be modified.
+        """
+        return self._win_thresholds[color]
@@ -0,0 +1,159 @@
+from bisect import bisect_left, bisect_right, insort
+
+
+class SparseRow(dict):
+    """
+    Represents the pieces of one row of a sparse board by column. Empty
+    squares read as 0 and are not stored, so setting a square to 0
+    removes it.
+    """
+
+    __slots__ = ()
+
+    def __missing__(self, col):
+        return 0
+
+    def __setitem__(self, col, piece):
+        if piece == 0:
+            self.pop(col, None)
+        else:
+            dict.__setitem__(self, col, piece)
+
+
+class SparseGrid(dict):
+    """
+    Represents the squares of a sparse board as a dict of SparseRows by
+    row. It is indexed like the dense list of lists, as grid[row][col],
+    but only occupied squares take memory.
+    """
+
+    __slots__ = ()
+
+    def __missing__(self, row):
+        pieces = SparseRow()
+        dict.__setitem__(self, row, pieces)
+        return pieces
+
+    def get_pieces(self):
+        """
+        Returns a list of every piece on the grid, row by row.
+        """
+        return [
+            pieces[col]
+            for row, pieces in sorted(self.items())
+            for col in sorted(pieces)
+        ]
+
+
+class LineOccupancy:
+    """
+    Represents which squares of a board are occupied as sorted lists of
+    the occupied squares on every row, column and diagonal. Whether a
+    move is obstructed, or where a ray first meets a piece, is found with
+    a binary search of one line, so the cost grows with the number of
+    pieces on that line rather than with the size of the board.
+    """
+
+    def __init__(self):
+        """
+        Creates an empty LineOccupancy.
+        """
+        # Occupied cols of each row, and occupied rows of each col, of each
+        # diagonal (by row - col) and of each anti-diagonal (by row + col)
+        self._rows = {}
+        self._cols = {}
+        self._diagonals = {}
+        self._anti_diagonals = {}
+
+    def _lines(self, row, col):
+        """
+        Returns (lines, key, position) for each line through a square:
+        the dict of lines, the key of the line and the square's position
+        along it.
+        """
+        return (
+            (self._rows, row, col),
+            (self._cols, col, row),
+            (self._diagonals, row - col, row),
+            (self._anti_diagonals, row + col, row),
+        )
+
+    def add(self, location):
+        """
+        Marks the given location as occupied.
+        """
+        for lines, key, position in self._lines(*location):
+            line = lines.get(key)
+            if line is None:
+                lines[key] = [position]
+            else:
+                insort(line, position)
+
+    def remove(self, location):
+        """
+        Marks the given location as no longer occupied.
+        """
+        for lines, key, position in self._lines(*location):
+            line = lines[key]
+            del line[bisect_left(line, position)]
+            if not line:
+                del lines[key]
+
+    def get_nearest(self, location, direction):
+        """
+        Returns the nearest occupied location from location (not counting
+        itself) along direction, a (row step, col step) tuple of -1, 0 or
+        1, or None if there is none.
+        """
+        row, col = location
+        row_step, col_step = direction
+        if row_step == 0:
+            line = self._rows.get(row)
+            position = col
+            step = col_step
+        elif col_step == 0:
+            line = self._cols.get(col)
+            position = row
+            step = row_step
+        elif row_step == col_step:
+            line = self._diagonals.get(row - col)
+            position = row
+            step = row_step
+        else:
+            line = self._anti_diagonals.get(row + col)
+            position = row
+            step = row_step
+        if line is None:
+            return None
+
+        if step > 0:
+            index = bisect_right(line, position)
+            if index == len(line):
+                return None
+        else:
+            index = bisect_left(line, position) - 1
+            if index < 0:
+                return None
+        distance = abs(line[index] - position)
+        return row + distance * row_step, col + distance * col_step
+
+    def get_blocker(self, start_location, end_location):
+        """
+        Returns the occupied location nearest the start strictly between
+        the start and end of a PERPENDICULAR or DIAGONAL move, or None if
+        the path is clear.
+        """
+        start_row, start_col = start_location
+        end_row, end_col = end_location
+        direction = (
+            (end_row > start_row) - (end_row < start_row),
+            (end_col > start_col) - (end_col < start_col),
+        )
+        nearest = self.get_nearest(start_location, direction)
+        if nearest is None:
+            return None
+        if max(abs(nearest[0] - start_row), abs(nearest[1] - start_col)) >= max(
+            abs(end_row - start_row), abs(end_col - start_col)
+        ):
+            return None
+        return nearest
@@ -0,0 +1,80 @@
+import os
+import sys
+from collections import deque
+
+# Trace levels, from quietest to most verbose
+OFF = 0
+INFO = 1
+DEBUG = 2
+
+LEVEL_NAMES = {OFF: "OFF", INFO: "INFO", DEBUG: "DEBUG"}
+
+
+def print_sink(event):
+    """
+    Sink which writes each event as one line on stderr.
+    """
+    fields = " ".join(
+        f"{key}={value!r}"
+        for key, value in event.items()
+        if key not in ("level", "event")
+    )
+    print(f"[{event['level']}] {event['event']} {fields}".rstrip(), file=sys.stderr)
+
+
+class Tracer:
+    """
+    Represents a leveled trace facility which passes structured events
+    (dicts with a level, an event name and any other fields) to a sink.
+    Callers guard each emit with a level check, e.g.
+
+        if tracer.level >= INFO:
+            tracer.emit(INFO, "move_rejected", reason="...")
+
+    so that when tracing is off no event is built and the only cost is one
+    attribute lookup and comparison.
+    """
+
+    def __init__(self, level=OFF, sink=None, max_events=10000):
+        """
+        Creates a Tracer at the given level. Events go to sink (a callable
+        taking the event dict) or, if sink is None, are kept in the
+        bounded events deque.
+        """
+        self.level = level
+        self.events = deque(maxlen=max_events)
+        self._sink = sink
+
+    def enable(self, level=DEBUG, sink=None):
+        """
+        Turns tracing on at the given level, sending events to sink (or
+        to the events deque if sink is None).
+        """
+        self._sink = sink
+        self.level = level
+
+    def disable(self):
+        """
+        Turns tracing off.
+        """
+        self.level = OFF
+
+    def emit(self, level, event, **fields):
+        """
+        Sends an event to the sink. Callers check tracer.level first.
+        """
+        record = {"level": LEVEL_NAMES[level], "event": event}
+        record.update(fields)
+        if self._sink is None:
+            self.events.append(record)
+        else:
+            self._sink(record)
+
+
+# Shared tracer used by the rules engine. Set CHESSVAR_TRACE to INFO or
+# DEBUG to print its events on stderr.
+tracer = Tracer()
+
+_env_level = os.environ.get("CHESSVAR_TRACE", "").upper()
+if _env_level in ("INFO", "DEBUG"):
+    tracer.enable(INFO if _env_level == "INFO" else DEBUG, print_sink)
@@ -0,0 +1,426 @@
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from BatchValidator import get_validator
+from Bitboard import PIECE_TYPES
+from Evaluation import FEATURE_GROUPS, FEATURE_NAMES, MAX_DISTANCE, save_weights
+from Notation import START_FEN, GameCache, read_games, position_from_fen
+from Position import BLACK_BIT
+
+# Engine score units per unit of each model's output: a log-odds unit of
+# the logistic model, or the whole range from a loss to a win of the
+# linear model, so both land near the built-in distance weights
+SCORE_UNITS = {"logistic": 100.0, "linear": 400.0}
+
+# Positions whose moves are validated together when computing features
+BLOCK_POSITIONS = 512
+
+# Result of a position for the player to move, by whether that player
+# went on to win, to lose or to leave the game unfinished
+WIN_RESULT = 1.0
+LOSS_RESULT = 0.0
+UNFINISHED_RESULT = 0.5
+
+
+def read_game_starts(path, input_format):
+    """
+    Yields a (start_fen, moves, game_state) tuple for each game of a
+    self-play output file: game records ("pgn") or JSON Lines written with
+    --record-moves ("jsonl"). Malformed games are left out.
+    """
+    with open(path) as source:
+        if input_format == "pgn":
+            for record in read_games(source):
+                if record.get_error() is None:
+                    moves = record.get_moves()
+                    yield record.get_start_fen(), moves, record.get_result()
+            return
+        for line in source:
+            result = json.loads(line)
+            if "move_list" not in result:
+                continue
+            moves = [(tuple(start), tuple(end)) for start, end in result["move_list"]]
+            game_state = "UNFINISHED"
+            if result["winner"] is not None:
+                game_state = result["winner"] + "_WON"
+            yield result.get("start_fen", START_FEN), moves, game_state
+
+
+class PositionSet:
+    """
+    Represents positions collected from games on one board size, as NumPy
+    arrays ready for batch feature extraction: the Position buffer of
+    each position, the win thresholds of each color in the position's
+    game, and the result of the game for the player to move.
+    """
+
+    def __init__(self, rows, cols, buffers, thresholds, results):
+        """
+        Creates a PositionSet. buffers is an (n, rows * cols + 14) uint8
+        array of Position buffers, thresholds an (n, 2, 6) array of how
+        many pieces of each type (in PIECE_TYPES order) WHITE and BLACK
+        must capture to win, 0 for types they cannot win by, and results
+        an array of n results (WIN_RESULT, LOSS_RESULT or
+        UNFINISHED_RESULT).
+        """
+        self._rows = rows
+        self._cols = cols
+        self._buffers = buffers
+        self._thresholds = thresholds
+        self._results = results
+
+    def __len__(self):
+        return len(self._results)
+
+    def get_rows(self):
+        return self._rows
+
+    def get_cols(self):
+        return self._cols
+
+    def get_buffers(self):
+        return self._buffers
+
+    def get_thresholds(self):
+        return self._thresholds
+
+    def get_results(self):
+        return self._results
+
+
+def collect_positions(games, skip_plies=4, sample_every=1, max_positions=None):
+    """
+    Replays games, an iterable of (start_fen, moves, game_state) tuples,
+    and returns a PositionSet of the positions before each move from ply
+    skip_plies on, taking every sample_every-th one, up to max_positions.
+    Only games on the board size of the first game are used, and a game
+    is dropped whole if any of its moves is illegal. Raises ValueError if
+    no position is collected.
+    """
+    buffers = []
+    thresholds = []
+    results = []
+    games_by_start = GameCache()
+    size = None
+    for start_fen, moves, game_state in games:
+        position = position_from_fen(start_fen)
+        if size is None:
+            size = (position.get_rows(), position.get_cols())
+        elif (position.get_rows(), position.get_cols()) != size:
+            continue
+
+        game = games_by_start.get_game(start_fen)
+        game.set_position(position)
+        game_thresholds = [
+            [
+                game.get_win_thresholds(color).get(piece_type, 0)
+                for piece_type in PIECE_TYPES
+            ]
+            for color in ("WHITE", "BLACK")
+        ]
+
+        game_buffers = []
+        game_results = []
+        board_obj = game.get_board()
+        for ply, move in enumerate(moves):
+            if ply >= skip_plies and (ply - skip_plies) % sample_every == 0:
+                game_buffers.append(game.get_position().to_bytes())
+                if game_state == "UNFINISHED":
+                    game_results.append(UNFINISHED_RESULT)
+                elif game_state == board_obj.get_game_turn() + "_WON":
+                    game_results.append(WIN_RESULT)
+                else:
+                    game_results.append(LOSS_RESULT)
+            if not game.make_move(*move):
+                break
+        else:
+            buffers.extend(game_buffers)
+            thresholds.extend([game_thresholds] * len(game_buffers))
+            results.extend(game_results)
+        if max_positions is not None and len(results) >= max_positions:
+            del buffers[max_positions:], thresholds[max_positions:]
+            del results[max_positions:]
+            break
+
+    if size is None:
+        raise ValueError("no games to collect positions from")
+    if not results:
+        raise ValueError(
+            f"no positions to fit weights to: no game has a legal move from ply"
+            f" {skip_plies} on"
+        )
+    rows, cols = size
+    return PositionSet(
+        rows,
+        cols,
+        np.frombuffer(b"".join(buffers), np.uint8).reshape(
+            len(buffers), rows * cols + 2 + 2 * len(PIECE_TYPES)
+        ),
+        np.array(thresholds, np.int32).reshape(len(thresholds), 2, len(PIECE_TYPES)),
+        np.array(results, np.float64),
+    )
+
+
+def _per_color_move_counts(boards, validator):
+    """
+    Returns (mobility, attacked) arrays for a block of boards: the number
+    of legal moves of WHITE and of BLACK on each board, shaped (n, 2), and
+    the number of pieces of each type each color can capture, shaped
+    (n, 2, 6). Every move of every piece is validated in one batch.
+    """
+    count, size = boards.shape
+    board_index, starts = np.nonzero(boards)
+    movers = boards[board_index, starts] >> 3
+    board_index = np.repeat(board_index, size)
+    starts = np.repeat(starts, size)
+    ends = np.tile(np.arange(size), len(movers))
+    movers = np.repeat(movers, size)
+    legal, captured = validator.validate(boards, board_index, starts, ends)
+
+    mobility = np.bincount(
+        board_index[legal] * 2 + movers[legal], minlength=count * 2
+    ).reshape(count, 2)
+
+    # Each attacked square counts once, however many pieces attack it
+    is_capture = legal & (captured != 0)
+    squares = np.unique(board_index[is_capture] * size + ends[is_capture])
+    victims = boards.reshape(-1)[squares]
+    # The attacker is of the other color to its victim
+    attackers = 1 - (victims >> 3)
+    victim_types = (victims & (BLACK_BIT - 1)).astype(np.intp) - 1
+    attacked = np.bincount(
+        ((squares // size) * 2 + attackers) * len(PIECE_TYPES) + victim_types,
+        minlength=count * 2 * len(PIECE_TYPES),
+    ).reshape(count, 2, len(PIECE_TYPES))
+    return mobility, attacked
+
+
+def extract_features(positions, groups=None):
+    """
+    Returns an (n, len(FEATURE_NAMES)) float array of the features (see
+    Evaluation.FEATURE_GROUPS) of every position of a PositionSet, for the
+    player to move. Only the feature groups named in groups (by default
+    all) are computed; the columns of the others are 0. The work is done
+    on whole arrays of positions, the legal moves of blocks of positions
+    being validated together with BatchValidator.
+    """
+    if groups is None:
+        groups = tuple(FEATURE_GROUPS)
+    rows = positions.get_rows()
+    cols = positions.get_cols()
+    size = rows * cols
+    buffers = positions.get_buffers()
+    count = len(positions)
+    boards = buffers[:, :size]
+    mover = buffers[:, size].astype(np.intp)
+    index = np.arange(count)
+    types = len(PIECE_TYPES)
+
+    def relative(per_color):
+        # Value for the player to move minus value for the other player
+        return per_color[index, mover] - per_color[index, 1 - mover]
+
+    columns = {}
+    if "distance" in groups:
+        captured = buffers[:, size + 2 : size + 2 + 2 * types].reshape(count, 2, types)
+        thresholds = positions.get_thresholds()
+        remaining = thresholds - captured
+        distances = np.stack(
+            [
+                ((thresholds > 0) & (remaining == distance)).sum(axis=2)
+                for distance in range(1, MAX_DISTANCE + 1)
+            ],
+            axis=2,
+        )
+        columns["distance"] = relative(distances)
+    if "material" in groups:
+        counts = np.stack(
+            [
+                np.stack(
+                    [
+                        (boards == (color_bit | (type_index + 1))).sum(axis=1)
+                        for type_index in range(types)
+                    ],
+                    axis=1,
+                )
+                for color_bit in (0, BLACK_BIT)
+            ],
+            axis=1,
+        )
+        columns["material"] = relative(counts)
+    if "mobility" in groups or "attacked" in groups:
+        validator = get_validator(rows, cols)
+        mobility = np.zeros((count, 2), np.int64)
+        attacked = np.zeros((count, 2, types), np.int64)
+        for first in range(0, count, BLOCK_POSITIONS):
+            block = slice(first, first + BLOCK_POSITIONS)
+            mobility[block], attacked[block] = _per_color_move_counts(
+                np.ascontiguousarray(boards[block]), validator
+            )
+        columns["mobility"] = relative(mobility)[:, None]
+        columns["attacked"] = relative(attacked)
+
+    features = np.zeros((count, len(FEATURE_NAMES)))
+    first = 0
+    for group, names in FEATURE_GROUPS.items():
+        if group in groups:
+            features[:, first : first + len(names)] = columns[group]
+        first += len(names)
+    return features
+
+
+def fit_weights(features, results, model="logistic", l2=1.0, iterations=50):
+    """
+    Fits a linear evaluation to the features and results of positions
+    and returns its weights in engine score units, one per column. The
+    logistic model predicts the probability of winning (unfinished games
+    count as half a win) with Newton's method; the linear model fits the
+    result, from -1 for a loss to 1 for a win, by least squares. Both
+    are fitted on standardized columns with an L2 penalty of l2 and have
+    no constant term, so a position scores minus as much for the other
+    player. Columns which are always 0 get a weight of 0. Raises
+    ValueError if there are no positions.
+    """
+    if len(results) == 0:
+        raise ValueError("no positions to fit weights to")
+    scale = features.std(axis=0)
+    used = scale > 0
+    if not used.any():
+        return np.zeros(features.shape[1])
+    inputs = features[:, used] / scale[used]
+    penalty = l2 * np.eye(inputs.shape[1])
+    if model == "linear":
+        targets = 2.0 * results - 1.0
+        coefficients = np.linalg.solve(inputs.T @ inputs + penalty, inputs.T @ targets)
+    elif model == "logistic":
+        coefficients = np.zeros(inputs.shape[1])
+        for _ in range(iterations):
+            predictions = 1.0 / (1.0 + np.exp(-(inputs @ coefficients)))
+            gradient = inputs.T @ (predictions - results) + l2 * coefficients
+            curvature = (predictions * (1.0 - predictions))[:, None] * inputs
+            step = np.linalg.solve(inputs.T @ curvature + penalty, gradient)
+            coefficients -= step
+            if np.abs(step).max() < 1e-8:
+                break
+    else:
+        raise ValueError(f"unknown model {model!r}")
+    weights = np.zeros(features.shape[1])
+    weights[used] = coefficients / scale[used] * SCORE_UNITS[model]
+    return weights
+
+
+def score_fit(features, results, weights, model="logistic"):
+    """
+    Returns a dict describing how well weights predict results: the
+    share of decided positions whose winner they favor and, for the
+    logistic model, the mean log loss.
+    """
+    scores = features @ weights / SCORE_UNITS[model]
+    decided = results != UNFINISHED_RESULT
+    report = {
+        "positions": int(len(results)),
+        "accuracy": (
+            float(((scores > 0) == (results > 0.5))[decided].mean())
+            if decided.any()
+            else None
+        ),
+    }
+    if model == "logistic":
+        predictions = np.clip(1.0 / (1.0 + np.exp(-scores)), 1e-12, 1.0 - 1e-12)
+        report["log_loss"] = float(
+            -(
+                results * np.log(predictions)
+                + (1.0 - results) * np.log(1.0 - predictions)
+            ).mean()
+        )
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Fits evaluation weights for the engine from self-play "
+        "games and writes them to a weights file."
+    )
+    parser.add_argument("weights", help="weights file to write")
+    parser.add_argument(
+        "--games", required=True, help="self-play output (see selfplay.py)"
+    )
+    parser.add_argument(
+        "--format",
+        choices=["pgn", "jsonl"],
+        default="pgn",
+        help="format of the --games file",
+    )
+    parser.add_argument(
+        "--model", choices=sorted(SCORE_UNITS), default="logistic", help="model"
+    )
+    parser.add_argument(
+        "--features",
+        default=",".join(FEATURE_GROUPS),
+        help="comma-separated feature groups to fit (default: all of "
+        f"{', '.join(FEATURE_GROUPS)})",
+    )
+    parser.add_argument(
+        "--skip-plies", type=int, default=4, help="opening plies of each game to skip"
+    )
+    parser.add_argument(
+        "--sample-every", type=int, default=1, help="take every Nth position"
+    )
+    parser.add_argument(
+        "--max-positions", type=int, default=None, help="stop after this many"
+    )
+    parser.add_argument("--l2", type=float, default=1.0, help="L2 penalty")
+    parser.add_argument(
+        "--holdout",
+        type=float,
+        default=0.1,
+        help="share of positions kept out of the fit to score it",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="seed of the holdout split")
+    args = parser.parse_args(argv)
+
+    groups = tuple(group for group in args.features.split(",") if group)
+    unknown = set(groups) - set(FEATURE_GROUPS)
+    if unknown:
+        parser.error(f"unknown feature groups: {', '.join(sorted(unknown))}")
+
+    positions = collect_positions(
+        read_game_starts(args.games, args.format),
+        args.skip_plies,
+        args.sample_every,
+        args.max_positions,
+    )
+    features = extract_features(positions, groups)
+    results = positions.get_results()
+
+    order = np.random.default_rng(args.seed).permutation(len(results))
+    held = order[: int(len(order) * args.holdout)]
+    fitted = order[len(held) :]
+    weights = fit_weights(features[fitted], results[fitted], args.model, args.l2)
+
+    report = {"fit": score_fit(features[fitted], results[fitted], weights, args.model)}
+    if len(held):
+        report["holdout"] = score_fit(
+            features[held], results[held], weights, args.model
+        )
+    save_weights(
+        args.weights,
+        dict(zip(FEATURE_NAMES, weights.tolist())),
+        {
+            "model": args.model,
+            "features": list(groups),
+            "board": [positions.get_rows(), positions.get_cols()],
+            "l2": args.l2,
+            **report,
+        },
+    )
+    print(json.dumps(report), file=sys.stderr)
+    print(f"Wrote weights fitted to {len(results)} positions to {args.weights}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,284 @@
+import ctypes
+import multiprocessing
+
+# Bound types for stored search scores
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+
+class TranspositionTable:
+    """
+    Represents a fixed-size table of values keyed by a position's Zobrist
+    hash (see Board.get_hash). It holds at most max_entries values, so its
+    memory is capped no matter how many positions are stored. Entries
+    live in buckets of two slots: the first keeps the entry searched to
+    the greatest depth, the second is always replaced by newer entries.
+    The same class is used for search results, legal move lists and
+    evaluation scores; use a separate table for each.
+    """
+
+    def __init__(self, max_entries=1 << 16):
+        """
+        Creates an empty table with room for at most max_entries values
+        (rounded down to a power of two, minimum 2).
+        """
+        buckets = 1
+        while buckets * 4 <= max_entries:
+            buckets *= 2
+        self._mask = buckets - 1
+        size = buckets * 2
+        self._keys = [None] * size
+        self._depths = [0] * size
+        self._values = [None] * size
+        self._probes = 0
+        self._hits = 0
+        self._stores = 0
+
+    def get_max_entries(self):
+        """
+        Returns the number of values the table can hold.
+        """
+        return len(self._keys)
+
+    def get_stats(self):
+        """
+        Returns a dict with the number of probes, hits and stores so far.
+        """
+        return {"probes": self._probes, "hits": self._hits, "stores": self._stores}
+
+    def clear(self):
+        """
+        Removes every entry from the table.
+        """
+        size = len(self._keys)
+        self._keys = [None] * size
+        self._depths = [0] * size
+        self._values = [None] * size
+
+    def probe(self, key):
+        """
+        Returns the value stored for key, or None if there is none.
+        """
+        self._probes += 1
+        slot = (key & self._mask) << 1
+        keys = self._keys
+        if keys[slot] == key:
+            self._hits += 1
+            return self._values[slot]
+        if keys[slot + 1] == key:
+            self._hits += 1
+            return self._values[slot + 1]
+        return None
+
+    def probe_with_depth(self, key):
+        """
+        Returns a (value, depth) tuple stored for key, or None if there is
+        none.
+        """
+        self._probes += 1
+        slot = (key & self._mask) << 1
+        keys = self._keys
+        if keys[slot] != key:
+            slot += 1
+            if keys[slot] != key:
+                return None
+        self._hits += 1
+        return self._values[slot], self._depths[slot]
+
+    def store(self, key, value, depth=0):
+        """
+        Stores value for key. The depth-preferred slot takes the entry if
+        it already holds key or holds a shallower entry (which then moves
+        to the always-replace slot); otherwise the always-replace slot
+        takes it.
+        """
+        self._stores += 1
+        slot = (key & self._mask) << 1
+        keys = self._keys
+        depths = self._depths
+        values = self._values
+        if keys[slot] == key or depth >= depths[slot]:
+            if keys[slot] is not None and keys[slot] != key:
+                keys[slot + 1] = keys[slot]
+                depths[slot + 1] = depths[slot]
+                values[slot + 1] = values[slot]
+            elif keys[slot + 1] == key:
+                keys[slot + 1] = None
+                values[slot + 1] = None
+            keys[slot] = key
+            depths[slot] = depth
+            values[slot] = value
+        else:
+            keys[slot + 1] = key
+            depths[slot + 1] = depth
+            values[slot + 1] = value
+
+
+# Layout of the data word of a SharedTranspositionTable entry: bound type
+# plus 1 (so empty slots read 0), depth, best move as start and end row
+# and col, and score offset to be non-negative
+FLAG_BITS = 2
+DEPTH_BITS = 8
+COORD_BITS = 7
+SCORE_SHIFT = FLAG_BITS + DEPTH_BITS + 4 * COORD_BITS
+SCORE_OFFSET = 1 << (63 - SCORE_SHIFT)
+MAX_DEPTH = (1 << DEPTH_BITS) - 1
+COORD_MASK = (1 << COORD_BITS) - 1
+
+
+class SharedTranspositionTable:
+    """
+    Represents a transposition table of search results in shared memory,
+    so processes searching in parallel see each other's entries. It has
+    TranspositionTable's interface and replacement scheme, but values
+    must be (score, flag, best_move) tuples on boards of at most 128 rows
+    and cols. Each entry is two 64-bit words, the packed value and the
+    key XOR the packed value, written without locks: an entry torn by a
+    concurrent write no longer matches its key and reads as a miss.
+    """
+
+    def __init__(self, max_entries=1 << 16, words=None):
+        """
+        Creates an empty table with room for at most max_entries values
+        (rounded down to a power of two, minimum 2), or uses the shared
+        words of an existing table (see get_words), e.g. in a worker
+        process.
+        """
+        if words is None:
+            buckets = 1
+            while buckets * 4 <= max_entries:
+                buckets *= 2
+            words = multiprocessing.RawArray(ctypes.c_uint64, buckets * 4)
+        self._shared = words
+        self._words = memoryview(words).cast("B").cast("Q")
+        self._mask = len(self._words) // 4 - 1
+        self._probes = 0
+        self._hits = 0
+        self._stores = 0
+
+    def get_words(self):
+        """
+        Returns the shared array behind the table, to hand to worker
+        processes when they are started.
+        """
+        return self._shared
+
+    def get_max_entries(self):
+        """
+        Returns the number of values the table can hold.
+        """
+        return len(self._words) // 2
+
+    def get_stats(self):
+        """
+        Returns a dict with the number of probes, hits and stores so far
+        by this process.
+        """
+        return {"probes": self._probes, "hits": self._hits, "stores": self._stores}
+
+    def clear(self):
+        """
+        Removes every entry from the table.
+        """
+        ctypes.memset(self._shared, 0, ctypes.sizeof(self._shared))
+
+    def _find(self, key):
+        """
+        Returns the index of the data word of key's entry, or None.
+        """
+        self._probes += 1
+        words = self._words
+        index = ((key & self._mask) << 2) + 1
+        data = words[index]
+        if not (data and words[index - 1] ^ data == key):
+            index += 2
+            data = words[index]
+            if not (data and words[index - 1] ^ data == key):
+                return None
+        self._hits += 1
+        return index
+
+    @staticmethod
+    def _unpack(data):
+        """
+        Returns the (score, flag, best_move) value of a data word.
+        """
+        coords = data >> (FLAG_BITS + DEPTH_BITS)
+        start_row = coords & COORD_MASK
+        start_col = (coords >> COORD_BITS) & COORD_MASK
+        end_row = (coords >> 2 * COORD_BITS) & COORD_MASK
+        end_col = (coords >> 3 * COORD_BITS) & COORD_MASK
+        move = None
+        if (start_row, start_col) != (end_row, end_col):
+            move = ((start_row, start_col), (end_row, end_col))
+        return (
+            (data >> SCORE_SHIFT) - SCORE_OFFSET,
+            (data & ((1 << FLAG_BITS) - 1)) - 1,
+            move,
+        )
+
+    def probe(self, key):
+        """
+        Returns the value stored for key, or None if there is none.
+        """
+        index = self._find(key)
+        if index is None:
+            return None
+        return self._unpack(self._words[index])
+
+    def probe_with_depth(self, key):
+        """
+        Returns a (value, depth) tuple stored for key, or None if there is
+        none.
+        """
+        index = self._find(key)
+        if index is None:
+            return None
+        data = self._words[index]
+        return self._unpack(data), (data >> FLAG_BITS) & MAX_DEPTH
+
+    def store(self, key, value, depth=0):
+        """
+        Stores value for key, replacing entries as TranspositionTable
+        does. Scores beyond the packed range are clamped, and depths
+        beyond MAX_DEPTH stored as MAX_DEPTH.
+        """
+        self._stores += 1
+        score, flag, move = value
+        coords = 0
+        if move is not None:
+            (start_row, start_col), (end_row, end_col) = move
+            coords = (
+                start_row
+                | start_col << COORD_BITS
+                | end_row << 2 * COORD_BITS
+                | end_col << 3 * COORD_BITS
+            )
+        score = min(max(score, 1 - SCORE_OFFSET), SCORE_OFFSET - 1)
+        depth = min(depth, MAX_DEPTH)
+        data = (
+            (flag + 1)
+            | depth << FLAG_BITS
+            | coords << (FLAG_BITS + DEPTH_BITS)
+            | (score + SCORE_OFFSET) << SCORE_SHIFT
+        )
+
+        words = self._words
+        index = ((key & self._mask) << 2) + 1
+        first_data = words[index]
+        first_key = words[index - 1] ^ first_data
+        if (
+            not first_data
+            or first_key == key
+            or depth >= ((first_data >> FLAG_BITS) & MAX_DEPTH)
+        ):
+            if first_data and first_key != key:
+                words[index + 1] = words[index - 1]
+                words[index + 2] = first_data
+            elif words[index + 2] and words[index + 1] ^ words[index + 2] == key:
+                words[index + 2] = 0
+        else:
+            index += 2
+        words[index - 1] = key ^ data
+        words[index] = data
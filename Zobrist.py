@@ -0,0 +1,56 @@
+import random
+
+from Bitboard import PIECE_TYPES, COLORS
+
+# Fixed seed so every process (and every run) hashes a position the same way
+ZOBRIST_SEED = 20240601
+
+# Keys are shared by every board of the same size.
+_KEYS = {}
+
+
+def get_keys(rows, cols):
+    """
+    Returns the Zobrist keys for a board of the given size, building them
+    on first use.
+    """
+    key = (rows, cols)
+    if key not in _KEYS:
+        _KEYS[key] = ZobristKeys(rows, cols)
+    return _KEYS[key]
+
+
+class ZobristKeys:
+    """
+    Represents the random 64-bit keys used to hash a position: one per
+    color, piece type and square, plus one which is XOR-ed in when it is
+    BLACK's turn.
+    """
+
+    def __init__(self, rows, cols):
+        """
+        Builds the keys for a board with the given number of rows and cols.
+        """
+        rng = random.Random(ZOBRIST_SEED)
+        size = rows * cols
+        self._cols = cols
+        self.pieces = {
+            (color, piece_type): [rng.getrandbits(64) for _ in range(size)]
+            for color in COLORS
+            for piece_type in PIECE_TYPES
+        }
+        self.black_to_move = rng.getrandbits(64)
+
+    def __deepcopy__(self, memo):
+        """
+        Keys are never modified once built, so copies of a board share them.
+        """
+        return self
+
+    def piece_key(self, piece, location):
+        """
+        Returns the key for the given piece standing on location.
+        """
+        return self.pieces[(piece.get_piece_color(), piece.get_piece_type())][
+            location[0] * self._cols + location[1]
+        ]
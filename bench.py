@@ -0,0 +1,288 @@
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from ChessVar import ChessVar
+from Profiling import profiler, format_report
+from Setup import get_standard_setup, parse_board_size
+
+
+def perft(game, depth):
+    """
+    Returns the number of leaf nodes of the legal move tree of the given
+    depth. Finished games have no moves.
+    """
+    if depth == 0:
+        return 1
+    moves = game.legal_moves()
+    if depth == 1:
+        return len(moves)
+
+    nodes = 0
+    for move in moves:
+        game.push(move)
+        nodes += perft(game, depth - 1)
+        game.pop()
+    return nodes
+
+
+def bench_perft(depth, game_options):
+    """
+    Runs perft to each depth from 1 to depth from the starting position.
+    game_options are passed to ChessVar, as in every benchmark.
+    """
+    results = []
+    for current_depth in range(1, depth + 1):
+        game = ChessVar(**game_options)
+        start = time.perf_counter()
+        nodes = perft(game, current_depth)
+        elapsed = time.perf_counter() - start
+        results.append(
+            {
+                "depth": current_depth,
+                "nodes": nodes,
+                "seconds": elapsed,
+                "nodes_per_second": nodes / elapsed if elapsed else None,
+            }
+        )
+    return results
+
+
+def bench_make_move(seconds, game_options):
+    """
+    Measures how many moves per second make_move can validate (with
+    is_legal, without playing them) by trying every (start, end) square
+    pair from the starting position.
+    """
+    game = ChessVar(**game_options)
+    board_obj = game.get_board()
+    squares = [
+        (row, col)
+        for row in range(board_obj.get_rows())
+        for col in range(board_obj.get_cols())
+    ]
+    pairs = [(start, end) for start in squares for end in squares]
+
+    calls = 0
+    legal = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while time.perf_counter() < deadline:
+        for move in pairs:
+            if game.is_legal(move):
+                legal += 1
+        calls += len(pairs)
+    elapsed = time.perf_counter() - start
+    return {
+        "calls": calls,
+        "legal": legal,
+        "seconds": elapsed,
+        "validations_per_second": calls / elapsed,
+    }
+
+
+def bench_profile(seconds, game_options):
+    """
+    Plays random games through make_move for the given time with the
+    profiler on, trying random square pairs (mostly rejected) before
+    each legal move. Returns the profiler's report.
+    """
+    rng = random.Random(0)
+    profiler.reset()
+    profiler.enable()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        game = ChessVar(**game_options)
+        rows = game.get_board().get_rows()
+        cols = game.get_board().get_cols()
+        while game.get_game_state() == "UNFINISHED":
+            for _ in range(8):
+                start = (rng.randrange(rows), rng.randrange(cols))
+                end = (rng.randrange(rows), rng.randrange(cols))
+                if game.make_move(start, end):
+                    break
+            else:
+                moves = game.legal_moves()
+                if not moves:
+                    break
+                game.make_move(*rng.choice(moves))
+    profiler.disable()
+    return profiler.get_report()
+
+
+def bench_legal_moves(seconds, game_options):
+    """
+    Measures how many times per second the full legal move list can be
+    generated from the starting position.
+    """
+    game = ChessVar(**game_options)
+
+    calls = 0
+    moves = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while time.perf_counter() < deadline:
+        moves += len(game.legal_moves())
+        calls += 1
+    elapsed = time.perf_counter() - start
+    return {
+        "calls": calls,
+        "moves": moves,
+        "seconds": elapsed,
+        "generations_per_second": calls / elapsed,
+        "moves_per_second": moves / elapsed,
+    }
+
+
+def bench_memory(depth, game_options):
+    """
+    Returns the peak traced memory in bytes while running perft to depth.
+    """
+    tracemalloc.start()
+    try:
+        perft(ChessVar(**game_options), depth)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def max_rss_bytes():
+    """
+    Returns the peak resident set size of this process in bytes, or None
+    where the resource module is not available.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and kilobytes elsewhere
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def compare(results, baseline):
+    """
+    Prints throughput ratios against a baseline results file and flags any
+    perft node count that differs from it.
+    """
+    ok = True
+    baseline_perft = {entry["depth"]: entry["nodes"] for entry in baseline["perft"]}
+    for entry in results["perft"]:
+        expected = baseline_perft.get(entry["depth"])
+        if expected is not None and expected != entry["nodes"]:
+            print(
+                f"PERFT MISMATCH at depth {entry['depth']}: "
+                f"{entry['nodes']} nodes, baseline has {expected}"
+            )
+            ok = False
+
+    for section, key in (
+        ("make_move", "validations_per_second"),
+        ("legal_moves", "generations_per_second"),
+    ):
+        ratio = results[section][key] / baseline[section][key]
+        print(f"{section} {key}: {ratio:.2f}x baseline")
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the ChessVar rules engine without a display."
+    )
+    parser.add_argument("--depth", type=int, default=2, help="perft depth")
+    parser.add_argument(
+        "--seconds",
+        type=float,
+        default=1.0,
+        help="time spent on each throughput benchmark",
+    )
+    parser.add_argument(
+        "--bitboards", action="store_true", help="validate with bitboards"
+    )
+    parser.add_argument(
+        "--board",
+        type=parse_board_size,
+        default=(8, 8),
+        help="board size as ROWSxCOLS, e.g. 32x32, with the standard setup",
+    )
+    parser.add_argument(
+        "--sparse",
+        choices=["auto", "on", "off"],
+        default="auto",
+        help="sparse board backend (auto: boards over 16x16)",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="also report make_move's per-phase profile and profiling overhead",
+    )
+    parser.add_argument(
+        "--output", default="bench_results.json", help="JSON results file"
+    )
+    parser.add_argument(
+        "--baseline", help="earlier JSON results file to compare against"
+    )
+    args = parser.parse_args(argv)
+    game_options = {
+        "use_bitboards": args.bitboards,
+        "setup": get_standard_setup(*args.board),
+        "sparse": {"auto": None, "on": True, "off": False}[args.sparse],
+    }
+
+    results = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "bitboards": args.bitboards,
+        "board": list(args.board),
+        "sparse": ChessVar(**game_options).get_board().is_sparse(),
+        "perft": bench_perft(args.depth, game_options),
+        "make_move": bench_make_move(args.seconds, game_options),
+        "legal_moves": bench_legal_moves(args.seconds, game_options),
+        "peak_traced_bytes": bench_memory(args.depth, game_options),
+    }
+    if args.profile:
+        results["profile"] = bench_profile(args.seconds, game_options)
+        profiler.enable()
+        results["profiled_make_move"] = bench_make_move(args.seconds, game_options)
+        profiler.disable()
+    results["max_rss_bytes"] = max_rss_bytes()
+
+    with open(args.output, "w") as results_file:
+        json.dump(results, results_file, indent=2)
+
+    for entry in results["perft"]:
+        print(f"perft({entry['depth']}) = {entry['nodes']} in {entry['seconds']:.3f}s")
+    print(
+        f"make_move: {results['make_move']['validations_per_second']:.0f} "
+        f"validations/s"
+    )
+    print(
+        f"legal_moves: {results['legal_moves']['generations_per_second']:.0f} "
+        f"generations/s ({results['legal_moves']['moves_per_second']:.0f} moves/s)"
+    )
+    print(f"peak traced memory: {results['peak_traced_bytes']} bytes")
+    if args.profile:
+        print(format_report(results["profile"]))
+        print(
+            f"make_move with profiling on: "
+            f"{results['profiled_make_move']['validations_per_second']:.0f} "
+            f"validations/s"
+        )
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            if not compare(results, json.load(baseline_file)):
+                return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+from Profiling import format_report
+
+
+class Client:
+    """
+    Represents a connection to a GameServer (see server.py). Requests
+    may be sent concurrently; each response is matched to its request
+    by id, and "update" events of subscribed games are put on a queue.
+    """
+
+    def __init__(self, reader, writer):
+        """
+        Creates a Client on an open connection; use Client.connect.
+        """
+        self._reader = reader
+        self._writer = writer
+        self._next_id = 1
+        self._pending = {}
+        self._updates = asyncio.Queue()
+        self._read_task = asyncio.ensure_future(self._read_responses())
+
+    @staticmethod
+    async def connect(host="127.0.0.1", port=8765, unix_path=None):
+        """
+        Returns a Client connected over TCP, or over a Unix socket if
+        unix_path is given.
+        """
+        if unix_path is not None:
+            reader, writer = await asyncio.open_unix_connection(unix_path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return Client(reader, writer)
+
+    async def _read_responses(self):
+        """
+        Reads lines from the server until it closes the connection.
+        """
+        try:
+            while True:
+                line = await self._reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                if "event" in message:
+                    self._updates.put_nowait(message)
+                    continue
+                future = self._pending.pop(message.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(message)
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("connection closed"))
+            self._pending.clear()
+
+    async def request(self, op, **fields):
+        """
+        Sends a request and returns the server's response dict.
+        """
+        request_id = self._next_id
+        self._next_id += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        request = {"id": request_id, "op": op}
+        request.update(fields)
+        self._writer.write(json.dumps(request).encode() + b"\n")
+        await self._writer.drain()
+        return await future
+
+    async def next_update(self):
+        """
+        Returns the next update event of a subscribed game.
+        """
+        return await self._updates.get()
+
+    async def close(self):
+        """
+        Closes the connection.
+        """
+        self._writer.close()
+        await self._writer.wait_closed()
+        await self._read_task
+
+
+async def play_random_game(client, rng, latencies, max_moves=500):
+    """
+    Creates a game on the server and plays random legal moves for both
+    players until it ends, recording the seconds each move request took.
+    Returns the final game state.
+    """
+    game_id = (await client.request("create"))["game"]
+    state = "UNFINISHED"
+    for _ in range(max_moves):
+        moves = (await client.request("legal_moves", game=game_id))["moves"]
+        if not moves:
+            break
+        start = time.perf_counter()
+        response = await client.request("move", game=game_id, move=rng.choice(moves))
+        latencies.append(time.perf_counter() - start)
+        if not response["ok"]:
+            raise RuntimeError(response["error"])
+        state = response["state"]
+        if state != "UNFINISHED":
+            break
+    await client.request("delete", game=game_id)
+    return state
+
+
+async def drive(games, connections, host, port, unix_path, seed, stats=False):
+    """
+    Plays the given number of random games on the server, one game at a
+    time on each of several concurrent connections, then prints the
+    move latency, and the server's move validation profile if stats.
+    """
+    clients = [await Client.connect(host, port, unix_path) for _ in range(connections)]
+    latencies = []
+    states = {}
+
+    async def play(connection_index):
+        client = clients[connection_index]
+        for game_index in range(connection_index, games, connections):
+            rng = random.Random(seed + game_index)
+            state = await play_random_game(client, rng, latencies)
+            states[state] = states.get(state, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(play(index) for index in range(connections)))
+    elapsed = time.perf_counter() - start
+    profile = (await clients[0].request("stats"))["profile"] if stats else None
+    for client in clients:
+        await client.close()
+
+    latencies.sort()
+    print(f"{games} games, {len(latencies)} moves in {elapsed:.2f}s: {states}")
+    if latencies:
+        median = latencies[len(latencies) // 2]
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        print(f"move latency: median {median * 1e3:.2f}ms, p99 {p99 * 1e3:.2f}ms")
+    if profile is not None:
+        if profile["enabled"]:
+            print(format_report(profile))
+        else:
+            print("server profiling is off (start it with --profile)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Test client for server.py: plays random games on the "
+        "server concurrently and reports move latency."
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="TCP host")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port")
+    parser.add_argument("--unix", default=None, help="connect to this Unix socket")
+    parser.add_argument("--games", type=int, default=100, help="games to play")
+    parser.add_argument(
+        "--connections", type=int, default=10, help="concurrent connections"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="seed of game 0")
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="print the server's move validation profile afterwards",
+    )
+    args = parser.parse_args(argv)
+    asyncio.run(
+        drive(
+            args.games,
+            args.connections,
+            args.host,
+            args.port,
+            args.unix,
+            args.seed,
+            args.stats,
+        )
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
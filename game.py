@@ -1,30 +1,167 @@
+import argparse
 import pygame
 from pathlib import Path
+from BackgroundSearch import BackgroundEngine, IDLE, THINKING, PONDERING
 from ChessVar import ChessVar
-
+from Engine import Engine
+from Notation import game_from_fen
+from OpeningBook import OpeningBook
+from ParallelSearch import ParallelEngine
+from Piece import set_board_rect, set_sprite_source
+from Setup import get_standard_setup, parse_board_size
 
 WIDTH, HEIGHT = 600, 600
 RECT = (0, 0, 600, 600)
 
-win = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Chess Variant Game")
+# Number of rows and cols of squares on the board
+ROWS, COLS = 8, 8
+
+# Light and dark squares, as in the board image, for boards of other sizes
+SQUARE_COLORS = ((255, 255, 255), (57, 57, 57))
+
+# Window title, showing what the engine is doing
+CAPTIONS = {
+    IDLE: "Chess Variant Game",
+    THINKING: "Chess Variant Game - engine thinking...",
+    PONDERING: "Chess Variant Game - engine pondering",
+}
 
 # Board image
 img_dir = Path(__file__).parent / "img"
-board_img = pygame.transform.scale(
-    pygame.image.load(img_dir / "board.png"), (WIDTH, HEIGHT)
-)
 
 
-def redraw_window(win, board_obj):
-    win.blit(board_img, (0, 0))
+def load_board_img():
+    """
+    Returns the board image scaled to the board area, in the display's
+    pixel format once a window exists. The image shows 8x8 squares, so
+    boards of other sizes are drawn as a checkerboard instead.
+    """
+    if (ROWS, COLS) == (8, 8):
+        board_img = pygame.transform.scale(
+            pygame.image.load(img_dir / "board.png"), (RECT[2], RECT[3])
+        )
+    else:
+        board_img = pygame.Surface((RECT[2], RECT[3]))
+        for row in range(ROWS):
+            for col in range(COLS):
+                left = col * RECT[2] // COLS
+                top = row * RECT[3] // ROWS
+                board_img.fill(
+                    SQUARE_COLORS[(row + col) % 2],
+                    (
+                        left,
+                        top,
+                        (col + 1) * RECT[2] // COLS - left,
+                        (row + 1) * RECT[3] // ROWS - top,
+                    ),
+                )
+    if pygame.display.get_surface() is not None:
+        board_img = board_img.convert()
+    return board_img
+
+
+def fit_board(width, height):
+    """
+    Sets the board area to the largest square that fits a window of the
+    given size. Piece sprites are rebuilt for the new size when next drawn.
+    """
+    global RECT
+    side = min(width, height)
+    RECT = (0, 0, side, side)
+    set_board_rect(RECT, ROWS, COLS)
+
+
+def redraw_window(win, board_img, board_obj):
+    win.fill((0, 0, 0))
+    win.blit(board_img, (RECT[0], RECT[1]))
     board_obj.draw(win)
     pygame.display.update()
 
 
+class Renderer:
+    """
+    Represents the drawing of the game window. It remembers what each
+    square showed (which piece, and whether it was selected) when it was
+    last drawn, and on each frame re-blits and updates only the squares
+    that changed, such as a move's start and end squares, a captured
+    piece's square and the selection highlight. Frames in which nothing
+    changed do no drawing at all.
+    """
+
+    def __init__(self, win, board_img, board_obj):
+        self._win = win
+        self._board_img = board_img
+        self._board_obj = board_obj
+        self._shown = None
+
+    def set_board_img(self, board_img):
+        """
+        Replaces the board image (e.g. after the window was resized) and
+        redraws the whole window on the next frame.
+        """
+        self._board_img = board_img
+        self._shown = None
+
+    def invalidate(self):
+        """
+        Forces the whole window to be redrawn on the next frame, e.g.
+        after it has been uncovered.
+        """
+        self._shown = None
+
+    def get_square_rect(self, row, col):
+        """
+        Returns the window rectangle covered by the given square.
+        """
+        rows = self._board_obj.get_rows()
+        cols = self._board_obj.get_cols()
+        left = RECT[0] + col * RECT[2] // cols
+        top = RECT[1] + row * RECT[3] // rows
+        right = RECT[0] + (col + 1) * RECT[2] // cols
+        bottom = RECT[1] + (row + 1) * RECT[3] // rows
+        return pygame.Rect(left, top, right - left, bottom - top)
+
+    def render(self):
+        """
+        Redraws the squares which changed since the last frame and
+        updates only their part of the display. Returns the number of
+        squares redrawn.
+        """
+        # Only occupied squares are listed, found through the board's
+        # piece index rather than by scanning every square
+        board_obj = self._board_obj
+        shown = {}
+        for color in ("WHITE", "BLACK"):
+            for location in board_obj.get_color_locations(color):
+                piece = board_obj.get_piece(location)
+                shown[location] = (piece, piece.get_selected())
+
+        if self._shown is None:
+            redraw_window(self._win, self._board_img, board_obj)
+            self._shown = shown
+            return board_obj.get_rows() * board_obj.get_cols()
+
+        dirty_rects = []
+        for location in shown.keys() | self._shown.keys():
+            new = shown.get(location)
+            if new == self._shown.get(location):
+                continue
+            rect = self.get_square_rect(*location)
+            self._win.blit(self._board_img, rect.topleft, rect)
+            if new is not None:
+                new[0].draw_piece(self._win)
+            dirty_rects.append(rect)
+
+        if dirty_rects:
+            pygame.display.update(dirty_rects)
+            self._shown = shown
+        return len(dirty_rects)
+
+
 def click(pos):
     """
-    Returns the (row, col) of the square clicked on.
+    Returns the (row, col) of the square clicked on, or None if the click
+    is outside the board (e.g. in the margin of a resized window).
     """
     x = pos[0]
     y = pos[1]
@@ -32,69 +169,265 @@ def click(pos):
     if RECT[0] < x < RECT[0] + RECT[2]:
         if RECT[1] < y < RECT[1] + RECT[3]:
             # Click is within board
-            row = int((y - RECT[1]) / (RECT[3] / 8))
-            col = int((x - RECT[0]) / (RECT[2] / 8))
+            row = int((y - RECT[1]) / (RECT[3] / ROWS))
+            col = int((x - RECT[0]) / (RECT[2] / COLS))
             return row, col
 
 
-def main():
-    game = ChessVar()
+def navigate(game, key, engine_color=None):
+    """
+    Moves the game through its history for a key press: Left and Right
+    go one move back or forward, Home to the start and End to the end of
+    the current line. When the engine plays, Left and Right skip the
+    positions in which it is the engine's turn, so it does not reply at
+    once. Returns True if the key was a history key.
+    """
+    if key == pygame.K_HOME:
+        game.go_to_ply(0)
+    elif key == pygame.K_END:
+        game.go_to_ply(len(game.get_history().get_line()) - 1)
+    elif key in (pygame.K_LEFT, pygame.K_RIGHT):
+        step = game.undo if key == pygame.K_LEFT else game.redo
+        while (
+            step()
+            and engine_color is not None
+            and game.get_game_state() == "UNFINISHED"
+            and game.get_board().get_game_turn() == engine_color
+        ):
+            pass
+    else:
+        return False
+    return True
+
+
+def report_game_state(game):
+    """
+    Prints the winner if the game has been won.
+    """
+    if game.get_game_state() == "WHITE_WON":
+        print("WHITE has won!")
+    elif game.get_game_state() == "BLACK_WON":
+        print("BLACK has won!")
+
+
+def update_engine(game, thinker, engine_color, ponder=True):
+    """
+    Starts, stops or collects the background engine's search for the
+    current position, once per frame: on the engine's turn it plays the
+    move of a finished search or starts thinking, and on the other
+    player's turn it ponders (or stops searching if ponder is False).
+    A search for a position which is no longer shown, e.g. because the
+    other player has moved or the history was navigated, is cancelled.
+    Returns True if the engine moved.
+    """
+    if game.get_game_state() != "UNFINISHED":
+        thinker.cancel()
+        return False
+    board_obj = game.get_board()
+    key = board_obj.get_hash()
+    if board_obj.get_game_turn() == engine_color:
+        move = thinker.take_move(game)
+        if move is not None:
+            game.make_move(*move)
+            report_game_state(game)
+            return True
+        if thinker.get_key() != key or thinker.get_state() == PONDERING:
+            thinker.think(game)
+    elif thinker.get_key() != key:
+        if ponder:
+            thinker.ponder(game)
+        else:
+            thinker.cancel()
+    return False
+
+
+def main(
+    engine_color=None,
+    engine_time=1.0,
+    size=WIDTH,
+    sprite_source="files",
+    book=None,
+    game=None,
+    weights=None,
+    workers=None,
+    ponder=True,
+):
+    """
+    Runs the game window, initially size x size pixels and resizable. If
+    engine_color is "WHITE" or "BLACK", the built-in engine plays that
+    color, thinking for engine_time seconds per move and taking its
+    opening moves from the book file, if given, and evaluating with the
+    weights file, if given (see Training.py). If workers is given, the
+    engine searches on that many processes (see ParallelSearch.py) and
+    plays without a book. The engine searches on a background thread, so
+    the window stays responsive and its title shows when the engine is
+    thinking; unless ponder is False, it also thinks on the other
+    player's time. sprite_source is
+    "files" or "atlas" (see Piece.set_sprite_source). game is the
+    ChessVar to play, by default a new game on the standard 8x8 board.
+    The arrow, Home and End keys move back and forward through the
+    game's moves (see navigate); a move made from an earlier position
+    starts a variation.
+    """
+    global ROWS, COLS
+    if game is None:
+        game = ChessVar()
     board_obj = game._game_board_obj
+    ROWS, COLS = board_obj.get_rows(), board_obj.get_cols()
+    game.get_history()
+
+    # The worker processes are started before the window is opened
+    engine = None
+    if engine_color is not None and workers is not None:
+        engine = ParallelEngine(workers, max_time=engine_time, weights=weights)
+    elif engine_color is not None:
+        engine = Engine(
+            max_time=engine_time,
+            book=None if book is None else OpeningBook(book),
+            weights=weights,
+        )
+
+    set_sprite_source(sprite_source)
+    fit_board(size, size)
+    win = pygame.display.set_mode((size, size), pygame.RESIZABLE)
+    pygame.display.set_caption(CAPTIONS[IDLE])
+    board_img = load_board_img()
+
+    thinker = None
+    if engine is not None:
+        thinker = BackgroundEngine(engine)
+    caption_state = IDLE
 
     clock = pygame.time.Clock()
+    renderer = Renderer(win, board_img, board_obj)
+    expose_events = {
+        getattr(pygame, name)
+        for name in ("VIDEOEXPOSE", "WINDOWEXPOSED")
+        if hasattr(pygame, name)
+    }
 
     run = True
+    # Square the mouse button was pressed on, if it was on the board
+    start_square = None
 
     while run:
         clock.tick(10)
-        redraw_window(win, board_obj)
+        renderer.render()
+
+        if thinker is not None:
+            update_engine(game, thinker, engine_color, ponder)
+            if thinker.get_state() != caption_state:
+                caption_state = thinker.get_state()
+                pygame.display.set_caption(CAPTIONS[caption_state])
 
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 run = False
-                pygame.quit()
 
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                pos1 = pygame.mouse.get_pos()
-                row1, col1 = click(pos1)
+            if event.type in expose_events:
+                renderer.invalidate()
 
-                if (
-                    row1 is not None and col1 is not None
-                ):  # Check if the click is within the board
-                    board_obj.select(row1, col1)
-                    piece = board_obj.get_piece((row1, col1))
+            if event.type == pygame.VIDEORESIZE:
+                fit_board(event.w, event.h)
+                renderer.set_board_img(load_board_img())
+
+            if event.type == pygame.KEYDOWN:
+                navigate(game, event.key, engine_color)
+
+            if event.type == pygame.MOUSEBUTTONDOWN:
+                start_square = click(pygame.mouse.get_pos())
+                if start_square is not None:
+                    board_obj.select(*start_square)
 
             if event.type == pygame.MOUSEBUTTONUP:
-                pos2 = pygame.mouse.get_pos()
-                row2, col2 = click(pos2)
-
-                move_legal = game.make_move((row1, col1), (row2, col2))
-
-                if move_legal:
-                    board_obj.set_piece((row1, col1), (row2, col2), piece)
-                    # Check if game has been won with current move
-                    # If so, update game state to reflect that the game has been won
-                    if piece.get_piece_color() == "WHITE":
-                        if game.is_game_won(game._white_captured_pieces):
-                            game.set_game_state("WHITE_WON")
-                            print("WHITE has won!")
-                    else:
-                        if game.is_game_won(game._black_captured_pieces):
-                            game.set_game_state("BLACK_WON")
-                            print("BLACK has won!")
-
-                    # Update game turn
-                    if game.get_game_state() == "UNFINISHED":
-                        print("Game has not been won yet.")
-                        if board_obj.get_game_turn() == "WHITE":
-                            print("Updating game turn to BLACK")
-                            board_obj.set_game_turn("BLACK")
-                        else:
-                            print("Updating game turn to WHITE")
-                            board_obj.set_game_turn("WHITE")
+                end_square = click(pygame.mouse.get_pos())
+
+                if start_square is None or end_square is None:
+                    # Pressed or released off the board: no move
+                    board_obj.deselect()
+                elif (
+                    engine_color is not None
+                    and board_obj.get_game_turn() == engine_color
+                    and game.get_game_state() == "UNFINISHED"
+                ):
+                    print("Wait for the engine to move.")
+                elif game.make_move(start_square, end_square):
+                    # make_move has moved the piece, recorded any capture and
+                    # updated the game state and turn
+                    report_game_state(game)
                 else:
                     print("Invalid move.")
+                start_square = None
+
+    if thinker is not None:
+        thinker.cancel(wait=True)
+    if isinstance(engine, ParallelEngine):
+        engine.close()
+    pygame.quit()
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Chess Variant Game")
+    parser.add_argument(
+        "--engine",
+        choices=["WHITE", "BLACK"],
+        help="let the built-in engine play this color",
+    )
+    parser.add_argument(
+        "--engine-time",
+        type=float,
+        default=1.0,
+        help="seconds the engine may think per move",
+    )
+    parser.add_argument(
+        "--size", type=int, default=WIDTH, help="initial window size in pixels"
+    )
+    parser.add_argument(
+        "--sprites",
+        choices=["files", "atlas"],
+        default="files",
+        help="load piece images from separate files or the sprite atlas",
+    )
+    parser.add_argument("--book", help="opening book file for the engine")
+    parser.add_argument(
+        "--weights", help="evaluation weights file for the engine (see Training.py)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="let the engine search on this many processes (no opening book)",
+    )
+    parser.add_argument(
+        "--no-ponder",
+        dest="ponder",
+        action="store_false",
+        help="do not let the engine think on the other player's time",
+    )
+    parser.add_argument(
+        "--board",
+        type=parse_board_size,
+        default=(8, 8),
+        help="board size as ROWSxCOLS, e.g. 16x16, with the standard setup",
+    )
+    parser.add_argument(
+        "--fen",
+        help="start from this FEN-like position (overrides --board)",
+    )
+    args = parser.parse_args()
+    if args.workers is not None and args.book is not None:
+        parser.error("--book cannot be combined with --workers")
+    if args.fen is not None:
+        game = game_from_fen(args.fen)
+    else:
+        game = ChessVar(setup=get_standard_setup(*args.board))
+    main(
+        args.engine,
+        args.engine_time,
+        args.size,
+        args.sprites,
+        args.book,
+        game,
+        args.weights,
+        args.workers,
+        args.ponder,
+    )
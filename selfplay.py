@@ -0,0 +1,331 @@
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+from ChessVar import ChessVar
+from Engine import Engine
+from Notation import game_from_fen, game_to_fen, write_game
+from OpeningBook import OpeningBook
+from Setup import get_standard_setup, parse_board_size
+
+PLAYERS = ("random", "first", "engine")
+FORMATS = ("jsonl", "pgn")
+
+
+class RandomPlayer:
+    """
+    Represents a player which picks uniformly among the legal moves.
+    """
+
+    def __init__(self, rng, options):
+        self._rng = rng
+
+    def choose_move(self, game):
+        """
+        Returns a random legal move, or None if there are none.
+        """
+        moves = game.legal_moves()
+        return self._rng.choice(moves) if moves else None
+
+
+class FirstPlayer:
+    """
+    Represents a player which always plays the first legal move.
+    """
+
+    def __init__(self, rng, options):
+        pass
+
+    def choose_move(self, game):
+        """
+        Returns the first legal move, or None if there are none.
+        """
+        moves = game.legal_moves()
+        return moves[0] if moves else None
+
+
+class EnginePlayer:
+    """
+    Represents a player which asks the alpha-beta Engine for its move.
+    """
+
+    def __init__(self, rng, options):
+        book = None
+        if options.get("book") is not None:
+            book = _open_book(options["book"])
+        self._engine = Engine(
+            max_time=options.get("engine_time"),
+            max_nodes=options.get("engine_nodes"),
+            max_depth=options.get("engine_depth", 64),
+            book=book,
+            book_rng=rng,
+            weights=options.get("weights"),
+        )
+
+    def choose_move(self, game):
+        """
+        Returns the engine's move, or None if there are no legal moves.
+        """
+        return self._engine.choose_move(game)
+
+
+# Opening books opened by this process, by path; each is mapped once
+_BOOKS = {}
+
+
+def _open_book(path):
+    """
+    Returns the OpeningBook at path, opening it on first use.
+    """
+    if path not in _BOOKS:
+        _BOOKS[path] = OpeningBook(path)
+    return _BOOKS[path]
+
+
+PLAYER_CLASSES = {"random": RandomPlayer, "first": FirstPlayer, "engine": EnginePlayer}
+
+
+def make_player(name, rng, options):
+    """
+    Returns a new player of the given name (one of PLAYERS).
+    """
+    return PLAYER_CLASSES[name](rng, options)
+
+
+def new_game(options):
+    """
+    Returns a new ChessVar for the options: starting from the "fen"
+    position, whose pieces also make up its setup, or else from the
+    standard setup of a board of size "board" (rows, cols).
+    """
+    use_bitboards = options.get("bitboards", False)
+    if options.get("fen") is not None:
+        return game_from_fen(options["fen"], use_bitboards)
+    setup = get_standard_setup(*options.get("board", (8, 8)))
+    return ChessVar(use_bitboards=use_bitboards, setup=setup)
+
+
+def play_game(task):
+    """
+    Plays one complete headless game and returns its result as a dict.
+    task is a (game_index, seed, white, black, options) tuple, where white
+    and black are player names. Runs in a worker process.
+    """
+    game_index, seed, white, black, options = task
+    rng = random.Random(seed)
+    game = new_game(options)
+    start_fen = game_to_fen(game)
+    players = {
+        "WHITE": make_player(white, rng, options),
+        "BLACK": make_player(black, rng, options),
+    }
+    board_obj = game.get_board()
+    max_moves = options.get("max_moves")
+
+    moves = []
+    start = time.perf_counter()
+    while game.get_game_state() == "UNFINISHED":
+        if max_moves is not None and len(moves) >= max_moves:
+            break
+        move = players[board_obj.get_game_turn()].choose_move(game)
+        if move is None:
+            break
+        game.make_move(*move)
+        moves.append(move)
+    elapsed = time.perf_counter() - start
+
+    game_state = game.get_game_state()
+    winner = None
+    winning_piece_type = None
+    if game_state != "UNFINISHED":
+        winner = game_state.split("_")[0]
+        for piece_type, remaining in game.get_distance_to_win(winner).items():
+            if remaining <= 0:
+                winning_piece_type = piece_type
+                break
+
+    result = {
+        "game": game_index,
+        "seed": seed,
+        "white": white,
+        "black": black,
+        "winner": winner,
+        "winning_piece_type": winning_piece_type,
+        "moves": len(moves),
+        "seconds": elapsed,
+    }
+    if options.get("record_moves"):
+        result["start_fen"] = start_fen
+        result["move_list"] = moves
+    return result
+
+
+def write_result(output, result, output_format):
+    """
+    Writes one game's result to output: a JSON line, or for the "pgn"
+    format a game record (see Notation.write_game) with the result
+    fields as tags.
+    """
+    if output_format == "jsonl":
+        output.write(json.dumps(result) + "\n")
+        return
+    if result["winner"] is None:
+        game_state = "UNFINISHED"
+    else:
+        game_state = result["winner"] + "_WON"
+    tags = {
+        "Event": "selfplay",
+        "Game": result["game"],
+        "Seed": result["seed"],
+        "White": result["white"],
+        "Black": result["black"],
+    }
+    write_game(
+        output,
+        result["move_list"],
+        tags,
+        start_fen=result.get("start_fen"),
+        result=game_state,
+    )
+
+
+def run(games, white, black, workers, seed, options, output, output_format="jsonl"):
+    """
+    Plays the given number of games across a pool of worker processes,
+    writing each game to output (see write_result) as soon as it
+    finishes. Game i is played with seed + i. Returns the number of
+    games played.
+    """
+    if output_format == "pgn":
+        options = dict(options, record_moves=True)
+    tasks = (
+        (game_index, seed + game_index, white, black, options)
+        for game_index in range(games)
+    )
+    if workers == 1:
+        pool = None
+        results = map(play_game, tasks)
+    else:
+        pool = multiprocessing.Pool(workers)
+        results = pool.imap_unordered(play_game, tasks, chunksize=4)
+
+    played = 0
+    try:
+        for result in results:
+            write_result(output, result, output_format)
+            output.flush()
+            played += 1
+    finally:
+        if pool is not None:
+            pool.terminate()
+    return played
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Plays headless ChessVar games in parallel and writes "
+        "one JSON line (or game record) per game."
+    )
+    parser.add_argument("--games", type=int, default=100, help="number of games")
+    parser.add_argument("--white", choices=PLAYERS, default="random")
+    parser.add_argument("--black", choices=PLAYERS, default="random")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="worker processes (1 plays in this process)",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="seed of game 0")
+    parser.add_argument(
+        "--max-moves",
+        type=int,
+        default=500,
+        help="stop a game unfinished after this many moves",
+    )
+    parser.add_argument(
+        "--engine-time", type=float, default=None, help="engine seconds per move"
+    )
+    parser.add_argument(
+        "--engine-nodes", type=int, default=2000, help="engine nodes per move"
+    )
+    parser.add_argument(
+        "--engine-depth", type=int, default=64, help="engine depth per move"
+    )
+    parser.add_argument(
+        "--book", default=None, help="opening book file for engine players"
+    )
+    parser.add_argument(
+        "--weights",
+        default=None,
+        help="evaluation weights file for engine players (see Training.py)",
+    )
+    parser.add_argument(
+        "--bitboards", action="store_true", help="validate with bitboards"
+    )
+    parser.add_argument(
+        "--board",
+        type=parse_board_size,
+        default=(8, 8),
+        help="board size as ROWSxCOLS, e.g. 32x32, with the standard setup",
+    )
+    parser.add_argument(
+        "--fen",
+        default=None,
+        help="start every game from this FEN-like setup (overrides --board)",
+    )
+    parser.add_argument(
+        "--record-moves", action="store_true", help="include each game's moves"
+    )
+    parser.add_argument(
+        "--format",
+        choices=FORMATS,
+        default="jsonl",
+        help="JSON Lines, or game records readable by Notation.py",
+    )
+    parser.add_argument("--output", default="-", help="output file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    options = {
+        "max_moves": args.max_moves,
+        "engine_time": args.engine_time,
+        "engine_nodes": args.engine_nodes,
+        "engine_depth": args.engine_depth,
+        "book": args.book,
+        "weights": args.weights,
+        "bitboards": args.bitboards,
+        "board": args.board,
+        "fen": args.fen,
+        "record_moves": args.record_moves,
+    }
+
+    if args.output == "-":
+        output = contextlib.nullcontext(sys.stdout)
+    else:
+        output = open(args.output, "w")
+
+    start = time.perf_counter()
+    with output as output_file:
+        played = run(
+            args.games,
+            args.white,
+            args.black,
+            args.workers,
+            args.seed,
+            options,
+            output_file,
+            args.format,
+        )
+    print(
+        f"Played {played} games in {time.perf_counter() - start:.2f}s",
+        file=sys.stderr,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,293 @@
+import argparse
+import asyncio
+import json
+import sys
+
+from ChessVar import ChessVar
+from Notation import (
+    NotationError,
+    board_size,
+    format_move,
+    game_from_fen,
+    game_to_fen,
+    parse_move,
+)
+from Profiling import profiler
+
+# Types of the request fields the server reads
+FIELD_TYPES = {"op": str, "game": int, "fen": str, "move": str}
+
+# Largest board a client may create a game on
+MAX_BOARD_SQUARES = 128 * 128
+
+# Bytes of updates a subscriber may leave unread before it is unsubscribed
+MAX_SUBSCRIBER_BUFFER = 1 << 20
+
+
+class ProtocolError(Exception):
+    """
+    Raised while handling a request which cannot be carried out; its
+    message is sent back to the client.
+    """
+
+
+class GameServer:
+    """
+    Represents a server hosting many ChessVar games in one asyncio event
+    loop. Clients connect over TCP or a Unix socket and send one JSON
+    object per line. Each request has an "op", and an optional "id"
+    which is copied into the response:
+
+        {"op": "create"}                        new game (optional "fen")
+        {"op": "move", "game": 1, "move": "e2e4"}
+        {"op": "state", "game": 1}              FEN, state, turn, ply
+        {"op": "legal_moves", "game": 1}
+        {"op": "subscribe", "game": 1}          receive "update" events
+        {"op": "unsubscribe", "game": 1}
+        {"op": "delete", "game": 1}
+        {"op": "stats"}                         move validation profile
+
+    Responses are {"id": ..., "ok": true, ...} or {"id": ..., "ok":
+    false, "error": "..."}. After every move each subscriber of the game
+    is sent {"event": "update", "game": 1, "move": "e2e4", ...} with the
+    game's new state. A subscriber which leaves more than
+    MAX_SUBSCRIBER_BUFFER bytes of updates unread is sent
+    {"event": "unsubscribed", "game": 1, ...} and gets no more updates.
+    """
+
+    def __init__(self):
+        self._games = {}
+        self._subscribers = {}
+        self._next_game_id = 1
+        self._handlers = {
+            "create": self._create,
+            "move": self._move,
+            "state": self._state,
+            "legal_moves": self._legal_moves,
+            "subscribe": self._subscribe,
+            "unsubscribe": self._unsubscribe,
+            "delete": self._delete,
+            "stats": self._stats,
+        }
+
+    def get_game_count(self):
+        """
+        Returns the number of games being hosted.
+        """
+        return len(self._games)
+
+    def handle_request(self, request, writer=None):
+        """
+        Carries out one request (a dict) for the connection with the given
+        writer, and returns the response dict.
+        """
+        response = {}
+        if "id" in request:
+            response["id"] = request["id"]
+        try:
+            for field, field_type in FIELD_TYPES.items():
+                value = request.get(field)
+                if value is not None and (
+                    isinstance(value, bool) or not isinstance(value, field_type)
+                ):
+                    raise ProtocolError(
+                        f"{field!r} must be of type {field_type.__name__}"
+                    )
+            handler = self._handlers.get(request.get("op"))
+            if handler is None:
+                raise ProtocolError(f"unknown op {request.get('op')!r}")
+            response.update(handler(request, writer))
+            response["ok"] = True
+        except ProtocolError as error:
+            response["ok"] = False
+            response["error"] = str(error)
+        return response
+
+    async def handle_connection(self, reader, writer):
+        """
+        Serves one client connection until it closes.
+        """
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("request is not an object")
+                except ValueError as error:
+                    response = {"ok": False, "error": f"bad request: {error}"}
+                else:
+                    try:
+                        response = self.handle_request(request, writer)
+                    except Exception as error:
+                        # A bad request must not end the session
+                        response = {"ok": False, "error": f"internal error: {error}"}
+                        if "id" in request:
+                            response["id"] = request["id"]
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            for subscribers in self._subscribers.values():
+                subscribers.discard(writer)
+            writer.close()
+
+    def _get_game(self, request):
+        """
+        Returns the (game_id, game) a request refers to.
+        """
+        game_id = request.get("game")
+        if game_id not in self._games:
+            raise ProtocolError(f"no game {game_id!r}")
+        return game_id, self._games[game_id]
+
+    def _describe(self, game):
+        """
+        Returns a dict describing the game's current position.
+        """
+        return {
+            "fen": game_to_fen(game),
+            "state": game.get_game_state(),
+            "turn": game.get_board().get_game_turn(),
+            "ply": game.get_move_count(),
+        }
+
+    def _create(self, request, writer):
+        fen = request.get("fen")
+        if fen is not None:
+            ranks = fen.split()[0].split("/") if fen.split() else []
+            try:
+                squares = sum(board_size(rank)[1] for rank in ranks if rank)
+            except ValueError as error:
+                raise ProtocolError(str(error))
+            if squares > MAX_BOARD_SQUARES:
+                raise ProtocolError(
+                    f"boards may have at most {MAX_BOARD_SQUARES} squares"
+                )
+            try:
+                game = game_from_fen(fen)
+            except (NotationError, ValueError) as error:
+                raise ProtocolError(str(error))
+        else:
+            game = ChessVar()
+        game_id = self._next_game_id
+        self._next_game_id += 1
+        self._games[game_id] = game
+        self._subscribers[game_id] = set()
+        response = {"game": game_id}
+        response.update(self._describe(game))
+        return response
+
+    def _move(self, request, writer):
+        game_id, game = self._get_game(request)
+        board_obj = game.get_board()
+        rows = board_obj.get_rows()
+        try:
+            move = parse_move(str(request.get("move")), rows, board_obj.get_cols())
+        except NotationError as error:
+            raise ProtocolError(str(error))
+        if not game.make_move(*move):
+            raise ProtocolError(f"illegal move {request.get('move')}")
+
+        response = self._describe(game)
+        update = {"event": "update", "game": game_id, "move": format_move(move, rows)}
+        update.update(response)
+        self._broadcast(game_id, update)
+        return response
+
+    def _broadcast(self, game_id, event):
+        """
+        Sends an event to every subscriber of a game. The handlers cannot
+        wait for slow subscribers to drain, so a subscriber whose unsent
+        data exceeds MAX_SUBSCRIBER_BUFFER is unsubscribed instead.
+        """
+        line = json.dumps(event).encode() + b"\n"
+        subscribers = self._subscribers[game_id]
+        for subscriber in list(subscribers):
+            if subscriber.transport.get_write_buffer_size() > MAX_SUBSCRIBER_BUFFER:
+                subscribers.discard(subscriber)
+                notice = {
+                    "event": "unsubscribed",
+                    "game": game_id,
+                    "error": "too many unread updates",
+                }
+                subscriber.write(json.dumps(notice).encode() + b"\n")
+            else:
+                subscriber.write(line)
+
+    def _state(self, request, writer):
+        game_id, game = self._get_game(request)
+        return self._describe(game)
+
+    def _legal_moves(self, request, writer):
+        game_id, game = self._get_game(request)
+        rows = game.get_board().get_rows()
+        return {"moves": [format_move(move, rows) for move in game.legal_moves()]}
+
+    def _subscribe(self, request, writer):
+        game_id, game = self._get_game(request)
+        if writer is not None:
+            self._subscribers[game_id].add(writer)
+        return self._describe(game)
+
+    def _unsubscribe(self, request, writer):
+        game_id, game = self._get_game(request)
+        self._subscribers[game_id].discard(writer)
+        return {}
+
+    def _delete(self, request, writer):
+        game_id, game = self._get_game(request)
+        del self._games[game_id]
+        del self._subscribers[game_id]
+        return {}
+
+    def _stats(self, request, writer):
+        return {"games": len(self._games), "profile": profiler.get_report()}
+
+
+async def serve(host="127.0.0.1", port=8765, unix_path=None):
+    """
+    Runs a GameServer on a TCP port, or on a Unix socket if unix_path is
+    given, until cancelled.
+    """
+    game_server = GameServer()
+    if unix_path is not None:
+        server = await asyncio.start_unix_server(
+            game_server.handle_connection, unix_path
+        )
+        print(f"Serving on {unix_path}", file=sys.stderr)
+    else:
+        server = await asyncio.start_server(game_server.handle_connection, host, port)
+        print(f"Serving on {host}:{port}", file=sys.stderr)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Hosts ChessVar games for remote players over a "
+        "newline-delimited JSON protocol."
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="TCP host")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port")
+    parser.add_argument("--unix", default=None, help="serve on this Unix socket")
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="count and time move validation phases (see the stats op)",
+    )
+    args = parser.parse_args(argv)
+    if args.profile:
+        profiler.enable()
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())